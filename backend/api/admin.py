@@ -14,3 +14,14 @@ admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(ShipmentOrder)
 admin.site.register(SalesOrder)
+admin.site.register(OutboxEvent)
+admin.site.register(ProductStock)
+admin.site.register(ProductStockBucket)
+admin.site.register(IdempotencyKey)
+admin.site.register(StockReservation)
+admin.site.register(StockCounterSlot)
+admin.site.register(ExpiryScanWatermark)
+admin.site.register(AlertDigestItem)
+admin.site.register(AlertDigestWindow)
+admin.site.register(DemandForecast)
+admin.site.register(SupplierLeadTime)
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Inventory, Notification, Product, ProductCategory, ShipmentOrder
+
+DASHBOARD_CACHE_KEY = "api:dashboard-stats"
+
+#stock level at or below which a product or batch counts as low
+LOW_STOCK_THRESHOLD = 10
+
+
+def compute_dashboard_stats():
+    """Home page figures, computed with a handful of SQL aggregates"""
+    products = Product.objects.aggregate(
+        total=Count("id"),
+        low_stock=Count("id", filter=Q(stock_quantity__lte=LOW_STOCK_THRESHOLD)),
+    )
+    batches = Inventory.objects.filter(status__in=["ADD", "RETURN"]).aggregate(
+        low_stock=Count("id", filter=Q(quantity__gt=0, quantity__lte=LOW_STOCK_THRESHOLD)),
+        value=Sum(F("quantity") * F("product__price")),
+    )
+    open_notifications = dict(
+        Notification.objects.filter(status="OPEN")
+        .values_list("type")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+    return {
+        "total_products": products["total"],
+        "total_categories": ProductCategory.objects.count(),
+        "low_stock_products": products["low_stock"],
+        "low_stock_batches": batches["low_stock"],
+        "total_inventory_value": batches["value"] or 0,
+        "pending_shipments": ShipmentOrder.objects.filter(status="PENDING").count(),
+        "open_notifications": sum(open_notifications.values()),
+        "open_notifications_by_type": open_notifications,
+    }
+
+
+def get_dashboard_stats():
+    """Dashboard figures, served from the cache for DASHBOARD_CACHE_SECONDS"""
+    return cache.get_or_set(DASHBOARD_CACHE_KEY, compute_dashboard_stats, settings.DASHBOARD_CACHE_SECONDS)
+
+
+def invalidate_dashboard_stats():
+    """Drop the cached figures once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_CACHE_KEY))
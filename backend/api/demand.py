@@ -0,0 +1,117 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory_optimizer_package_23384069 import DemandForecaster
+
+from .inventory_movements import BULK_INSERT_BATCH_SIZE
+
+
+def load_forecaster(forecast):
+    """DemandForecaster holding a DemandForecast row's state"""
+    return DemandForecaster(**{field: getattr(forecast, field) for field in DemandForecaster.FIELDS})
+
+
+def apply_demand(demand):
+    """Fold delivered quantities into the products' forecast state.
+
+    demand: {product_id: [(day, quantity), ...]}. Rows are locked in product id
+    order and each (product, day) pair is an O(1) update, so the cost follows
+    the delivered lines, never the order history.
+    """
+    from .models import DemandForecast
+
+    if not demand:
+        return
+    product_ids = sorted(demand)
+    with transaction.atomic():
+        DemandForecast.objects.bulk_create(
+            [DemandForecast(product_id=product_id) for product_id in product_ids], ignore_conflicts=True
+        )
+        forecasts = list(
+            DemandForecast.objects.select_for_update().filter(product_id__in=product_ids).order_by("product_id")
+        )
+        now = timezone.now()
+        for forecast in forecasts:
+            forecaster = load_forecaster(forecast)
+            for day, quantity in sorted(demand[forecast.product_id]):
+                forecaster.observe(day, quantity)
+            for field, value in forecaster.to_dict().items():
+                setattr(forecast, field, value)
+            forecast.updated_at = now
+        DemandForecast.objects.bulk_update(
+            forecasts, [*DemandForecaster.FIELDS, "updated_at"], batch_size=BULK_INSERT_BATCH_SIZE
+        )
+
+
+def record_deliveries(order_ids):
+    """Feed the lines of newly delivered orders into the demand forecasts, dated by order day.
+
+    Idempotent: the orders are locked and each is recorded once (a
+    DeliveredOrder row), so an order that goes back to another status and is
+    delivered again is not counted twice.
+    """
+    from .models import DeliveredOrder, Order, OrderItem
+
+    with transaction.atomic():
+        locked = list(
+            Order.objects.select_for_update().filter(pk__in=order_ids).order_by("pk").values_list("pk", flat=True)
+        )
+        recorded = set(DeliveredOrder.objects.filter(order_id__in=locked).values_list("order_id", flat=True))
+        new = [order_id for order_id in locked if order_id not in recorded]
+        if not new:
+            return
+        DeliveredOrder.objects.bulk_create([DeliveredOrder(order_id=order_id) for order_id in new])
+
+        demand = defaultdict(list)
+        rows = (
+            OrderItem.objects.filter(order_id__in=new)
+            .values("product_id", day=TruncDate("order__order_date"))
+            .annotate(quantity=Sum("quantity"))
+        )
+        for row in rows:
+            demand[row["product_id"]].append((row["day"], row["quantity"]))
+        apply_demand(demand)
+
+
+def record_delivered_units(order_id, product_id, quantity):
+    """Feed units added to a line of an already recorded delivery into the forecast.
+
+    Units taken off such a line stay counted, a closed forecast day cannot be
+    revised; rebuild_demand_forecasts replays the corrected history.
+    """
+    from .models import Order
+
+    day = (
+        Order.objects.filter(pk=order_id, delivered_record__isnull=False)
+        .annotate(day=TruncDate("order_date")).values_list("day", flat=True).first()
+    )
+    if day is not None and quantity > 0:
+        apply_demand({product_id: [(day, quantity)]})
+
+
+def rebuild_demand_forecasts(since, product_ids=None):
+    """Replace forecast state with a replay of the lines delivered since `since`.
+
+    Used to seed the state from history or after smoothing settings change.
+    Returns the number of products with demand.
+    """
+    from .models import DemandForecast, OrderItem
+
+    items = OrderItem.objects.filter(order__status="DELIVERED", order__order_date__gte=since)
+    forecasts = DemandForecast.objects.all()
+    if product_ids:
+        items = items.filter(product_id__in=product_ids)
+        forecasts = forecasts.filter(product_id__in=product_ids)
+
+    demand = defaultdict(list)
+    rows = items.values("product_id", day=TruncDate("order__order_date")).annotate(quantity=Sum("quantity"))
+    for row in rows.iterator():
+        demand[row["product_id"]].append((row["day"], row["quantity"]))
+
+    with transaction.atomic():
+        forecasts.delete()
+        apply_demand(demand)
+    return len(demand)
@@ -0,0 +1,106 @@
+from datetime import timedelta
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+#request header carrying the client's key
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+#rows deleted per statement when purging expired keys
+PURGE_CHUNK_SIZE = 5000
+
+
+def request_fingerprint(request):
+    """Hash of what the request asks for, so a key cannot be reused for a different write"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _replay(record, fingerprint):
+    """Answer a retry from the stored row"""
+    if record.request_hash != fingerprint:
+        return Response(
+            {"detail": f"{IDEMPOTENCY_HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {"detail": f"A request with this {IDEMPOTENCY_HEADER} is still being processed."},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def run_idempotent(request, handler):
+    """Run handler() at most once per (user, Idempotency-Key).
+
+    The key is claimed with an INSERT in the same transaction as the write,
+    so a concurrent retry blocks on the unique index until the first attempt
+    commits (and then replays its response) or rolls back (and then runs).
+    Successful responses are stored for IDEMPOTENCY_KEY_TTL_HOURS; failures
+    roll the claim back so the client can retry with the same key.
+    Requests without the header run as usual.
+    """
+    from .models import IdempotencyKey
+
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key or not request.user.is_authenticated:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"detail": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    fingerprint = request_fingerprint(request)
+    now = timezone.now()
+
+    with transaction.atomic():
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=request.user,
+                        key=key,
+                        request_hash=fingerprint,
+                        expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                    )
+                break
+            except IntegrityError:
+                record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+                if record is None:
+                    continue
+                if record.expires_at > now:
+                    return _replay(record, fingerprint)
+                # expired but not purged yet, reuse the key
+                record.delete()
+        else:
+            raise IntegrityError(f"Could not claim {IDEMPOTENCY_HEADER} {key}")
+
+        response = handler()
+        if status.is_success(response.status_code):
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=["status_code", "response"])
+        else:
+            record.delete()
+        return response
+
+
+def purge_expired_keys(now=None):
+    """Delete expired keys in chunks, returns how many went"""
+    from .models import IdempotencyKey
+
+    now = now or timezone.now()
+    purged = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list("id", flat=True)[:PURGE_CHUNK_SIZE])
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,330 @@
+from collections import defaultdict
+from datetime import date
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import outbox
+from .stock_counters import pending_slot_available
+
+#statuses accepted by the bulk receiving endpoint
+RECEIPT_STATUSES = ["ADD", "RETURN"]
+
+#statuses that take stock out of the product's counter
+OUTGOING_STATUSES = ["REMOVE", "ADJUST"]
+
+#rows written per INSERT statement during bulk ingest
+BULK_INSERT_BATCH_SIZE = 1000
+
+#available-stock bucket of batches without an expiry date, sorts after every real month
+NO_EXPIRY_BUCKET = date(9999, 12, 1)
+
+
+def stock_delta(status, quantity):
+    """Signed change an inventory row makes to its product's stock_quantity"""
+    if status in OUTGOING_STATUSES:
+        return -abs(quantity)
+    return quantity
+
+
+def apply_stock_changes(stock, available, slots=None, update_totals=True):
+    """Apply {product_id: delta} to the stock counters and {(product_id, expiry_month): delta} to the projection.
+
+    Every change is a single UPDATE ... SET column = column + delta, so
+    concurrent workers never lose each other's movements, and no other
+    Product column (updated_at included) is rewritten.
+
+    A striped product (slots maps its id to counter_slots) writes all of a
+    movement to one counter slot picked at random: the slot row takes the
+    stock and available-total deltas and the buckets go to that slot's own
+    bucket rows, so concurrent movements on a hot product spread over N sets
+    of rows instead of queueing on its Product, ProductStock and bucket rows.
+    If the slot is gone (striping was just switched off) the product is
+    written as an unstriped one. Rows are locked slots first, then products
+    in id order, then buckets and totals.
+
+    update_totals=False leaves the available totals of unstriped products to
+    the caller, for allocations that take them with a conditional update.
+
+    Returns {product_id: slot} for the striped products written.
+    """
+    from .models import Product, StockCounterSlot
+
+    slots = slots or {}
+    totals = defaultdict(int)
+    changed = {product_id for product_id, delta in stock.items() if delta}
+    for (product_id, _), delta in available.items():
+        totals[product_id] += delta
+        if delta:
+            changed.add(product_id)
+
+    striped = {}
+    for product_id in sorted(product_id for product_id in changed if slots.get(product_id)):
+        slot = random.randrange(slots[product_id])
+        if StockCounterSlot.objects.filter(product_id=product_id, slot=slot).update(
+            delta=F("delta") + stock.get(product_id, 0), available=F("available") + totals[product_id]
+        ):
+            striped[product_id] = slot
+
+    for product_id in sorted(stock):
+        if stock[product_id] and product_id not in striped:
+            Product.objects.filter(pk=product_id).update(stock_quantity=F("stock_quantity") + stock[product_id])
+    adjust_available(available, update_totals=update_totals, slots=striped)
+    return striped
+
+
+def expiry_bucket(expiry_date):
+    """First day of the month a batch expires in, the key of its available-stock bucket"""
+    if expiry_date is None:
+        return NO_EXPIRY_BUCKET
+    return date(expiry_date.year, expiry_date.month, 1)
+
+
+def available_delta(status, quantity):
+    """Change an inventory row makes to its product's sellable stock"""
+    return quantity if status in RECEIPT_STATUSES else 0
+
+
+def _increment_available(model, increments, create_missing=True):
+    """Apply [(lookup, delta), ...] as UPDATE ... SET available = available + delta.
+
+    Rows that do not exist yet are inserted empty in one statement (ignoring
+    any a concurrent movement just created) and then incremented.
+    """
+    missing = [
+        (lookup, delta) for lookup, delta in increments
+        if not model.objects.filter(**lookup).update(available=F("available") + delta)
+    ]
+    if missing and create_missing:
+        model.objects.bulk_create([model(available=0, **lookup) for lookup, _ in missing], ignore_conflicts=True)
+        for lookup, delta in missing:
+            model.objects.filter(**lookup).update(available=F("available") + delta)
+
+
+def adjust_available(deltas, create_missing=True, update_totals=True, slots=None):
+    """Apply a {(product_id, expiry_month): delta} mapping to the available-stock projection.
+
+    Every bucket and every product total moves with one atomic increment,
+    in key order so concurrent movements lock the rows in the same order.
+    update_totals=False only moves the buckets, for allocations that take
+    the totals with their own conditional update. slots maps striped products
+    to the counter slot being written: their buckets are that slot's rows
+    (bucket slot = counter slot + 1, 0 holds the folded buckets) and their
+    totals already went to the slot row (see apply_stock_changes).
+    """
+    from .models import ProductStock, ProductStockBucket
+
+    slots = slots or {}
+    buckets, totals = [], defaultdict(int)
+    for (product_id, expiry_month), delta in sorted(deltas.items()):
+        if delta:
+            buckets.append((
+                {"product_id": product_id, "expiry_month": expiry_month, "slot": slots.get(product_id, -1) + 1}, delta
+            ))
+            if product_id not in slots:
+                totals[product_id] += delta
+
+    _increment_available(ProductStockBucket, buckets, create_missing)
+    if not update_totals:
+        return
+    _increment_available(
+        ProductStock,
+        [({"product_id": product_id}, totals[product_id]) for product_id in sorted(totals) if totals[product_id]],
+        create_missing,
+    )
+
+
+def available_stock(product_id):
+    """Units of a product that can still be sold: the projection (with pending slots) minus active reservations"""
+    from .models import ProductStock
+
+    return (
+        ProductStock.objects.filter(product_id=product_id)
+        .annotate(units=F("available") + pending_slot_available() - F("reserved"))
+        .values_list("units", flat=True).first()
+    ) or 0
+
+
+def _counter_slots(inventory):
+    """counter_slots of the row's product, without loading the product when it is not at hand"""
+    from .models import Inventory, Product
+
+    if Inventory.product.is_cached(inventory):
+        return inventory.product.counter_slots
+    return Product.objects.filter(pk=inventory.product_id).values_list("counter_slots", flat=True).first() or 0
+
+
+def record_movement(inventory, previous=None, update_counter=True):
+    """Apply a saved inventory row to its product's stock.
+
+    previous is the (product_id, status, quantity, expiry_date) the row had
+    before an update, so that editing a row only applies the difference
+    instead of the whole quantity; a row moved to another product is taken
+    off the old product and added to the new one. update_counter=False
+    leaves stock_quantity alone and only moves the available-stock projection.
+    """
+    from .models import Product
+
+    delta = stock_delta(inventory.status, inventory.quantity)
+    stock = defaultdict(int)
+    stock[inventory.product_id] += delta
+    available = defaultdict(int)
+    available[(inventory.product_id, expiry_bucket(inventory.expiry_date))] += available_delta(
+        inventory.status, inventory.quantity
+    )
+    if previous is not None:
+        product_id, status, quantity, expiry_date = previous
+        stock[product_id] -= stock_delta(status, quantity)
+        available[(product_id, expiry_bucket(expiry_date))] -= available_delta(status, quantity)
+        delta = stock[inventory.product_id]
+
+    slots = {inventory.product_id: _counter_slots(inventory)}
+    moved_from = [product_id for product_id, _ in available if product_id not in slots]
+    if moved_from:
+        slots.update(Product.objects.filter(pk__in=moved_from).values_list("id", "counter_slots"))
+    striped = apply_stock_changes(stock if update_counter else {}, available, slots)
+
+    # queue operation for lambda function, repeated removals of a product are coalesced
+    # (per counter slot for a striped product, so its removals do not queue on one outbox row)
+    if previous is None and inventory.status == "REMOVE":
+        coalesce_key = f"product:{inventory.product_id}"
+        if inventory.product_id in striped:
+            coalesce_key += f":{striped[inventory.product_id]}"
+        outbox.enqueue(
+            "INVENTORY",
+            {'product_id': inventory.product_id, 'stock_delta': delta},
+            coalesce_key=coalesce_key,
+            merge=outbox.merge_stock_delta,
+        )
+
+
+def bulk_create_batches(receipts, user=None):
+    """Insert many inventory receipts at once.
+
+    receipts: iterable of dicts with product (a Product), quantity, status,
+    notes and expiry_date. Batch ids are generated before the insert, the rows
+    go in with bulk_create and each product's stock_quantity is then bumped
+    with one aggregated UPDATE.
+
+    Returns the created Inventory rows.
+    """
+    from .dashboard import invalidate_dashboard_stats
+    from .models import Inventory, generate_batch_id
+
+    now = timezone.now()
+    batches = []
+    totals = defaultdict(int)
+    available = defaultdict(int)
+
+    for receipt in receipts:
+        product = receipt["product"]
+        batches.append(Inventory(
+            product=product,
+            quantity=receipt["quantity"],
+            status=receipt.get("status", "ADD"),
+            notes=receipt.get("notes"),
+            expiry_date=receipt.get("expiry_date"),
+            updated_by=user,
+            batch_id=generate_batch_id(product.id, now),
+        ))
+        totals[product.id] += stock_delta(batches[-1].status, receipt["quantity"])
+        available[(product.id, expiry_bucket(batches[-1].expiry_date))] += available_delta(
+            batches[-1].status, receipt["quantity"]
+        )
+
+    with transaction.atomic():
+        Inventory.objects.bulk_create(batches, batch_size=BULK_INSERT_BATCH_SIZE)
+        apply_stock_changes(totals, available, {batch.product_id: batch.product.counter_slots for batch in batches})
+        # bulk_create sends no post_save signals
+        invalidate_dashboard_stats()
+
+    return batches
+
+
+def ledger_available_stock(product_ids=None):
+    """{(product_id, expiry_month): units} recomputed from the inventory ledger"""
+    from .models import Inventory
+
+    rows = Inventory.objects.filter(status__in=RECEIPT_STATUSES)
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=product_ids)
+    rows = (
+        rows.annotate(expiry_month=TruncMonth("expiry_date"))
+        .values("product_id", "expiry_month")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    )
+    return {(row["product_id"], row["expiry_month"] or NO_EXPIRY_BUCKET): row["units"] for row in rows}
+
+
+def available_stock_drift(product_ids=None):
+    """Compare the projection with the ledger.
+
+    Returns {product_id: [(expiry_month, stored, ledger), ...]} for every
+    product whose buckets or total disagree; the total is reported with an
+    expiry_month of None.
+    """
+    from .models import ProductStock, ProductStockBucket
+
+    buckets = ProductStockBucket.objects.all()
+    totals = ProductStock.objects.all()
+    if product_ids is not None:
+        buckets = buckets.filter(product_id__in=product_ids)
+        totals = totals.filter(product_id__in=product_ids)
+
+    ledger = ledger_available_stock(product_ids)
+    stored = {(product_id, month): units for product_id, month, units in
+              buckets.values("product_id", "expiry_month").annotate(units=Sum("available"))
+              .order_by().values_list("product_id", "expiry_month", "units")}
+
+    ledger_totals = defaultdict(int)
+    for (product_id, _), units in ledger.items():
+        ledger_totals[product_id] += units
+    stored_totals = dict(
+        totals.annotate(units=F("available") + pending_slot_available()).values_list("product_id", "units")
+    )
+
+    drift = defaultdict(list)
+    for product_id, month in sorted(ledger.keys() | stored.keys()):
+        if stored.get((product_id, month), 0) != ledger.get((product_id, month), 0):
+            drift[product_id].append((month, stored.get((product_id, month), 0), ledger.get((product_id, month), 0)))
+    for product_id in sorted(ledger_totals.keys() | stored_totals.keys()):
+        if stored_totals.get(product_id, 0) != ledger_totals.get(product_id, 0):
+            drift[product_id].append((None, stored_totals.get(product_id, 0), ledger_totals.get(product_id, 0)))
+    return dict(drift)
+
+
+def rebuild_available_stock(product_id):
+    """Rewrite one product's projection from the ledger (and its reserved counter from the active holds).
+
+    The counter slots and then the product row are locked first: every stock
+    movement updates one of them, so no movement can slip in between reading
+    the ledger and writing the projection. Pending slot changes are dropped,
+    the ledger already holds them.
+    """
+    from .models import Product, ProductStock, ProductStockBucket, StockCounterSlot, StockReservation
+
+    with transaction.atomic():
+        slots = list(StockCounterSlot.objects.select_for_update().filter(product_id=product_id).order_by("slot"))
+        if not Product.objects.select_for_update().filter(pk=product_id).exists():
+            return
+        ledger = ledger_available_stock([product_id])
+
+        StockCounterSlot.objects.filter(id__in=[slot.id for slot in slots]).update(available=0)
+        ProductStockBucket.objects.filter(product_id=product_id, slot__gt=0).update(available=0)
+        ProductStockBucket.objects.filter(product_id=product_id, slot=0).exclude(
+            expiry_month__in=[month for _, month in ledger]
+        ).delete()
+        for (_, month), units in ledger.items():
+            ProductStockBucket.objects.update_or_create(
+                product_id=product_id, expiry_month=month, slot=0, defaults={"available": units}
+            )
+        reserved = StockReservation.objects.filter(product_id=product_id, status="ACTIVE").aggregate(
+            units=Sum("quantity")
+        )["units"] or 0
+        ProductStock.objects.update_or_create(
+            product_id=product_id, defaults={"available": sum(ledger.values()), "reserved": reserved}
+        )
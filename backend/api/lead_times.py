@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from inventory_optimizer_package_23384069 import RunningStats
+
+SECONDS_PER_DAY = 86400
+
+
+def lead_time_days(order_date, received_at):
+    """Days between placing a purchase order and its first delivery"""
+    return max((received_at - order_date).total_seconds(), 0) / SECONDS_PER_DAY
+
+
+def record_lead_times(observations):
+    """Fold lead times into the running statistics of their supplier and product.
+
+    observations: iterable of (supplier_id, product_id, days). Each one is an
+    O(1) Welford update; rows are locked in key order and written with one
+    bulk_update, so receiving never scans purchase order history.
+    """
+    from .models import SupplierLeadTime
+
+    grouped = defaultdict(list)
+    for supplier_id, product_id, days in observations:
+        grouped[(supplier_id, product_id)].append(days)
+    if not grouped:
+        return
+
+    with transaction.atomic():
+        SupplierLeadTime.objects.bulk_create(
+            [SupplierLeadTime(supplier_id=supplier_id, product_id=product_id) for supplier_id, product_id in grouped],
+            ignore_conflicts=True,
+        )
+        rows = list(
+            SupplierLeadTime.objects.select_for_update()
+            .filter(supplier_id__in={key[0] for key in grouped}, product_id__in={key[1] for key in grouped})
+            .order_by("supplier_id", "product_id")
+        )
+        now = timezone.now()
+        changed = []
+        for row in rows:
+            days = grouped.get((row.supplier_id, row.product_id))
+            if not days:
+                continue
+            new = RunningStats()
+            for value in days:
+                new.add(value)
+            stats = RunningStats(row.count, row.mean_days, row.m2).merge(new)
+            row.count, row.mean_days, row.m2, row.updated_at = stats.count, stats.mean, stats.m2, now
+            changed.append(row)
+        SupplierLeadTime.objects.bulk_update(changed, ["count", "mean_days", "m2", "updated_at"])
@@ -0,0 +1,96 @@
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.models import Inventory, Product
+from api.stock_allocation import allocate_fefo
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_allocate(product, quantity):
+    """The per-batch loop OrderItem.save used before the allocation engine.
+
+    Inventory.save now books a stock movement, so the loop's writes are
+    replayed with the round trips the old Inventory.save made instead: a
+    full-row batch UPDATE, a lazy load of the batch's product and a full-row
+    product UPDATE per batch (without the old save's stock change, which
+    double counted).
+    """
+    remaining_quantity = quantity
+    batches = Inventory.objects.filter(
+        product=product,
+        status__in=["ADD", "RETURN"]
+    ).order_by('expiry_date')
+    for batch in batches:
+        if remaining_quantity <= 0:
+            break
+
+        if batch.quantity > 0:
+            quantity_from_batch = min(batch.quantity, remaining_quantity)
+            batch.quantity -= quantity_from_batch
+            models.Model.save(batch)
+            models.Model.save(batch.product)
+            remaining_quantity -= quantity_from_batch
+
+    if remaining_quantity > 0:
+        raise ValueError(f"Insufficient stock for product {product.name}")
+
+
+class Command(BaseCommand):
+    help = "Compare database round trips per order line: legacy FEFO loop vs allocation engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batches", type=int, default=10, help="Batches the order line spans")
+        parser.add_argument("--batch-size", type=int, default=5, help="Units held by each batch")
+        parser.add_argument("--lines", type=int, default=20, help="Order lines to allocate per strategy")
+
+    def _seed(self, batches, batch_size, lines):
+        product = Product.objects.create(name="bench-allocation", price=1, stock_quantity=0)
+        now = timezone.now()
+        for i in range(batches * lines):
+            Inventory.objects.create(
+                product=product,
+                quantity=batch_size,
+                status="ADD",
+                notes="benchmark batch",
+                expiry_date=(now + timedelta(days=30 + i)).date(),
+            )
+        return Product.objects.get(pk=product.pk)
+
+    def _run(self, label, allocate, batches, batch_size, lines):
+        queries = 0
+        elapsed = 0.0
+        try:
+            with transaction.atomic():
+                product = self._seed(batches, batch_size, lines)
+                quantity = batches * batch_size
+                for _ in range(lines):
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        with transaction.atomic():
+                            allocate(product, quantity)
+                        elapsed += time.perf_counter() - start
+                    queries += len(ctx.captured_queries)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(
+            f"{label:<10} {queries / lines:>8.1f} queries/line {elapsed / lines * 1000:>9.2f} ms/line"
+        )
+
+    def handle(self, *args, **options):
+        batches, batch_size, lines = options["batches"], options["batch_size"], options["lines"]
+        self.stdout.write(
+            f"order line of {batches * batch_size} units spanning {batches} batches of {batch_size}, "
+            f"{lines} lines each ({connection.vendor})"
+        )
+        self._run("legacy", legacy_allocate, batches, batch_size, lines)
+        self._run("engine", allocate_fefo, batches, batch_size, lines)
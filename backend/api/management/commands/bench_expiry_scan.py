@@ -0,0 +1,141 @@
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Inventory, Notification, Product
+
+#the Lambda sources sit next to the backend; its SQL is benchmarked (and tested) as deployed
+sys.path.insert(0, str(Path(settings.BASE_DIR).parent / "my_lamda_functions"))
+import sns_check_stock_expiry_lambda_function as expiry_lambda  # noqa: E402
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_scan(cursor, today, threshold, now):
+    """The per-batch SELECT + INSERT loop the expiry Lambda used to run"""
+    cursor.execute(
+        "SELECT i.id, i.product_id FROM api_inventory i WHERE i.expiry_date BETWEEN %s AND %s",
+        (today, threshold),
+    )
+    inserted = 0
+    for inv_id, product_id in cursor.fetchall():
+        cursor.execute("SELECT batch_id_id FROM api_notification WHERE batch_id_id = %s", (inv_id,))
+        if not cursor.fetchone():
+            cursor.execute(
+                "INSERT INTO api_notification "
+                "(batch_id_id, type, product_name_id, status, created_at, updated_at, notes) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                (inv_id, "STOCK_EXPIRY", product_id, "OPEN", now, now, "Create plan to clear out stock."),
+            )
+            inserted += 1
+    return inserted
+
+
+def full_scan(cursor, today, threshold, now):
+    params = {"now": now, "today": today, "threshold": threshold}
+    cursor.execute(expiry_lambda.CREATE_EXPIRY_NOTIFICATIONS_SQL.format(scope=""), params)
+    return cursor.rowcount
+
+
+def incremental_scan(cursor, today, threshold, now, window_end, last_inventory_id, last_run):
+    params = {
+        "now": now, "today": today, "threshold": threshold, "window_end": window_end,
+        "last_inventory_id": last_inventory_id, "created_since": last_run - expiry_lambda.WATERMARK_OVERLAP,
+    }
+    cursor.execute(expiry_lambda.CREATE_EXPIRY_NOTIFICATIONS_SQL.format(scope=expiry_lambda.INCREMENTAL_SCOPE), params)
+    return cursor.rowcount
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy per-batch expiry scan with the single INSERT ... SELECT, and full with incremental rescans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batches", type=int, default=100000, help="Batches expiring inside the window")
+        parser.add_argument("--notified", type=float, default=0.1, help="Share of batches already notified")
+        parser.add_argument("--empty", type=float, default=0.1, help="Share of batches sold down to zero")
+        parser.add_argument("--new", type=int, default=1000, help="Batches received before the next day's run")
+
+    def _add_batches(self, product, total, today, empty_every=0):
+        Inventory.objects.bulk_create(
+            (
+                Inventory(
+                    product=product,
+                    quantity=0 if empty_every and i % empty_every == 0 else 5,
+                    status="ADD",
+                    notes="benchmark batch",
+                    expiry_date=today + timedelta(days=i % 30),
+                )
+                for i in range(total)
+            ),
+            batch_size=500,
+        )
+
+    def _seed(self, options, today):
+        product = Product.objects.create(name="bench-expiry", price=1, stock_quantity=0)
+        total = options["batches"]
+        empty_every = int(1 / options["empty"]) if options["empty"] else 0
+        self._add_batches(product, total, today, empty_every)
+        notified = Inventory.objects.filter(product=product).order_by("id")[: int(total * options["notified"])]
+        Notification.objects.bulk_create(
+            (Notification(batch_id=batch, product_name=product, type="STOCK_EXPIRY") for batch in notified),
+            batch_size=500,
+        )
+        return product
+
+    def _run(self, label, scan, today, **extra):
+        now = datetime.now()
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        try:
+            with transaction.atomic():
+                with connection.execute_wrapper(count), connection.cursor() as cursor:
+                    start = time.perf_counter()
+                    inserted = scan(cursor, today, today + timedelta(days=30), now, **extra)
+                    elapsed = time.perf_counter() - start
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(
+            f"{label:<17} {queries:>8} queries {elapsed * 1000:>10.1f} ms {inserted:>8} inserted"
+        )
+
+    def handle(self, *args, **options):
+        today = date.today()
+        self.stdout.write(f"{options['batches']} batches expiring within 30 days ({connection.vendor})")
+        try:
+            with transaction.atomic():
+                product = self._seed(options, today)
+                self._run("legacy", legacy_scan, today)
+                self._run("single statement", full_scan, today)
+
+                #the next day: yesterday's scan is done and a few deliveries came in
+                yesterday = timezone.now() - timedelta(days=1)
+                Inventory.objects.filter(product=product).update(created_at=yesterday - timedelta(hours=1))
+                with connection.cursor() as cursor:
+                    full_scan(cursor, today, today + timedelta(days=30), yesterday)
+                watermark = {
+                    "window_end": today + timedelta(days=30),
+                    "last_inventory_id": Inventory.objects.order_by("-id").values_list("id", flat=True).first(),
+                    "last_run": yesterday,
+                }
+                tomorrow = today + timedelta(days=1)
+                self._add_batches(product, options["new"], tomorrow)
+                self.stdout.write(f"next day, {options['new']} new batches")
+                self._run("full window", full_scan, tomorrow)
+                self._run("incremental", incremental_scan, tomorrow, **watermark)
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import OutboxEvent
+from api.outbox import MemoryQueueClient, SQLiteQueueClient, dispatch_pending
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark the outbox pipeline offline against a local queue stand-in"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=10000)
+        parser.add_argument("--limit", type=int, default=500, help="Events claimed per drain pass")
+        parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+
+    def handle(self, *args, **options):
+        events = options["events"]
+        if options["backend"] == "sqlite":
+            path = os.path.join(tempfile.mkdtemp(), "outbox_bench.sqlite3")
+            client = SQLiteQueueClient(path)
+        else:
+            client = MemoryQueueClient()
+
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                OutboxEvent.objects.bulk_create(
+                    [OutboxEvent(queue="INVENTORY", payload={"product_id": i % 500}) for i in range(events)],
+                    batch_size=1000,
+                )
+                written = time.perf_counter() - start
+
+                start = time.perf_counter()
+                sent = 0
+                while True:
+                    batch_sent, _ = dispatch_pending(client, limit=options["limit"])
+                    if not batch_sent:
+                        break
+                    sent += batch_sent
+                drained = time.perf_counter() - start
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"outbox write:  {events} events in {written:.2f}s ({events / written:,.0f}/s)")
+        self.stdout.write(
+            f"outbox drain:  {sent} events in {drained:.2f}s ({sent / drained:,.0f}/s), "
+            f"{client.batch_calls} send_message_batch call(s) [{options['backend']}]"
+        )
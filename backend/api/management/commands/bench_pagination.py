@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Inventory, Product, generate_batch_id
+from api.views import InventoryViewSet
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure inventory page latency (keyset vs offset) as the table grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20, help="Fetches averaged per measurement")
+
+    def _time(self, fetch, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fetch()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def _seed(self, product, count):
+        now = timezone.now()
+        rows = (
+            Inventory(
+                product=product, quantity=1, status="ADD", notes="pagination benchmark",
+                batch_id=generate_batch_id(product.id, now),
+            )
+            for _ in range(count)
+        )
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == 5000:
+                Inventory.objects.bulk_create(chunk)
+                chunk = []
+        Inventory.objects.bulk_create(chunk)
+
+    def handle(self, *args, **options):
+        page_size, repeat = options["page_size"], options["repeat"]
+        factory = APIRequestFactory()
+        view = InventoryViewSet.as_view({"get": "list"})
+
+        self.stdout.write(f"{'rows':>10} {'api page 1':>12} {'keyset deep':>12} {'offset deep':>12}  (ms)")
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username="bench-pagination")
+                product = Product.objects.create(name="bench-pagination", price=1, stock_quantity=0)
+                seeded = 0
+
+                for size in sorted(options["sizes"]):
+                    self._seed(product, size - seeded)
+                    seeded = size
+                    ordered = Inventory.objects.order_by("-created_at", "-id")
+
+                    def api_first_page():
+                        request = factory.get("/api/inventory/", {"page_size": page_size})
+                        force_authenticate(request, user=user)
+                        view(request).render()
+
+                    # a page in the middle of the history, reached by key or by offset
+                    middle = ordered.values_list("created_at", flat=True)[size // 2]
+
+                    def keyset_deep_page():
+                        list(ordered.filter(created_at__lt=middle)[:page_size])
+
+                    def offset_deep_page():
+                        list(ordered[size // 2:size // 2 + page_size])
+
+                    self.stdout.write(
+                        f"{size:>10,} {self._time(api_first_page, repeat):>12.2f} "
+                        f"{self._time(keyset_deep_page, repeat):>12.2f} "
+                        f"{self._time(offset_deep_page, repeat):>12.2f}"
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.inventory_movements import available_stock, bulk_create_batches
+from api.models import Customer, Inventory, Order, OrderItem, Product
+from api.stock_counters import fold_product, set_counter_slots
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent order line (or stock movement) throughput on one hot product with and without striped counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16, help="Threads writing at once")
+        parser.add_argument("--movements", type=int, default=200, help="Order lines (or movements) written by each worker")
+        parser.add_argument("--slots", type=int, default=8, help="Counter slots of the striped run")
+        parser.add_argument(
+            "--path", choices=["orders", "movements"], default="orders",
+            help="orders: each worker adds one-unit lines to its own order (FEFO allocation); "
+                 "movements: each worker writes inventory rows",
+        )
+        parser.add_argument(
+            "--statuses", default="ADD,REMOVE",
+            help="Comma separated movement statuses to cycle through with --path movements",
+        )
+
+    def _setup_order_lines(self, product, options):
+        customer = Customer.objects.create(
+            name="bench-striping", email=f"bench-striping-{product.id}@example.com", eir_code="D01", zone=1
+        )
+        # one single-unit batch per line, so SKIP LOCKED spreads the workers over different batches
+        bulk_create_batches([
+            {
+                "product": product, "quantity": 1, "status": "ADD", "notes": "bench",
+                "expiry_date": date.today() + timedelta(days=30),
+            }
+            for _ in range(options["workers"] * options["movements"])
+        ])
+
+        def worker(index):
+            try:
+                hot = Product.objects.get(pk=product.id)
+                order = Order.objects.create(customer=customer, total_amount=0)
+                for _ in range(options["movements"]):
+                    OrderItem.objects.create(order=order, product=hot, quantity=1, unit_price=1)
+            finally:
+                connection.close()
+
+        def check():
+            if available_stock(product.id) != 0:
+                self.stderr.write(f"available stock drifted: {available_stock(product.id)} != 0")
+
+        return worker, check, customer
+
+    def _setup_movements(self, product, options):
+        statuses = options["statuses"].split(",")
+
+        def worker(index):
+            try:
+                hot = Product.objects.get(pk=product.id)
+                for i in range(options["movements"]):
+                    Inventory.objects.create(product=hot, quantity=1, status=statuses[(index + i) % len(statuses)])
+            finally:
+                connection.close()
+
+        def check():
+            product.refresh_from_db()
+            expected = 10 ** 8 + sum(
+                1 if statuses[(index + i) % len(statuses)] in ("ADD", "RETURN") else -1
+                for index in range(options["workers"]) for i in range(options["movements"])
+            )
+            if product.stock_quantity != expected:
+                self.stderr.write(f"stock drifted: {product.stock_quantity} != {expected}")
+
+        return worker, check, None
+
+    def _run(self, slots, options):
+        opening = 10 ** 8 if options["path"] == "movements" else 0
+        product = Product.objects.create(name="bench-striping", price=1, stock_quantity=opening)
+        set_counter_slots(product.id, slots)
+        setup = self._setup_order_lines if options["path"] == "orders" else self._setup_movements
+        worker, check, customer = setup(product, options)
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                list(pool.map(worker, range(options["workers"])))
+            elapsed = time.perf_counter() - start
+
+            fold_product(product.id)
+            check()
+        finally:
+            if customer is not None:
+                customer.delete()
+            product.delete()
+
+        writes = options["workers"] * options["movements"]
+        label = f"{slots} slots" if slots else "unstriped"
+        self.stdout.write(f"{label:<10} {writes} {options['path']} in {elapsed:7.2f}s {writes / elapsed:9.0f}/s")
+        return writes / elapsed
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite":
+            self.stderr.write("SQLite serializes every write, run this against PostgreSQL for meaningful numbers")
+
+        plain = self._run(0, options)
+        striped = self._run(options["slots"], options)
+        self.stdout.write(f"speedup    {striped / plain:.2f}x")
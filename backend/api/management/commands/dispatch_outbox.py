@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.outbox import MAX_ATTEMPTS, dispatch_pending, get_queue_client
+
+
+class Command(BaseCommand):
+    help = "Drain the transactional outbox to SQS with send_message_batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=500, help="Events claimed per drain pass")
+        parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once drained")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep between polls when idle")
+        parser.add_argument("--backend", choices=["sqs", "memory", "sqlite"], help="Override OUTBOX_SQS_BACKEND")
+
+    def handle(self, *args, **options):
+        client = get_queue_client(options["backend"])
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = dispatch_pending(client, limit=options["limit"], max_attempts=options["max_attempts"])
+            total_sent += sent
+            total_failed += failed
+
+            # anything left is either in backoff or claimed by another dispatcher
+            if sent == 0:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(f"dispatched {total_sent} event(s), {total_failed} failed send(s)")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.stock_counters import fold_all, set_counter_slots
+
+
+class Command(BaseCommand):
+    help = "Fold the counter slots of striped products back into Product.stock_quantity"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stripe", type=int, metavar="PRODUCT_ID", help="Change the striping of one product")
+        parser.add_argument("--slots", type=int, default=8, help="Slots for --stripe, 0 turns striping off")
+        parser.add_argument("--loop", action="store_true", help="Keep folding instead of exiting")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between folds with --loop")
+
+    def handle(self, *args, **options):
+        if options["stripe"]:
+            set_counter_slots(options["stripe"], options["slots"])
+            self.stdout.write(f"product {options['stripe']} now uses {options['slots']} counter slot(s)")
+            return
+
+        while True:
+            folded = fold_all()
+            self.stdout.write(f"folded {folded} product(s)")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
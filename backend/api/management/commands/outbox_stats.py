@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.outbox import coalescing_stats
+
+
+class Command(BaseCommand):
+    help = "Report how many outbox messages and Lambda invocations event coalescing saved"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, help="Only count events dispatched in the last N hours")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options["hours"]) if options["hours"] else None
+        stats = coalescing_stats(since)
+
+        self.stdout.write(f"events raised:        {stats['events']}")
+        self.stdout.write(f"messages sent:        {stats['messages']}")
+        self.stdout.write(
+            f"messages saved:       {stats['messages_saved']} ({stats['message_reduction']:.1%} reduction)"
+        )
+        self.stdout.write(
+            f"lambda invocations:   {stats['lambda_invocations']} "
+            f"(vs {stats['lambda_invocations_uncoalesced']} without coalescing)"
+        )
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.demand import rebuild_demand_forecasts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the incremental demand forecast state from delivered order history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="Days of delivered orders to replay")
+        parser.add_argument("--product", type=int, action="append", help="Only rebuild these product ids")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"])
+        rebuilt = rebuild_demand_forecasts(since, options["product"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt demand forecasts of {rebuilt} product(s) from {options['days']} days of deliveries"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.inventory_movements import available_stock_drift, rebuild_available_stock
+
+
+class Command(BaseCommand):
+    help = "Rebuild the available-stock projection from the inventory ledger and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, action="append", help="Only reconcile these product ids")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without rewriting anything")
+
+    def handle(self, *args, **options):
+        drift = available_stock_drift(options["product"])
+
+        for product_id, rows in drift.items():
+            for expiry_month, stored, ledger in rows:
+                bucket = "total" if expiry_month is None else f"{expiry_month:%Y-%m}"
+                self.stdout.write(f"product {product_id} {bucket}: stored {stored}, ledger {ledger} ({stored - ledger:+d})")
+            if not options["dry_run"]:
+                rebuild_available_stock(product_id)
+
+        if not drift:
+            self.stdout.write("No drift, available stock matches the ledger")
+        elif options["dry_run"]:
+            self.stdout.write(f"{len(drift)} product(s) drifted, nothing rewritten (--dry-run)")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt available stock of {len(drift)} product(s)"))
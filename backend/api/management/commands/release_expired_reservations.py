@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.reservations import SWEEP_CHUNK_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = "Release stock reservations whose hold has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=SWEEP_CHUNK_SIZE, help="Holds released per pass")
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping instead of exiting once done")
+        parser.add_argument("--interval", type=float, default=10.0, help="Seconds to sleep between sweeps when idle")
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            released = release_expired(limit=options["limit"])
+            total += released
+
+            if released < options["limit"]:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(f"released {total} expired reservation(s)")
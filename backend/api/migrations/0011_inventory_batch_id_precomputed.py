@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_customer_order_orderitem_salesorder_shipmentorder"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="inventory",
+            unique_together=set(),
+        ),
+    ]
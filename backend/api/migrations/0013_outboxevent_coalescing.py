@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_outboxevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxevent",
+            name="coalesce_key",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="outboxevent",
+            name="coalesced_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name="outboxevent",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("dispatched_at__isnull", True)),
+                fields=("coalesce_key",),
+                name="outbox_pending_coalesce_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_outboxevent_coalescing"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventory",
+            index=models.Index(
+                fields=["created_at", "id"], name="inventory_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["created_at", "id"], name="notification_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["order_date", "id"], name="order_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["created_at", "id"], name="orderitem_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shipmentorder",
+            index=models.Index(
+                fields=["created_at", "id"], name="shipmentorder_created_idx"
+            ),
+        ),
+    ]
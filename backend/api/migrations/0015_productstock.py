@@ -0,0 +1,104 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:51
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_available_stock(apps, schema_editor):
+    """Build the projection from the existing ADD/RETURN ledger rows"""
+    Inventory = apps.get_model("api", "Inventory")
+    ProductStock = apps.get_model("api", "ProductStock")
+    ProductStockBucket = apps.get_model("api", "ProductStockBucket")
+
+    rows = (
+        Inventory.objects.filter(status__in=["ADD", "RETURN"])
+        .annotate(expiry_month=TruncMonth("expiry_date"))
+        .values("product_id", "expiry_month")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    )
+    totals = {}
+    buckets = []
+    for row in rows:
+        buckets.append(
+            ProductStockBucket(
+                product_id=row["product_id"],
+                expiry_month=row["expiry_month"] or datetime.date(9999, 12, 1),
+                available=row["units"],
+            )
+        )
+        totals[row["product_id"]] = totals.get(row["product_id"], 0) + row["units"]
+
+    ProductStockBucket.objects.bulk_create(buckets, batch_size=1000)
+    ProductStock.objects.bulk_create(
+        [
+            ProductStock(product_id=product_id, available=units)
+            for product_id, units in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_ledger_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductStock",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="available_stock",
+                        serialize=False,
+                        to="api.product",
+                    ),
+                ),
+                ("available", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ProductStockBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("expiry_month", models.DateField()),
+                ("available", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_buckets",
+                        to="api.product",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "expiry_month"),
+                        name="productstockbucket_product_month",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_available_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_received_quantity(apps, schema_editor):
+    """Orders already marked as received were received in full"""
+    PurchaseOrder = apps.get_model("api", "PurchaseOrder")
+    PurchaseOrder.objects.filter(status="RECEIVED").update(
+        received_quantity=models.F("quantity")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0016_idempotencykey"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="purchaseorder",
+            name="received_quantity",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="PurchaseOrderReceipt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField()),
+                ("reference", models.CharField(blank=True, max_length=100, null=True)),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "inventory",
+                    models.OneToOneField(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="purchase_receipt",
+                        to="api.inventory",
+                    ),
+                ),
+                (
+                    "purchase_order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="receipts",
+                        to="api.purchaseorder",
+                    ),
+                ),
+                (
+                    "received_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="purchase_receipts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("purchase_order", "reference"),
+                        name="purchasereceipt_po_reference",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_received_quantity, migrations.RunPython.noop),
+    ]
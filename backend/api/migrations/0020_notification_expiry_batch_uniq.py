@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def drop_duplicate_expiry_notifications(apps, schema_editor):
+    """Keep the oldest expiry notification of each batch"""
+    Notification = apps.get_model("api", "Notification")
+    keep = (
+        Notification.objects.filter(type="STOCK_EXPIRY", batch_id__isnull=False)
+        .values("batch_id")
+        .annotate(first_id=Min("id"))
+        .values("first_id")
+    )
+    Notification.objects.filter(type="STOCK_EXPIRY", batch_id__isnull=False).exclude(
+        id__in=keep
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0019_stock_counter_slots"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_duplicate_expiry_notifications, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("type", "STOCK_EXPIRY")),
+                fields=("batch_id",),
+                name="notification_expiry_batch_uniq",
+            ),
+        ),
+    ]
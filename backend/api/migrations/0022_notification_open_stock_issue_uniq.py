@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:12
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def close_duplicate_stock_issues(apps, schema_editor):
+    """Keep the newest open stock alert of each product, close the rest"""
+    Notification = apps.get_model("api", "Notification")
+    open_issues = Notification.objects.filter(status="OPEN", type="STOCK_ISSUE")
+    keep = (
+        open_issues.values("product_name").annotate(last_id=Max("id")).values("last_id")
+    )
+    open_issues.exclude(id__in=keep).update(status="CLOSED")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0021_expiry_scan_watermark"),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_stock_issues, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "OPEN"), ("type", "STOCK_ISSUE")),
+                fields=("product_name", "type"),
+                name="notification_open_stock_issue_uniq",
+            ),
+        ),
+    ]
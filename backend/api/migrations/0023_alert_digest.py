@@ -0,0 +1,68 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0022_notification_open_stock_issue_uniq"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlertDigestWindow",
+            fields=[
+                (
+                    "topic_arn",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("last_published_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AlertDigestItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("topic_arn", models.CharField(max_length=255)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("STOCK_ISSUE", "Stock Issue"),
+                            ("STOCK_EXPIRY", "Stock Expiry"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("detail", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="alert_digest_items",
+                        to="api.product",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("topic_arn", "kind", "product"),
+                        name="alertdigestitem_topic_kind_product",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0023_alert_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DemandForecast",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="demand_forecast",
+                        serialize=False,
+                        to="api.product",
+                    ),
+                ),
+                ("day", models.DateField(null=True)),
+                ("day_demand", models.FloatField(default=0)),
+                ("level", models.FloatField(null=True)),
+                ("trend", models.FloatField(default=0)),
+                ("demand_size", models.FloatField(null=True)),
+                ("demand_interval", models.FloatField(null=True)),
+                ("periods_since_demand", models.PositiveIntegerField(default=0)),
+                ("observations", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
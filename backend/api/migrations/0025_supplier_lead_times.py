@@ -0,0 +1,126 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Min
+
+# notes of the inventory row written when a purchase order was marked RECEIVED, before receipts existed
+LEGACY_RECEIPT_NOTES = "Stock received from Purchase Order "
+
+
+def backfill_lead_times(apps, schema_editor):
+    """Lead time statistics from the first receipt of every purchase order received so far.
+
+    Orders received before PurchaseOrderReceipt existed only left an ADD
+    inventory row noted with their id, its created_at is their receipt date.
+    """
+    Inventory = apps.get_model("api", "Inventory")
+    PurchaseOrder = apps.get_model("api", "PurchaseOrder")
+    SupplierLeadTime = apps.get_model("api", "SupplierLeadTime")
+
+    received = dict(
+        PurchaseOrder.objects.annotate(first_received_at=Min("receipts__received_at"))
+        .filter(first_received_at__isnull=False)
+        .values_list("id", "first_received_at")
+    )
+    legacy = Inventory.objects.filter(
+        status="ADD", notes__startswith=LEGACY_RECEIPT_NOTES
+    ).values_list("notes", "product_id", "created_at")
+    legacy_received = {}
+    for notes, product_id, created_at in legacy.iterator():
+        order_id = notes[len(LEGACY_RECEIPT_NOTES) :].strip()
+        if order_id.isdigit():
+            key = (int(order_id), product_id)
+            legacy_received[key] = min(created_at, legacy_received.get(key, created_at))
+
+    lead_times = defaultdict(list)
+    orders = PurchaseOrder.objects.values_list(
+        "id", "supplier_id", "product_id", "order_date"
+    )
+    for order_id, supplier_id, product_id, order_date in orders.iterator():
+        dates = [
+            date
+            for date in (
+                received.get(order_id),
+                legacy_received.get((order_id, product_id)),
+            )
+            if date
+        ]
+        if not dates:
+            continue
+        days = max((min(dates) - order_date).total_seconds(), 0) / 86400
+        lead_times[(supplier_id, product_id)].append(days)
+
+    rows = []
+    for (supplier_id, product_id), values in lead_times.items():
+        mean = sum(values) / len(values)
+        rows.append(
+            SupplierLeadTime(
+                supplier_id=supplier_id,
+                product_id=product_id,
+                count=len(values),
+                mean_days=mean,
+                m2=sum((value - mean) ** 2 for value in values),
+            )
+        )
+    SupplierLeadTime.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0024_demandforecast"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="demandforecast",
+            name="error_variance",
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name="SupplierLeadTime",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("mean_days", models.FloatField(default=0)),
+                ("m2", models.FloatField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="supplier_lead_times",
+                        to="api.product",
+                    ),
+                ),
+                (
+                    "supplier",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lead_times",
+                        to="api.supplier",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("supplier", "product"),
+                        name="supplierleadtime_supplier_product",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_lead_times, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0025_supplier_lead_times"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stockreservation",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("ACTIVE", "Active"),
+                    ("CONFIRMED", "Confirmed"),
+                    ("RELEASED", "Released"),
+                    ("EXPIRED", "Expired"),
+                    ("FAILED", "Failed"),
+                ],
+                default="ACTIVE",
+                max_length=20,
+            ),
+        ),
+    ]
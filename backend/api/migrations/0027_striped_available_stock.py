@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0026_stockreservation_failed_status"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="productstockbucket",
+            name="productstockbucket_product_month",
+        ),
+        migrations.AddField(
+            model_name="productstockbucket",
+            name="slot",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="stockcounterslot",
+            name="available",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name="productstockbucket",
+            constraint=models.UniqueConstraint(
+                fields=("product", "expiry_month", "slot"),
+                name="productstockbucket_product_month_slot",
+            ),
+        ),
+    ]
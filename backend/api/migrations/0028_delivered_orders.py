@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_delivered_orders(apps, schema_editor):
+    """Orders delivered before this migration were already fed into the forecasts"""
+    Order = apps.get_model("api", "Order")
+    DeliveredOrder = apps.get_model("api", "DeliveredOrder")
+    DeliveredOrder.objects.bulk_create(
+        (DeliveredOrder(order_id=order_id) for order_id in
+         Order.objects.filter(status="DELIVERED").values_list("id", flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0027_striped_available_stock"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeliveredOrder",
+            fields=[
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="delivered_record",
+                        serialize=False,
+                        to="api.order",
+                    ),
+                ),
+                ("recorded_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(mark_delivered_orders, migrations.RunPython.noop),
+    ]
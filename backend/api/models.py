@@ -2,11 +2,31 @@ from django.db import models
 from django.contrib.auth.models import User
 from datetime import timedelta
 from django.utils import timezone
-from django.conf import settings
-from .inventory_stock_sqs import InventoryOptimizationQueue
+from django.core.serializers.json import DjangoJSONEncoder
+from .inventory_movements import record_movement
+from . import outbox
+from .stock_allocation import allocate_fefo, return_stock
+from .orders import add_to_order_total, line_amount
+from .demand import record_delivered_units, record_deliveries
 from django.db import transaction
-import json
-import boto3
+import itertools
+import secrets
+
+#per-process sequence keeping batch ids unique within the same microsecond
+_batch_sequence = itertools.count()
+
+
+def generate_batch_id(product_id, created_at=None):
+    """Build an inventory batch id before the row is inserted.
+
+    Ids keep the "{product_id}-{timestamp}" shape but carry microseconds, a
+    per-process sequence and a random suffix, so they sort by creation time and
+    batches received in the same second (or in one bulk_create) never collide.
+    """
+    created_at = created_at or timezone.now()
+    sequence = next(_batch_sequence) % 0x10000
+    return f"{product_id}-{created_at.strftime('%Y%m%d%H%M%S%f')}-{sequence:04x}{secrets.token_hex(3)}"
+
 
 #database tables below
 class ProductCategory(models.Model):
@@ -28,6 +48,7 @@ class Product(models.Model):
     category = models.ForeignKey(ProductCategory, on_delete=models.SET_NULL, null=True, related_name="products")
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.PositiveIntegerField()
+    counter_slots = models.PositiveSmallIntegerField(default=0)  #>0 stripes stock_quantity over StockCounterSlots
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="products_created_by")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -40,14 +61,31 @@ class Product(models.Model):
         super().save(*args, **kwargs)
 
         if is_new:
-            Inventory.objects.create(
+            # opening batch for the ledger, stock_quantity already holds it
+            Inventory(
                 product=self,
                 quantity=self.stock_quantity,
                 status="ADD",
                 notes="Initial stock on product creation",
                 updated_by=self.created_by,
                 expiry_date=timezone.now() + timedelta(days=180),  
-            )
+            ).save(apply_stock=False)
+
+
+class StockCounterSlot(models.Model):
+    """Pending stock changes of a striped product, summed on read and folded back periodically"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="counter_slot_rows")
+    slot = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0)  #pending change to Product.stock_quantity
+    available = models.IntegerField(default=0)  #pending change to ProductStock.available
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "slot"], name="stockcounterslot_product_slot"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}#{self.slot}: {self.delta:+d}"
 
 
 class Inventory(models.Model):
@@ -65,37 +103,86 @@ class Inventory(models.Model):
     batch_id = models.CharField(max_length=100, editable=False, unique=True, null=True) 
 
     class Meta:
-        #create unique row (batcht_id) based on the columns below
-        unique_together = ("product", "created_at", "expiry_date")
-
-    def save(self, *args, **kwargs):
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="inventory_created_idx"),
+            #expiry scans only look at batches that still hold stock
+            models.Index(
+                fields=["expiry_date"], condition=models.Q(quantity__gt=0), name="inventory_expiry_stocked_idx"
+            ),
+        ]
+
+    def save(self, *args, apply_stock=True, **kwargs):
         """Override the save method to automatically update the stock quantity of the related product and set batch_id."""
-     
-        super().save(*args, **kwargs)
 
-        # generate bacth id
+        # generate batch id up front so the row is written with a single insert
         if not self.batch_id:
-            self.batch_id = f"{self.product.id}-{self.created_at.strftime('%Y%m%d%H%M%S')}"
-            # Save again to store the batch_id in the database
-            super().save(update_fields=['batch_id'])
+            self.batch_id = generate_batch_id(self.product_id)
 
-        # Update the product's stock quantity based on this inventory record
-        if self.status in ["ADD", "RETURN"]:
-            self.product.stock_quantity += self.quantity
-        elif self.status in ["REMOVE", "ADJUST"]:
-            self.product.stock_quantity -= abs(self.quantity)
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    Inventory.objects.filter(pk=self.pk)
+                    .values_list("product_id", "status", "quantity", "expiry_date").first()
+                )
 
-        self.product.save()
+            super().save(*args, **kwargs)
 
-        # queue operation for lambda function
-        if self.status == "REMOVE":
-            queue = InventoryOptimizationQueue(settings.AWS_INVENTORY_SQS_QUEUE_URL)
-            queue.queue_product_id(self.product.id)
+            # Update the product's stock quantity and available stock based on this inventory record
+            record_movement(self, previous, update_counter=apply_stock)
 
     def __str__(self):
         return f"{self.product.name} - {self.status} ({self.quantity}) - Expiry: {self.expiry_date}"
 
 
+class ProductStock(models.Model):
+    """Sellable stock per product, kept in step with the inventory ledger"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="available_stock")
+    available = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0)  #units held by active StockReservations
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.available} available, {self.reserved} reserved"
+
+
+class ProductStockBucket(models.Model):
+    """Sellable stock per product and batch expiry month, summed over slots"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_buckets")
+    expiry_month = models.DateField()  #first day of the month, NO_EXPIRY_BUCKET for batches without expiry
+    slot = models.PositiveSmallIntegerField(default=0)  #counter slot + 1 for unfolded writes of a striped product, 0 otherwise
+    available = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "expiry_month", "slot"], name="productstockbucket_product_month_slot"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.expiry_month:%Y-%m}#{self.slot}: {self.available} available"
+
+
+class DemandForecast(models.Model):
+    """Incremental daily demand forecast state per product, see DemandForecaster"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="demand_forecast")
+    day = models.DateField(null=True)  #open day, its demand is still being collected
+    day_demand = models.FloatField(default=0)
+    level = models.FloatField(null=True)
+    trend = models.FloatField(default=0)
+    error_variance = models.FloatField(default=0)
+    demand_size = models.FloatField(null=True)
+    demand_interval = models.FloatField(null=True)
+    periods_since_demand = models.PositiveIntegerField(default=0)
+    observations = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id} forecast as of {self.day}"
+
+
 class Supplier(models.Model):
     """Supplier Table"""
     name = models.CharField(max_length=200)
@@ -127,12 +214,13 @@ class PurchaseOrder(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="purchase_orders_created_by")
     notes = models.TextField(blank=True, null=True)
     batch_id = models.CharField(max_length=100, editable=False, unique=True, blank=True) 
+    received_quantity = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"PO-{self.id} ({self.supplier.name} - {self.product.name})"
 
     def save(self, *args, **kwargs):
-        """Handle inventory when an order is marked as 'Received'."""
+        """Set the batch id, stock is only added through api.receiving.receive_purchase_orders."""
         super().save(*args, **kwargs)  
 
         # create batch id
@@ -140,20 +228,41 @@ class PurchaseOrder(models.Model):
             self.batch_id = f"PO-{self.id}-{self.order_date.strftime('%Y%m%d%H%M%S')}"
             super().save(update_fields=['batch_id'])  
 
-        if self.status == "RECEIVED":
-            # Determine the expiry date for the inventory batch 
-            default_expiry_period = 180  
-            expiry_date = self.expected_delivery_date + timedelta(days=default_expiry_period) if self.expected_delivery_date else None
-            
-            # Create an inventory record to add the received stock
-            Inventory.objects.create(
-                product=self.product,
-                quantity=self.quantity,
-                status="ADD",
-                notes=f"Stock received from Purchase Order {self.id}",
-                updated_by=self.created_by,
-                expiry_date=expiry_date, 
-            )
+
+class SupplierLeadTime(models.Model):
+    """Running lead time statistics (Welford) per supplier and product, in days"""
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="lead_times")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="supplier_lead_times")
+    count = models.PositiveIntegerField(default=0)
+    mean_days = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)  #sum of squared deviations from the mean
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["supplier", "product"], name="supplierleadtime_supplier_product"),
+        ]
+
+    def __str__(self):
+        return f"{self.supplier_id}/{self.product_id}: {self.mean_days:.1f} days over {self.count} deliveries"
+
+
+class PurchaseOrderReceipt(models.Model):
+    """Stock received against a purchase order, one row per delivery"""
+    purchase_order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name="receipts")
+    inventory = models.OneToOneField(Inventory, on_delete=models.SET_NULL, null=True, related_name="purchase_receipt")
+    quantity = models.PositiveIntegerField()
+    reference = models.CharField(max_length=100, blank=True, null=True)  #delivery note line, recorded once per PO
+    received_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="purchase_receipts")
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["purchase_order", "reference"], name="purchasereceipt_po_reference"),
+        ]
+
+    def __str__(self):
+        return f"PO-{self.purchase_order_id} received {self.quantity}"
 
 
 class Shipment(models.Model):
@@ -191,9 +300,61 @@ class Notification(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"], name="notification_created_idx")]
+        constraints = [
+            #one expiry notification per batch, the expiry Lambda upserts against it
+            models.UniqueConstraint(
+                fields=["batch_id"],
+                condition=models.Q(type="STOCK_EXPIRY"),
+                name="notification_expiry_batch_uniq",
+            ),
+            #one open stock alert per product, the stock-level Lambda refreshes it in place
+            models.UniqueConstraint(
+                fields=["product_name", "type"],
+                condition=models.Q(status="OPEN", type="STOCK_ISSUE"),
+                name="notification_open_stock_issue_uniq",
+            ),
+        ]
+
     def __str__(self):
         return f"Notification for {self.product_name.name} - {self.type}"
 
+class ExpiryScanWatermark(models.Model):
+    """How far the expiry Lambda has scanned, so each run only looks at what changed since"""
+    name = models.CharField(max_length=50, primary_key=True)
+    window_end = models.DateField()  #last expiry date already inside the scanned window
+    last_inventory_id = models.BigIntegerField(default=0)  #newest batch seen by the last run
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} up to {self.window_end}"
+
+class AlertDigestItem(models.Model):
+    """Alert waiting for the next SNS digest of its topic, one row per topic, kind and product"""
+    topic_arn = models.CharField(max_length=255)
+    kind = models.CharField(max_length=50, choices=[("STOCK_ISSUE", "Stock Issue"), ("STOCK_EXPIRY", "Stock Expiry")])
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="alert_digest_items")
+    count = models.PositiveIntegerField(default=0)  #alerts folded into this row since the last digest
+    detail = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["topic_arn", "kind", "product"], name="alertdigestitem_topic_kind_product"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.product_id} on {self.topic_arn} ({self.count})"
+
+class AlertDigestWindow(models.Model):
+    """When each SNS topic last got a digest"""
+    topic_arn = models.CharField(max_length=255, primary_key=True)
+    last_published_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.topic_arn} at {self.last_published_at}"
+
 class Customer(models.Model):
     """Customer Table"""
     name = models.CharField(max_length=200)
@@ -231,9 +392,29 @@ class Order(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="orders_created_by")
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["order_date", "id"], name="order_date_idx")]
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name}"
 
+    def save(self, *args, **kwargs):
+        """Feed an order's lines into the demand forecasts the first time it is delivered."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.status == "DELIVERED":
+                record_deliveries([self.pk])
+
+
+class DeliveredOrder(models.Model):
+    """Delivered orders whose lines are already in the demand forecasts"""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name="delivered_record")
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order #{self.order_id} recorded {self.recorded_at}"
+
+
 class OrderItem(models.Model):
     """Order Items Table"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -242,31 +423,97 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"], name="orderitem_created_idx")]
+
     def __str__(self):
         return f"{self.order.id} - {self.product.name} ({self.quantity})"
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, update_total=True, held=0, **kwargs):
+        """Allocate stock for the line and add its amount to the order total.
+
+        Editing a saved line allocates the extra units, or returns the removed
+        ones to stock; moving it to another product returns all of its units and
+        allocates the new product from scratch.
+        update_total=False leaves the total alone, for callers that write it themselves.
+        held is the number of units a reservation being confirmed into this line
+        holds, the allocation may use them.
+        """
+        is_new = self.pk is None
         with transaction.atomic():
+            previous = None
+            if not is_new:
+                previous = (
+                    OrderItem.objects.filter(pk=self.pk)
+                    .values_list("order_id", "product_id", "quantity", "unit_price").first()
+                )
+
             super().save(*args, **kwargs)
-            
-            remaining_quantity = self.quantity
-            batches = Inventory.objects.filter(
-                product=self.product,
-                status__in=["ADD", "RETURN"]
-            ).order_by('expiry_date')
-            # handles creation of orders
-            for batch in batches:
-                if remaining_quantity <= 0:
-                    break
-
-                if batch.quantity > 0:
-                    quantity_from_batch = min(batch.quantity, remaining_quantity)
-                    batch.quantity -= quantity_from_batch
-                    batch.save()
-                    remaining_quantity -= quantity_from_batch
-
-            if remaining_quantity > 0:
-                raise ValueError(f"Insufficient stock for product {self.product.name}")
+
+            # allocate stock from batches (first expiry first out)
+            if previous is None:
+                allocate_fefo(self.product, self.quantity, held=held)
+            else:
+                order_id, product_id, quantity, unit_price = previous
+                notes = f"Returned from order line {self.pk}"
+                if product_id != self.product_id:
+                    return_stock(Product.objects.get(pk=product_id), quantity, notes)
+                    allocate_fefo(self.product, self.quantity, held=held)
+                elif self.quantity > quantity:
+                    allocate_fefo(self.product, self.quantity - quantity, held=held)
+                else:
+                    return_stock(self.product, quantity - self.quantity, notes)
+
+            # units added to an order whose delivery is already in the forecasts
+            if self.order.status == "DELIVERED":
+                added = self.quantity
+                if previous is not None and previous[:2] == (self.order_id, self.product_id):
+                    added -= previous[2]
+                record_delivered_units(self.order_id, self.product_id, added)
+
+            if update_total:
+                amount = line_amount(self.quantity, self.unit_price)
+                if previous is not None:
+                    order_id, _, quantity, unit_price = previous
+                    if order_id == self.order_id:
+                        amount -= line_amount(quantity, unit_price)
+                    else:
+                        # the line moved to another order, take it off the old total
+                        add_to_order_total(order_id, -line_amount(quantity, unit_price))
+                add_to_order_total(self.order_id, amount)
+
+class StockReservation(models.Model):
+    """Stock held for a checkout until the order is confirmed or the hold expires"""
+    STATUS_CHOICES = [
+        ("ACTIVE", "Active"),
+        ("CONFIRMED", "Confirmed"),
+        ("RELEASED", "Released"),
+        ("EXPIRED", "Expired"),
+        ("FAILED", "Failed"),  #the held stock was gone by the time the hold was confirmed
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="reservations")
+    order_item = models.OneToOneField(OrderItem, on_delete=models.SET_NULL, null=True, blank=True, related_name="reservation")
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="ACTIVE")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="reservations_created_by")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="reservation_created_idx"),
+            models.Index(
+                fields=["expires_at", "id"],
+                name="reservation_active_idx",
+                condition=models.Q(status="ACTIVE"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} ({self.status})"
+
 
 class SalesOrder(models.Model):
     """Sales Order Table"""
@@ -300,31 +547,77 @@ class ShipmentOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"], name="shipmentorder_created_idx")]
+
     def __str__(self):
         return f"Shipment for Order #{self.order.id} - {self.order.customer.name}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-        # Send message to SQS
-        if self.status == "PENDING":
-            sqs = boto3.client(
-                'sqs',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
-            )
-
-            message = {
-                'order_id': self.order.id,
-                'shipping_zone': self.order.customer.zone,
-                'eir_code': self.shipping_address
-            }
-
-            try:
-                sqs.send_message(
-                    QueueUrl=settings.AWS_SHIPMENT_SQS_QUEUE_URL,
-                    MessageBody=json.dumps(message)
-                )
-            except Exception as e:
-                print(f"Error sending to SQS: {e}")
\ No newline at end of file
+            # queue message for SQS, sent by the outbox dispatcher once committed
+            if self.status == "PENDING":
+                message = {
+                    'order_id': self.order.id,
+                    'shipping_zone': self.order.customer.zone,
+                    'eir_code': self.shipping_address
+                }
+                outbox.enqueue("SHIPMENT", message)
+
+
+class OutboxEvent(models.Model):
+    """Outgoing SQS messages, written in the same transaction as the change that raised them"""
+    QUEUE_CHOICES = [
+        ("INVENTORY", "Inventory optimization"),
+        ("SHIPMENT", "Shipment"),
+    ]
+
+    queue = models.CharField(max_length=20, choices=QUEUE_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    coalesce_key = models.CharField(max_length=100, blank=True, null=True)
+    coalesced_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["available_at", "id"],
+                name="outbox_pending_idx",
+                condition=models.Q(dispatched_at__isnull=True),
+            ),
+        ]
+        constraints = [
+            #at most one pending event per coalesce key
+            models.UniqueConstraint(
+                fields=["coalesce_key"],
+                name="outbox_pending_coalesce_key",
+                condition=models.Q(dispatched_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.queue} event #{self.id} ({'sent' if self.dispatched_at else 'pending'})"
+
+class IdempotencyKey(models.Model):
+    """Stored responses of writes sent with an Idempotency-Key header, replayed when the client retries"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  #null while the first attempt runs
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotencykey_user_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
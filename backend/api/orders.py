@@ -0,0 +1,82 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+
+def line_amount(quantity, unit_price):
+    """Amount an order line adds to its order's total"""
+    return quantity * Decimal(unit_price)
+
+
+def add_to_order_total(order_id, amount):
+    """Add amount to an order's total with a single UPDATE ... SET total_amount = total_amount + amount.
+
+    Concurrent lines on the same order never overwrite each other and the
+    order's other columns are not rewritten.
+    """
+    from .models import Order
+
+    if amount:
+        Order.objects.filter(pk=order_id).update(total_amount=F("total_amount") + amount)
+
+
+def create_orders_bulk(orders, user=None):
+    """Create one or many orders with their lines in one transaction.
+
+    This is the only order-with-lines write path, used by /api/orders/bulk/
+    for a single order as much as for a marketplace import.
+
+    orders: iterable of dicts with customer (a Customer), lines (dicts with
+    product and quantity) and optional status / notes. The quantity of every
+    line is summed per product and allocated with allocate_fefo_many, then the
+    orders and their lines go in with one bulk_create each; totals are computed
+    in Python. Orders created as DELIVERED are fed into the demand forecasts,
+    as Order.save would. Raises InsufficientStockError (and writes nothing) if any
+    product is short.
+
+    Returns the created orders, each with its OrderItem rows in .lines.
+    """
+    from .dashboard import invalidate_dashboard_stats
+    from .demand import record_deliveries
+    from .inventory_movements import BULK_INSERT_BATCH_SIZE
+    from .models import Order, OrderItem
+    from .stock_allocation import allocate_fefo_many
+
+    created, demand = [], defaultdict(int)
+    for data in orders:
+        order = Order(
+            customer=data["customer"],
+            status=data.get("status", "PENDING"),
+            notes=data.get("notes"),
+            created_by=user,
+        )
+        order.lines = [
+            OrderItem(product=line["product"], quantity=line["quantity"], unit_price=line["product"].price)
+            for line in data["lines"]
+        ]
+        order.total_amount = sum(
+            (line_amount(item.quantity, item.unit_price) for item in order.lines), Decimal("0")
+        )
+        for item in order.lines:
+            demand[item.product] += item.quantity
+        created.append(order)
+
+    with transaction.atomic():
+        allocate_fefo_many(demand)
+        Order.objects.bulk_create(created, batch_size=BULK_INSERT_BATCH_SIZE)
+        for order in created:
+            for item in order.lines:
+                item.order = order
+        OrderItem.objects.bulk_create(
+            [item for order in created for item in order.lines], batch_size=BULK_INSERT_BATCH_SIZE
+        )
+        # bulk_create skips Order.save, which feeds delivered orders into the demand forecasts
+        delivered = [order.pk for order in created if order.status == "DELIVERED"]
+        if delivered:
+            record_deliveries(delivered)
+        # bulk_create sends no post_save signals
+        invalidate_dashboard_stats()
+
+    return created
@@ -0,0 +1,246 @@
+from datetime import timedelta
+from functools import lru_cache
+from math import ceil
+import json
+import logging
+import sqlite3
+import threading
+
+import boto3
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+#settings holding the queue url of each outbox queue
+QUEUE_URL_SETTINGS = {
+    "INVENTORY": "AWS_INVENTORY_SQS_QUEUE_URL",
+    "SHIPMENT": "AWS_SHIPMENT_SQS_QUEUE_URL",
+}
+
+#send_message_batch accepts at most 10 entries
+SQS_BATCH_SIZE = 10
+
+#retry schedule for failed sends: 2s, 4s, 8s ... capped at 5 minutes
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+MAX_ATTEMPTS = 8
+
+#claimed events are hidden from other dispatchers this long while they are being sent
+CLAIM_SECONDS = 60
+
+
+def enqueue(queue, payload, coalesce_key=None, merge=None):
+    """Write an event to the outbox.
+
+    Call this inside the transaction that makes the change, the event is then
+    only ever sent if that transaction commits.
+
+    Events with a coalesce_key are debounced: the first one is held back for
+    OUTBOX_COALESCE_WINDOW_SECONDS and any event with the same key raised
+    before it is sent is folded into it (merge(old_payload, new_payload), or
+    the new payload when no merge is given) instead of adding a message.
+    """
+    from .models import OutboxEvent
+
+    if coalesce_key is None:
+        return OutboxEvent.objects.create(queue=queue, payload=payload)
+
+    with transaction.atomic():
+        for _ in range(2):
+            pending = (
+                OutboxEvent.objects.select_for_update()
+                .filter(coalesce_key=coalesce_key, dispatched_at__isnull=True)
+                .first()
+            )
+            if pending:
+                pending.payload = merge(pending.payload, payload) if merge else payload
+                pending.coalesced_count += 1
+                pending.save(update_fields=["payload", "coalesced_count"])
+                return pending
+
+            try:
+                with transaction.atomic():
+                    return OutboxEvent.objects.create(
+                        queue=queue,
+                        payload=payload,
+                        coalesce_key=coalesce_key,
+                        available_at=timezone.now() + timedelta(seconds=settings.OUTBOX_COALESCE_WINDOW_SECONDS),
+                    )
+            except IntegrityError:
+                # a concurrent transaction opened the pending event first, fold into it
+                continue
+
+        raise IntegrityError(f"Could not coalesce outbox event {coalesce_key}")
+
+
+class MemoryQueueClient:
+    """In-process stand-in for the SQS client, keeps sent messages in a list"""
+
+    def __init__(self):
+        self.messages = []
+        self.batch_calls = 0
+        self._lock = threading.Lock()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._lock:
+            self.batch_calls += 1
+            self.messages.extend((QueueUrl, entry["MessageBody"]) for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+
+class SQLiteQueueClient:
+    """Stand-in for the SQS client that appends messages to a local SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.batch_calls = 0
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages "
+                "(id INTEGER PRIMARY KEY, queue_url TEXT, body TEXT, sent_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+            )
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT INTO messages (queue_url, body) VALUES (?, ?)",
+                [(QueueUrl, entry["MessageBody"]) for entry in Entries],
+            )
+        self.batch_calls += 1
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def count(self):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+@lru_cache(maxsize=None)
+def get_queue_client(backend=None):
+    """Queue client for the configured OUTBOX_SQS_BACKEND (sqs, memory or sqlite), built once per process"""
+    backend = backend or settings.OUTBOX_SQS_BACKEND
+    if backend == "memory":
+        return MemoryQueueClient()
+    if backend == "sqlite":
+        return SQLiteQueueClient(settings.OUTBOX_SQLITE_PATH)
+    return boto3.client(
+        'sqs',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION
+    )
+
+
+def merge_stock_delta(pending, new):
+    """Keep the latest payload but carry the net stock change over the window"""
+    return {**new, "stock_delta": pending.get("stock_delta", 0) + new.get("stock_delta", 0)}
+
+
+def coalescing_stats(since=None):
+    """Events raised vs messages actually sent, with the Lambda invocations that saves"""
+    from .models import OutboxEvent
+
+    dispatched = OutboxEvent.objects.filter(dispatched_at__isnull=False)
+    if since is not None:
+        dispatched = dispatched.filter(dispatched_at__gte=since)
+
+    stats = dispatched.aggregate(messages=Count("id"), events=Sum("coalesced_count"))
+    messages, events = stats["messages"], stats["events"] or 0
+    batch_size = settings.LAMBDA_SQS_BATCH_SIZE
+    return {
+        "events": events,
+        "messages": messages,
+        "messages_saved": events - messages,
+        "message_reduction": 1 - messages / events if events else 0.0,
+        "lambda_invocations": ceil(messages / batch_size),
+        "lambda_invocations_uncoalesced": ceil(events / batch_size),
+    }
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def _claim(now, limit, max_attempts):
+    """Claim due events in a short transaction of their own.
+
+    Rows are locked with SKIP LOCKED, then pushed CLAIM_SECONDS into the
+    future and detached from their coalesce key before the transaction
+    commits: other dispatchers skip them, and events raised for the same key
+    while they are in flight open a new pending event instead of being
+    folded into a message that may already be on the wire.
+    """
+    from .models import OutboxEvent
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True, available_at__lte=now, attempts__lt=max_attempts)
+            .order_by("id")[:limit]
+        )
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+            available_at=now + timedelta(seconds=CLAIM_SECONDS), coalesce_key=None
+        )
+    return events
+
+
+def dispatch_pending(client=None, limit=500, max_attempts=MAX_ATTEMPTS):
+    """Send one slice of pending outbox events.
+
+    Due events are claimed and committed first (see _claim), so no row lock
+    or transaction is held across the SQS calls. They are then grouped per
+    queue and sent with send_message_batch in groups of 10, and the outcome
+    is written in a second short transaction: sent events are stamped
+    dispatched_at, failed ones are pushed back with exponential backoff until
+    they reach max_attempts. A dispatcher that dies in between leaves its
+    claim to lapse after CLAIM_SECONDS, and the events are sent again.
+
+    Returns a (sent, failed) tuple.
+    """
+    from .models import OutboxEvent
+
+    client = client or get_queue_client()
+    now = timezone.now()
+    sent, failed = [], []
+
+    by_queue = {}
+    for event in _claim(now, limit, max_attempts):
+        by_queue.setdefault(event.queue, []).append(event)
+
+    for queue, queue_events in by_queue.items():
+        queue_url = getattr(settings, QUEUE_URL_SETTINGS[queue])
+        for start in range(0, len(queue_events), SQS_BATCH_SIZE):
+            chunk = {str(event.id): event for event in queue_events[start:start + SQS_BATCH_SIZE]}
+            entries = [
+                {"Id": event_id, "MessageBody": json.dumps(event.payload)}
+                for event_id, event in chunk.items()
+            ]
+            try:
+                response = client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            except Exception as e:
+                logger.error(f"Error sending outbox batch to {queue}: {e}")
+                for event in chunk.values():
+                    event.last_error = str(e)
+                    failed.append(event)
+                continue
+
+            for entry in response.get("Successful", []):
+                sent.append(chunk[entry["Id"]])
+            for entry in response.get("Failed", []):
+                event = chunk[entry["Id"]]
+                event.last_error = entry.get("Message") or entry.get("Code")
+                failed.append(event)
+
+    for event in sent:
+        event.dispatched_at = timezone.now()
+    for event in failed:
+        event.attempts += 1
+        event.available_at = timezone.now() + _retry_delay(event.attempts)
+
+    with transaction.atomic():
+        OutboxEvent.objects.bulk_update(sent, ["dispatched_at"])
+        OutboxEvent.objects.bulk_update(failed, ["attempts", "available_at", "last_error"])
+
+    return len(sent), len(failed)
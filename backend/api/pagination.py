@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination over the indexed (created_at, id) columns, newest first.
+
+    Each page is a range scan from the cursor position, so fetching page 1 or
+    page 10,000 costs the same however long the table's history gets.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class OrderDateCursorPagination(CreatedAtCursorPagination):
+    """Keyset pagination for orders, which are stamped with order_date"""
+    ordering = ("-order_date", "-id")
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+#shelf life given to received stock when the receipt carries no expiry date
+DEFAULT_EXPIRY_DAYS = 180
+
+
+class ReceivingError(ValueError):
+    """Raised when a receipt does not fit its purchase order."""
+
+
+def default_expiry_date(purchase_order):
+    """Expiry date of a received batch when none is given: expected delivery + 180 days"""
+    if purchase_order.expected_delivery_date:
+        return purchase_order.expected_delivery_date + timedelta(days=DEFAULT_EXPIRY_DAYS)
+    return None
+
+
+def receive_purchase_orders(receipts, user=None):
+    """Record stock received against purchase orders, exactly once.
+
+    receipts: iterable of dicts with purchase_order_id and optional quantity
+    (defaults to what is still outstanding), reference (a delivery note line,
+    unique per purchase order), expiry_date and notes. Partial receipts are
+    allowed; a receipt whose reference was already recorded is skipped, and
+    receiving more than was ordered or against a canceled order raises
+    ReceivingError without writing anything.
+
+    The purchase orders are locked in id order, the inventory batches go in
+    through bulk_create_batches (one insert, one stock update per product)
+    and the receipts and order counters are written in bulk. An order's first
+    delivery also feeds its supplier's lead time statistics.
+
+    Returns (received, skipped): the created PurchaseOrderReceipt rows and
+    the receipts that were already recorded.
+    """
+    from .inventory_movements import bulk_create_batches
+    from .lead_times import lead_time_days, record_lead_times
+    from .models import PurchaseOrder, PurchaseOrderReceipt
+
+    receipts = list(receipts)
+    order_ids = {receipt["purchase_order_id"] for receipt in receipts}
+
+    with transaction.atomic():
+        orders = {
+            order.id: order for order in
+            PurchaseOrder.objects.select_for_update(of=("self",)).select_related("product")
+            .filter(id__in=order_ids).order_by("id")
+        }
+        missing = sorted(order_ids - orders.keys())
+        if missing:
+            raise ReceivingError(f"Invalid purchase_order_id(s): {missing}")
+
+        references = [receipt["reference"] for receipt in receipts if receipt.get("reference")]
+        recorded = set(
+            PurchaseOrderReceipt.objects.filter(purchase_order_id__in=order_ids, reference__in=references)
+            .values_list("purchase_order_id", "reference")
+        ) if references else set()
+
+        pending, skipped, incoming = [], [], defaultdict(int)
+        for receipt in receipts:
+            order = orders[receipt["purchase_order_id"]]
+            key = (order.id, receipt.get("reference"))
+            if receipt.get("reference") and key in recorded:
+                skipped.append(receipt)
+                continue
+            if order.status == "CANCELED":
+                raise ReceivingError(f"Purchase order {order.id} is canceled")
+
+            quantity = receipt.get("quantity")
+            if quantity is None:
+                quantity = order.quantity - order.received_quantity - incoming[order.id]
+            if quantity <= 0:
+                skipped.append(receipt)
+                continue
+            if order.received_quantity + incoming[order.id] + quantity > order.quantity:
+                raise ReceivingError(
+                    f"Purchase order {order.id} has {order.quantity - order.received_quantity - incoming[order.id]} "
+                    f"unit(s) outstanding, cannot receive {quantity}"
+                )
+
+            incoming[order.id] += quantity
+            if receipt.get("reference"):
+                recorded.add(key)
+            pending.append((order, receipt, quantity))
+
+        batches = bulk_create_batches(
+            [
+                {
+                    "product": order.product,
+                    "quantity": quantity,
+                    "status": "ADD",
+                    "notes": receipt.get("notes") or f"Stock received from Purchase Order {order.id}",
+                    "expiry_date": receipt.get("expiry_date") or default_expiry_date(order),
+                }
+                for order, receipt, quantity in pending
+            ],
+            user=user,
+        )
+
+        received = PurchaseOrderReceipt.objects.bulk_create([
+            PurchaseOrderReceipt(
+                purchase_order=order,
+                inventory=batch,
+                quantity=quantity,
+                reference=receipt.get("reference") or None,
+                received_by=user,
+            )
+            for (order, receipt, quantity), batch in zip(pending, batches)
+        ])
+
+        now = timezone.now()
+        record_lead_times(
+            (order.supplier_id, order.product_id, lead_time_days(order.order_date, now))
+            for order in (orders[order_id] for order_id in incoming)
+            if order.received_quantity == 0
+        )
+
+        for order_id, quantity in incoming.items():
+            order = orders[order_id]
+            order.received_quantity += quantity
+            if order.received_quantity >= order.quantity:
+                order.status = "RECEIVED"
+        PurchaseOrder.objects.bulk_update([orders[order_id] for order_id in incoming], ["received_quantity", "status"])
+
+    return received, skipped
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .stock_allocation import InsufficientStockError
+from .stock_counters import pending_slot_available
+
+#expired holds released per sweeper pass
+SWEEP_CHUNK_SIZE = 1000
+
+
+class ReservationError(ValueError):
+    """Raised when a reservation cannot be confirmed or released."""
+
+
+def _adjust_reserved(deltas):
+    """Apply a {product_id: delta} mapping to the reserved counters, in id order"""
+    from .models import ProductStock
+
+    for product_id in sorted(deltas):
+        if deltas[product_id]:
+            ProductStock.objects.filter(product_id=product_id).update(reserved=F("reserved") + deltas[product_id])
+
+
+def reserve(product, quantity, user=None, order=None, ttl_seconds=None):
+    """Hold quantity units of product for a checkout.
+
+    The hold is a single conditional UPDATE of the product's reserved counter
+    (only applied while available - reserved still covers it), so no batch
+    rows are locked; FEFO allocation waits until confirm(). The hold lapses
+    after STOCK_RESERVATION_TTL_SECONDS unless confirmed first.
+    """
+    from .models import ProductStock, StockReservation
+
+    ttl_seconds = ttl_seconds or settings.STOCK_RESERVATION_TTL_SECONDS
+    with transaction.atomic():
+        held = ProductStock.objects.filter(
+            product_id=product.pk, available__gte=F("reserved") + quantity - pending_slot_available()
+        ).update(reserved=F("reserved") + quantity)
+        if not held:
+            raise InsufficientStockError(f"Insufficient stock for product {product.name}")
+
+        return StockReservation.objects.create(
+            product=product,
+            quantity=quantity,
+            order=order,
+            created_by=user,
+            expires_at=timezone.now() + timedelta(seconds=ttl_seconds),
+        )
+
+
+def _locked_active(reservation_id):
+    from .models import StockReservation
+
+    reservation = (
+        StockReservation.objects.select_for_update(of=("self",)).select_related("product")
+        .filter(pk=reservation_id, status="ACTIVE").first()
+    )
+    if reservation is None:
+        raise ReservationError(f"Reservation {reservation_id} is not active")
+    return reservation
+
+
+def confirm(reservation_id, order=None):
+    """Turn an active hold into an order line.
+
+    The line is saved through OrderItem.save, which runs the FEFO allocation
+    and adds it to the order total; the allocation drops the hold from the
+    reserved counter in the same statement that takes the stock.
+
+    If the held stock is gone by then (a batch was written down under the
+    hold), nothing is allocated, the hold is marked FAILED and given back,
+    and InsufficientStockError is raised.
+
+    Returns the created OrderItem.
+    """
+    from .models import OrderItem
+
+    try:
+        with transaction.atomic():
+            reservation = _locked_active(reservation_id)
+            if reservation.expires_at <= timezone.now():
+                raise ReservationError(f"Reservation {reservation_id} has expired")
+            order = order or reservation.order
+            if order is None:
+                raise ReservationError(f"Reservation {reservation_id} has no order to confirm into")
+
+            item = OrderItem(
+                order=order,
+                product=reservation.product,
+                quantity=reservation.quantity,
+                unit_price=reservation.product.price,
+            )
+            item.save(held=reservation.quantity)
+
+            reservation.status = "CONFIRMED"
+            reservation.order = order
+            reservation.order_item = item
+            reservation.save(update_fields=["status", "order", "order_item"])
+    except InsufficientStockError:
+        _end(reservation_id, "FAILED")
+        raise
+
+    return item
+
+
+def _end(reservation_id, status):
+    """Close an active hold with status and give its units back to the reserved counter"""
+    with transaction.atomic():
+        reservation = _locked_active(reservation_id)
+        reservation.status = status
+        reservation.save(update_fields=["status"])
+        _adjust_reserved({reservation.product_id: -reservation.quantity})
+
+
+def release(reservation_id):
+    """Give an active hold back before it expires"""
+    _end(reservation_id, "RELEASED")
+
+
+def release_expired(now=None, limit=SWEEP_CHUNK_SIZE):
+    """Release one chunk of expired holds.
+
+    Expired rows are claimed with SKIP LOCKED (so sweepers never wait on a
+    confirm in progress, or on each other), marked EXPIRED with one UPDATE
+    and taken off the reserved counters with one UPDATE per product.
+
+    Returns the number of holds released.
+    """
+    from .models import StockReservation
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(status="ACTIVE", expires_at__lte=now)
+            .order_by("expires_at", "id")
+            .only("id", "product_id", "quantity")[:limit]
+        )
+        if not expired:
+            return 0
+
+        StockReservation.objects.filter(id__in=[reservation.id for reservation in expired]).update(status="EXPIRED")
+        totals = defaultdict(int)
+        for reservation in expired:
+            totals[reservation.product_id] -= reservation.quantity
+        _adjust_reserved(totals)
+
+    return len(expired)
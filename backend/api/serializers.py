@@ -1,16 +1,79 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from .models import Supplier, Product, ProductCategory, PurchaseOrder, \
-Inventory,Shipment,Notification,Customer,SalesOrder,Order,OrderItem,ShipmentOrder
-from datetime import timedelta
+Inventory,Shipment,Notification,Customer,SalesOrder,Order,OrderItem,ShipmentOrder,StockReservation
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
-from django.db import models
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from .inventory_movements import RECEIPT_STATUSES, available_stock, bulk_create_batches
+from .orders import create_orders_bulk
+from .receiving import ReceivingError, receive_purchase_orders
+from .reservations import reserve
+from .stock_allocation import InsufficientStockError
+from .stock_counters import pending_slot_available
 
 ##reference 
 ##https://github.com/NickMol/Django-React-Tutorial
 
-class UserSerializer(serializers.ModelSerializer):
+
+def query_param_set(request, name):
+    """Comma separated query parameter as a set, None when it was not sent"""
+    if request is None or request.method != "GET" or name not in request.query_params:
+        return None
+    return {item.strip() for item in request.query_params[name].split(",") if item.strip()}
+
+
+def rendered_relations(request, related_fields):
+    """Names from a serializer's Meta.related_fields that a request will render"""
+    rendered = set(related_fields)
+    fields = query_param_set(request, "fields")
+    if fields is not None:
+        rendered &= fields
+    return rendered
+
+
+class DynamicFieldsMixin:
+    """Sparse fieldsets for GET requests.
+
+    ?fields=id,name keeps only the listed fields. ?expand=product,order keeps
+    only the listed nested serializers as objects and collapses every other
+    one to its primary key; without ?expand all of them are nested as before.
+    Meta.related_fields maps each field that needs a join to its
+    select_related paths so views only join what is rendered.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+
+        fields = query_param_set(request, "fields")
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+        expand = query_param_set(request, "expand")
+        if expand is not None:
+            for name, field in list(self.fields.items()):
+                if isinstance(field, serializers.BaseSerializer) and name not in expand:
+                    source = field.source if field.source != name else None
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, source=source)
+
+    @classmethod
+    def select_related_for(cls, request):
+        """select_related paths needed to render this serializer for request"""
+        related_fields = getattr(cls.Meta, "related_fields", {})
+        expand = query_param_set(request, "expand")
+        paths = []
+        for name in rendered_relations(request, related_fields):
+            declared = cls._declared_fields.get(name)
+            if expand is not None and isinstance(declared, serializers.BaseSerializer) and name not in expand:
+                continue
+            paths.extend(related_fields[name])
+        return paths
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username","password"]
@@ -22,7 +85,7 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class ProductCategorySerializer(serializers.ModelSerializer):
+class ProductCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductCategory
         fields = ["id", "name", "description", "created_by", "created_at", "updated_at"]
@@ -44,7 +107,7 @@ class ProductCategorySerializer(serializers.ModelSerializer):
 
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category = ProductCategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=ProductCategory.objects.all(), source='category', write_only=True
@@ -57,6 +120,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "price", "stock_quantity", "created_by", "created_at", "updated_at"
         ]
         read_only_fields = ["created_by", "created_at", "updated_at"]
+        related_fields = {"category": ("category",)}
 
     def validate_name(self, value):
         """Check that the product name is unique"""
@@ -72,9 +136,16 @@ class ProductSerializer(serializers.ModelSerializer):
         validated_data["created_by"] = self.context['request'].user
         return super().create(validated_data)
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # striped products: add the changes still waiting in their counter slots
+        if "stock_quantity" in data and getattr(instance, "pending_stock", 0):
+            data["stock_quantity"] += instance.pending_stock
+        return data
+
 
 
-class InventorySerializer(serializers.ModelSerializer):
+class InventorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source='product', write_only=True
@@ -89,6 +160,7 @@ class InventorySerializer(serializers.ModelSerializer):
             "updated_by", "created_at", "batch_id", "expiry_date"
         ]
         read_only_fields = ["updated_by", "created_at", "batch_id"]
+        related_fields = {"product": ("product__category",)}
 
     def create(self, validated_data):
         """Create an Inventory record"""
@@ -96,9 +168,39 @@ class InventorySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class InventoryReceiptListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        """Check every product_id of the receipts with a single query"""
+        product_ids = {receipt["product_id"] for receipt in attrs}
+        products = Product.objects.in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise ValidationError(f"Invalid product_id(s): {missing}")
+
+        for receipt in attrs:
+            receipt["product"] = products[receipt.pop("product_id")]
+        return attrs
 
+    def create(self, validated_data):
+        """Create all receipts with one bulk insert"""
+        return bulk_create_batches(validated_data, user=self.context['request'].user)
+
+
+class InventoryReceiptSerializer(serializers.Serializer):
+    """A single row of a bulk inventory receipt"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=RECEIPT_STATUSES, default="ADD")
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    expiry_date = serializers.DateField(required=False, allow_null=True)
 
-class SupplierSerializer(serializers.ModelSerializer):
+    class Meta:
+        list_serializer_class = InventoryReceiptListSerializer
+
+
+
+
+class SupplierSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = ["id", "name", "contact_email", "contact_phone", "address", "created_by", "created_at", "updated_at"]
@@ -138,7 +240,7 @@ class SupplierSerializer(serializers.ModelSerializer):
 
 
 
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Creating a Purchase Order"""
     supplier = SupplierSerializer(read_only=True)
     supplier_id = serializers.PrimaryKeyRelatedField(
@@ -155,50 +257,78 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
         fields = [
             "id", "supplier", "supplier_id", "product", "product_id",
             "quantity", "order_date", "expected_delivery_date",
-            "status", "created_by", "notes", "batch_id"
+            "status", "created_by", "notes", "batch_id", "received_quantity"
         ]
-        read_only_fields = ["id", "order_date", "created_by", "batch_id"]
+        read_only_fields = ["id", "order_date", "created_by", "batch_id", "received_quantity"]
+        related_fields = {"supplier": ("supplier",), "product": ("product__category",)}
 
     def create(self, validated_data):
-        """Create purchase order"""
+        """Create purchase order, receiving it straight away if it is created as received"""
         validated_data['created_by'] = self.context['request'].user
-        # Create purchase order instance
-        return super().create(validated_data)
+        receive = validated_data.get("status") == "RECEIVED"
+        if receive:
+            validated_data["status"] = "PENDING"
+
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            if receive:
+                self._receive(instance)
+        return instance
+
+    def validate_quantity(self, value):
+        """An order cannot be cut below what was already received against it"""
+        if self.instance is not None and value < self.instance.received_quantity:
+            raise ValidationError(f"{self.instance.received_quantity} unit(s) were already received.")
+        return value
 
     def update(self, instance, validated_data):
-        """Update inventory once stock is received"""
-
-        new_status = validated_data.get("status", instance.status)
-
-        # create inventory if status received
-        if new_status == "RECEIVED" and instance.status != "RECEIVED":
-      
-            default_expiry_period = 180
-            expiry_date = (
-                instance.expected_delivery_date + timedelta(days=default_expiry_period)
-                if instance.expected_delivery_date
-                else None
-            )
-
-            # Generate batch_id
-            if not instance.batch_id:
-                instance.batch_id = f"PO-{instance.id}-{instance.order_date.strftime('%Y%m%d%H%M%S')}"
-
-            # Create an inventory record 
-            Inventory.objects.create(
-                product=instance.product,
-                quantity=instance.quantity,
-                status="ADD",
-                notes=f"Stock received from Purchase Order {instance.id}",
-                updated_by=self.context['request'].user, 
-                expiry_date=expiry_date  
-            )
-
+        """Receive the outstanding stock once the order is marked as received"""
+        quantity = validated_data.get("quantity", instance.quantity)
+        # an order with nothing outstanding just takes the status, there is nothing to receive
+        receive = (
+            validated_data.get("status") == "RECEIVED"
+            and instance.status != "RECEIVED"
+            and instance.received_quantity < quantity
+        )
+        if receive:
+            validated_data.pop("status")
+
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if receive:
+                self._receive(instance)
+        return instance
+
+    def _receive(self, instance):
+        try:
+            receive_purchase_orders([{"purchase_order_id": instance.id}], user=self.context['request'].user)
+        except ReceivingError as e:
+            raise ValidationError(str(e))
+        instance.refresh_from_db()
+
+
+class PurchaseOrderReceiveListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        """Record all receipts in one transaction"""
+        try:
+            return receive_purchase_orders(validated_data, user=self.context['request'].user)
+        except ReceivingError as e:
+            raise ValidationError(str(e))
+
+
+class PurchaseOrderReceiveSerializer(serializers.Serializer):
+    """Stock received against one purchase order, quantity defaults to what is outstanding"""
+    purchase_order_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    reference = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    expiry_date = serializers.DateField(required=False, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
 
-        return super().update(instance, validated_data)
+    class Meta:
+        list_serializer_class = PurchaseOrderReceiveListSerializer
 
 
-class ShipmentSerializer(serializers.ModelSerializer):
+class ShipmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Shipment
         fields = [
@@ -230,7 +360,7 @@ class ShipmentSerializer(serializers.ModelSerializer):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     batch_id = serializers.CharField(source='batch_id.batch_id', read_only=True)  
     product_name = serializers.CharField(source='product_name.name', read_only=True)  
 
@@ -238,14 +368,27 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'batch_id', 'type', 'product_name', 'status', 'created_at', 'updated_at', 'notes']
         read_only_fields = ["id", "created_at", "updated_at"]
+        related_fields = {"batch_id": ("batch_id",), "product_name": ("product_name",)}
 
     def validate_status(self, value):
         if value not in ["OPEN", "IN_PROGRESS", "CLOSED"]:
             raise serializers.ValidationError("Invalid status. Must be one of: OPEN, IN_PROGRESS, CLOSED.")
         return value
 
+    def validate(self, data):
+        # a product has at most one open stock alert
+        instance = self.instance
+        if instance is None:
+            return data
+        status = data.get("status", instance.status)
+        if (status, data.get("type", instance.type)) == ("OPEN", "STOCK_ISSUE") and Notification.objects.filter(
+            product_name_id=instance.product_name_id, type="STOCK_ISSUE", status="OPEN"
+        ).exclude(pk=instance.pk).exists():
+            raise serializers.ValidationError({"status": "This product already has an open stock alert."})
+        return data
+
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = [
@@ -271,7 +414,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         validated_data["created_by"] = self.context['request'].user
         return super().create(validated_data)
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     customer = CustomerSerializer(read_only=True)
     customer_id = serializers.PrimaryKeyRelatedField(
         queryset=Customer.objects.all(), source='customer', write_only=True
@@ -285,80 +428,163 @@ class OrderSerializer(serializers.ModelSerializer):
             "total_amount", "created_by", "notes"
         ]
         read_only_fields = ["created_by", "order_date", "total_amount"]
+        related_fields = {"customer": ("customer",)}
 
     def create(self, validated_data):
         validated_data["created_by"] = self.context['request'].user
         validated_data["total_amount"] = 0  
         return super().create(validated_data)
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     order = OrderSerializer(read_only=True)
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source='product', write_only=True
     )
+    order_id = serializers.PrimaryKeyRelatedField(
+        queryset=Order.objects.all(), source='order', write_only=True
+    )
 
     class Meta:
         model = OrderItem
         fields = [
-            "id", "order", "product", "product_id",
+            "id", "order", "order_id", "product", "product_id",
             "quantity", "unit_price", "created_at"
         ]
         read_only_fields = ["created_at", "unit_price"]
+        related_fields = {"order": ("order__customer",), "product": ("product__category",)}
+
+    def validate(self, data):
+        """Validate if there's enough stock for the line, or for what an edit adds to it"""
+        product = data.get('product', getattr(self.instance, 'product', None))
+        quantity = data.get('quantity', getattr(self.instance, 'quantity', 0))
+        if self.instance is not None and self.instance.product_id == product.id:
+            quantity -= self.instance.quantity
+
+        # Get available stock from the maintained projection
+        available = available_stock(product.id)
+
+        if quantity > available:
+            raise ValidationError(f"Insufficient stock. Only {available} units available.")
+        
+        return data
 
     def create(self, validated_data):
-        # Set unit_price from product's current price
+        """Set unit_price from product's current price, OrderItem.save adds the line to the order total"""
         validated_data['unit_price'] = validated_data['product'].price
-        order_item = super().create(validated_data)
+        try:
+            return super().create(validated_data)
+        except InsufficientStockError as e:
+            # another line or checkout took the stock since validate() read it
+            raise ValidationError(str(e))
 
-        # Update order total
-        order = order_item.order
-        order.total_amount = OrderItem.objects.filter(order=order).aggregate(
-            total=models.Sum(models.F('quantity') * models.F('unit_price'))
-        )['total'] or 0
-        order.save()
+    def update(self, instance, validated_data):
+        """Reprice a line moved to another product; OrderItem.save allocates added units and returns removed ones"""
+        if validated_data.get('product', instance.product) != instance.product:
+            validated_data['unit_price'] = validated_data['product'].price
+        try:
+            return super().update(instance, validated_data)
+        except InsufficientStockError as e:
+            raise ValidationError(str(e))
+
+class BulkOrderListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        """Check every customer and product of the orders with one query each, plus available stock"""
+        customer_ids = {order["customer_id"] for order in attrs}
+        customers = Customer.objects.in_bulk(customer_ids)
+        missing = sorted(customer_ids - customers.keys())
+        if missing:
+            raise ValidationError(f"Invalid customer_id(s): {missing}")
+
+        product_ids = {line["product_id"] for order in attrs for line in order["lines"]}
+        products = Product.objects.annotate(
+            available=Coalesce(F("available_stock__available") - F("available_stock__reserved"), 0)
+            + pending_slot_available()
+        ).in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise ValidationError(f"Invalid product_id(s): {missing}")
+
+        demand = {}
+        for order in attrs:
+            order["customer"] = customers[order.pop("customer_id")]
+            for line in order["lines"]:
+                line["product"] = products[line.pop("product_id")]
+                demand[line["product"].id] = demand.get(line["product"].id, 0) + line["quantity"]
+
+        short = [
+            f"{products[product_id].name} ({products[product_id].available} available, {quantity} ordered)"
+            for product_id, quantity in sorted(demand.items())
+            if quantity > products[product_id].available
+        ]
+        if short:
+            raise ValidationError(f"Insufficient stock: {', '.join(short)}")
+        return attrs
 
-        return order_item
+    def create(self, validated_data):
+        """Allocate and create all orders in one transaction"""
+        try:
+            return create_orders_bulk(validated_data, user=self.context['request'].user)
+        except InsufficientStockError as e:
+            raise ValidationError(str(e))
+
+
+class BulkOrderLineSerializer(serializers.Serializer):
+    """A line of an order created through the bulk endpoint"""
+    id = serializers.IntegerField(read_only=True)
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+
+class BulkOrderSerializer(serializers.Serializer):
+    """An order with its lines, created through the bulk endpoint"""
+    id = serializers.IntegerField(read_only=True)
+    customer_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, default="PENDING")
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    order_date = serializers.DateTimeField(read_only=True)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    items = BulkOrderLineSerializer(many=True, source="lines", allow_empty=False)
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    order = OrderSerializer(read_only=True)
+    class Meta:
+        list_serializer_class = BulkOrderListSerializer
+
+
+class StockReservationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source='product', write_only=True
     )
+    order_id = serializers.PrimaryKeyRelatedField(
+        queryset=Order.objects.all(), source='order', write_only=True, required=False, allow_null=True
+    )
 
     class Meta:
-        model = OrderItem
+        model = StockReservation
         fields = [
-            "id", "order", "product", "product_id",
-            "quantity", "unit_price", "created_at"
+            "id", "product", "product_id", "order", "order_id", "order_item",
+            "quantity", "status", "created_at", "expires_at"
         ]
-        read_only_fields = ["created_at", "unit_price"]  
-
-    def validate(self, data):
-        """Validate if there's enough stock"""
-        product = data['product']
-        quantity = data['quantity']
-        
-        # Get available stock
-        available_stock = Inventory.objects.filter(
-            product=product,
-            status__in=["ADD", "RETURN"]
-        ).aggregate(
-            total=models.Sum('quantity')
-        )['total'] or 0
-
-        if quantity > available_stock:
-            raise ValidationError(f"Insufficient stock. Only {available_stock} units available.")
-        
-        return data
+        read_only_fields = ["order", "order_item", "status", "created_at", "expires_at"]
+        related_fields = {"product": ("product__category",)}
+        extra_kwargs = {"quantity": {"min_value": 1}}
 
     def create(self, validated_data):
-        """Set unit_price from product's current price """
-        validated_data['unit_price'] = validated_data['product'].price
-        return super().create(validated_data)
+        """Hold the stock with one counter update, allocation happens on confirm"""
+        try:
+            return reserve(
+                validated_data["product"],
+                validated_data["quantity"],
+                user=self.context['request'].user,
+                order=validated_data.get("order"),
+            )
+        except InsufficientStockError:
+            available = available_stock(validated_data["product"].id)
+            raise ValidationError(f"Insufficient stock. Only {available} units available.")
+
 
-class SalesOrderSerializer(serializers.ModelSerializer):
+class SalesOrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     order = OrderSerializer(read_only=True)
     order_id = serializers.PrimaryKeyRelatedField(
         queryset=Order.objects.all(), source='order', write_only=True
@@ -378,6 +604,7 @@ class SalesOrderSerializer(serializers.ModelSerializer):
             "created_at", "updated_at"
         ]
         read_only_fields = ["created_by", "created_at", "updated_at", "total_amount"]
+        related_fields = {"order": ("order__customer",), "total_amount": ("order",)}
 
     def validate_order(self, value):
         """Ensure order has items"""
@@ -391,7 +618,7 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         validated_data["created_by"] = self.context['request'].user
         return super().create(validated_data)
 
-class ShipmentOrderSerializer(serializers.ModelSerializer):
+class ShipmentOrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     order = OrderSerializer(read_only=True)
     shipment_provider = ShipmentSerializer(read_only=True)
     shipment_provider_id = serializers.PrimaryKeyRelatedField(
@@ -405,6 +632,7 @@ class ShipmentOrderSerializer(serializers.ModelSerializer):
             "shipping_address", "status", "created_at", "updated_at"
         ]
         read_only_fields = ["created_at", "updated_at"]
+        related_fields = {"order": ("order__customer",), "shipment_provider": ("shipment_provider",)}
 
     def validate_shipping_address(self, value):
         if len(value) != 7:
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboard_stats
+from .inventory_movements import adjust_available, available_delta, expiry_bucket
+from .orders import add_to_order_total, line_amount
+from .models import Inventory, Notification, OrderItem, Product, ProductCategory, ShipmentOrder
+
+#models whose writes change the dashboard figures
+DASHBOARD_MODELS = (Product, ProductCategory, Inventory, Notification, OrderItem, ShipmentOrder)
+
+
+@receiver([post_save, post_delete])
+def dashboard_changed(sender, **kwargs):
+    """Invalidate the cached dashboard figures when a model they are built from changes"""
+    if sender in DASHBOARD_MODELS:
+        invalidate_dashboard_stats()
+
+
+@receiver(post_delete, sender=Inventory)
+def inventory_deleted(sender, instance, **kwargs):
+    """Take a deleted batch out of its product's available stock"""
+    delta = available_delta(instance.status, instance.quantity)
+    # only touch rows that still exist, the product itself may be going away
+    adjust_available({(instance.product_id, expiry_bucket(instance.expiry_date)): -delta}, create_missing=False)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    """Take a deleted line's amount off its order's total"""
+    add_to_order_total(instance.order_id, -line_amount(instance.quantity, instance.unit_price))
@@ -0,0 +1,206 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .inventory_movements import BULK_INSERT_BATCH_SIZE, apply_stock_changes, available_stock, expiry_bucket
+
+#batch statuses that hold sellable stock
+ALLOCATABLE_STATUSES = ["ADD", "RETURN"]
+
+#number of candidate batches locked per query
+LOCK_CHUNK_SIZE = 20
+
+
+class InsufficientStockError(ValueError):
+    """Raised when the locked batches of a product cannot cover an order line."""
+
+
+def _fefo_candidates(product_id):
+    """Batches of a product that still hold stock, first expiry first out"""
+    from .models import Inventory
+
+    return (
+        Inventory.objects.filter(
+            product_id=product_id,
+            status__in=ALLOCATABLE_STATUSES,
+            quantity__gt=0,
+        )
+        .order_by(F("expiry_date").asc(nulls_last=True), "created_at", "id")
+        .only("id", "quantity", "expiry_date")
+    )
+
+
+def _lock_batches(product_id, quantity, skip_locked, exclude_ids=()):
+    """Lock just enough candidate batches (in FEFO order) to cover quantity.
+
+    Each chunk excludes the batches already fetched instead of using an
+    OFFSET: SKIP LOCKED changes which rows a query returns, so offsets shift
+    as other transactions release their locks.
+
+    Returns the locked batches and the quantity they hold.
+    """
+    locked, covered = [], 0
+    candidates = _fefo_candidates(product_id)
+    seen = list(exclude_ids)
+
+    while covered < quantity:
+        chunk = list(
+            candidates.exclude(id__in=seen).select_for_update(skip_locked=skip_locked)[:LOCK_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for batch in chunk:
+            if covered >= quantity:
+                break
+            locked.append(batch)
+            covered += batch.quantity
+        seen += [batch.id for batch in chunk]
+
+    return locked, covered
+
+
+def _split(product, quantity):
+    """Lock a product's batches and split quantity over them, without writing anything.
+
+    Candidate batches are locked with SKIP LOCKED so concurrent orders for
+    the same product fan out over different batches; only if that leaves the
+    line short are the remaining (busy) batches waited on.
+
+    Returns the touched batches, the (batch_id, quantity_taken) allocations
+    and the available-stock deltas per expiry bucket.
+    """
+    batches, covered = _lock_batches(product.id, quantity, skip_locked=True)
+    if covered < quantity:
+        more, extra = _lock_batches(
+            product.id, quantity - covered, skip_locked=False,
+            exclude_ids=[batch.id for batch in batches],
+        )
+        batches += more
+        covered += extra
+
+    if covered < quantity:
+        raise InsufficientStockError(f"Insufficient stock for product {product.name}")
+
+    remaining_quantity = quantity
+    allocations = []
+    available = defaultdict(int)
+    for batch in batches:
+        quantity_from_batch = min(batch.quantity, remaining_quantity)
+        batch.quantity -= quantity_from_batch
+        remaining_quantity -= quantity_from_batch
+        allocations.append((batch.id, quantity_from_batch))
+        available[(product.pk, expiry_bucket(batch.expiry_date))] -= quantity_from_batch
+
+    return batches, allocations, available
+
+
+def _take_unreserved(products, quantities, held=None, striped=None):
+    """Take {product_id: quantity} off the available totals, leaving what active holds need.
+
+    One conditional UPDATE per product, in id order: available - reserved
+    must still cover the quantity, counting the caller's own hold (held
+    units, dropped from reserved in the same statement). Raises
+    InsufficientStockError otherwise, so allocations cannot use up stock
+    another checkout is holding.
+
+    Products in striped already took the quantity on a counter slot, so the
+    shared total row is not written for them (only to drop a hold) and the
+    check is a plain read of available_stock afterwards. That read does not
+    lock, so two concurrent orders on a striped product can both pass it and
+    eat into held stock by their overlap; the batches themselves can never
+    be oversold.
+    """
+    from .models import ProductStock
+
+    held, striped = held or {}, striped or {}
+    for product_id in sorted(quantities):
+        quantity, own = quantities[product_id], held.get(product_id, 0)
+        if product_id in striped:
+            if own:
+                ProductStock.objects.filter(product_id=product_id).update(reserved=F("reserved") - own)
+            taken = available_stock(product_id) >= 0
+        else:
+            taken = ProductStock.objects.filter(
+                product_id=product_id, available__gte=F("reserved") - own + quantity
+            ).update(available=F("available") - quantity, reserved=F("reserved") - own)
+        if not taken:
+            raise InsufficientStockError(f"Insufficient unreserved stock for product {products[product_id].name}")
+
+
+def allocate_fefo(product, quantity, held=0):
+    """Take quantity units of product from its batches, earliest expiry first.
+
+    The split is computed in one pass and written back with a single bulk
+    UPDATE plus one atomic decrement of the product's stock counter and
+    available stock. Stock held by active reservations is left alone, except
+    for held units of the reservation being confirmed into this allocation.
+
+    Returns a list of (batch_id, quantity_taken) tuples.
+    """
+    from .models import Inventory
+
+    if quantity <= 0:
+        return []
+
+    with transaction.atomic():
+        batches, allocations, available = _split(product, quantity)
+        Inventory.objects.bulk_update(batches, ["quantity"])
+        striped = apply_stock_changes(
+            {product.pk: -quantity}, available, {product.pk: product.counter_slots}, update_totals=False
+        )
+        _take_unreserved({product.pk: product}, {product.pk: quantity}, {product.pk: held}, striped)
+
+    return allocations
+
+
+def return_stock(product, quantity, notes=None):
+    """Give quantity units of product back to stock, for order lines that shrink or move.
+
+    Allocations do not record which batches they drew from, so the units come
+    back as one RETURN batch without an expiry date; it goes through the usual
+    stock movement (stock counter and available stock) and is allocatable again.
+    """
+    from .models import Inventory
+
+    if quantity <= 0:
+        return None
+    return Inventory.objects.create(product=product, quantity=quantity, status="RETURN", notes=notes)
+
+
+def allocate_fefo_many(demand):
+    """Allocate several products at once, in one transaction.
+
+    demand maps Product instances to the total quantity needed. Products are
+    locked in id order (so two callers never wait on each other in opposite
+    orders) and every touched batch is written with one bulk UPDATE. If any
+    product is short, or only covered by stock other checkouts hold, nothing
+    is allocated.
+
+    Returns {product_id: [(batch_id, quantity_taken), ...]}.
+    """
+    from .models import Inventory
+
+    touched, allocations, available, stock = [], {}, defaultdict(int), {}
+
+    with transaction.atomic():
+        for product in sorted(demand, key=lambda product: product.pk):
+            quantity = demand[product]
+            if quantity <= 0:
+                continue
+            batches, allocations[product.pk], deltas = _split(product, quantity)
+            touched += batches
+            stock[product.pk] = -quantity
+            for key, delta in deltas.items():
+                available[key] += delta
+
+        Inventory.objects.bulk_update(touched, ["quantity"], batch_size=BULK_INSERT_BATCH_SIZE)
+        striped = apply_stock_changes(
+            stock, available, {product.pk: product.counter_slots for product in demand}, update_totals=False
+        )
+        _take_unreserved(
+            {product.pk: product for product in demand}, {product_id: -delta for product_id, delta in stock.items()},
+            striped=striped,
+        )
+
+    return allocations
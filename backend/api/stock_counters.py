@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def _pending_slot_sum(field):
+    from .models import StockCounterSlot
+
+    return Coalesce(
+        Subquery(
+            StockCounterSlot.objects.filter(product_id=OuterRef("pk"))
+            .values("product_id").annotate(total=Sum(field)).values("total")
+        ),
+        0,
+    )
+
+
+def pending_slot_delta():
+    """Subquery summing a product's unfolded stock_quantity changes, for annotating Product querysets"""
+    return _pending_slot_sum("delta")
+
+
+def pending_slot_available():
+    """Subquery summing a product's unfolded available-stock changes, for Product or ProductStock querysets"""
+    return _pending_slot_sum("available")
+
+
+def stock_level(product_id):
+    """A product's stock_quantity plus whatever its counter slots still hold"""
+    from .models import Product
+
+    return (
+        Product.objects.filter(pk=product_id)
+        .annotate(level=F("stock_quantity") + pending_slot_delta())
+        .values_list("level", flat=True).first()
+    )
+
+
+def fold_product(product_id):
+    """Move a product's counter slots back into stock_quantity, its available total and its slot 0 buckets.
+
+    The slot rows are locked first, so movements landing on them (or on the
+    slot's bucket rows, which are written after the slot row) during the fold
+    wait for it instead of being lost. Returns whether anything was pending.
+    """
+    from .inventory_movements import adjust_available
+    from .models import Product, ProductStock, ProductStockBucket, StockCounterSlot
+
+    with transaction.atomic():
+        slots = list(StockCounterSlot.objects.select_for_update().filter(product_id=product_id).order_by("slot"))
+        pending = sum(slot.delta for slot in slots)
+        pending_available = sum(slot.available for slot in slots)
+        if pending:
+            Product.objects.filter(pk=product_id).update(stock_quantity=F("stock_quantity") + pending)
+
+        striped_buckets = ProductStockBucket.objects.filter(product_id=product_id, slot__gt=0).exclude(available=0)
+        buckets = dict(
+            striped_buckets.values("expiry_month").annotate(units=Sum("available"))
+            .order_by().values_list("expiry_month", "units")
+        )
+        if buckets:
+            striped_buckets.update(available=0)
+            adjust_available({(product_id, month): units for month, units in buckets.items()}, update_totals=False)
+        if pending_available:
+            ProductStock.objects.filter(product_id=product_id).update(available=F("available") + pending_available)
+
+        if pending or pending_available:
+            StockCounterSlot.objects.filter(id__in=[slot.id for slot in slots]).update(delta=0, available=0)
+    return bool(pending or pending_available or buckets)
+
+
+def fold_all():
+    """Fold every striped product with pending changes, returns how many were folded"""
+    from .models import ProductStockBucket, StockCounterSlot
+
+    product_ids = set(
+        StockCounterSlot.objects.exclude(delta=0, available=0).values_list("product_id", flat=True)
+    ) | set(
+        ProductStockBucket.objects.filter(slot__gt=0).exclude(available=0).values_list("product_id", flat=True)
+    )
+    return sum(1 for product_id in sorted(product_ids) if fold_product(product_id))
+
+
+def set_counter_slots(product_id, slots):
+    """Turn striping on (slots > 0), resize it, or turn it off (slots = 0) for a product.
+
+    Slot rows are created up front so writers only ever UPDATE them. When
+    slots shrink, the pending changes are folded before the extra rows go.
+    """
+    from .models import Product, StockCounterSlot
+
+    with transaction.atomic():
+        # slot rows before the product row, the order folds and movements lock them in
+        list(StockCounterSlot.objects.select_for_update().filter(product_id=product_id).order_by("slot"))
+        Product.objects.filter(pk=product_id).update(counter_slots=slots)
+        StockCounterSlot.objects.bulk_create(
+            [StockCounterSlot(product_id=product_id, slot=slot) for slot in range(slots)],
+            ignore_conflicts=True,
+        )
+        fold_product(product_id)
+        StockCounterSlot.objects.filter(product_id=product_id, slot__gte=slots).delete()
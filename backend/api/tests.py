@@ -1,3 +1,1118 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipIf
+import logging
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from inventory_optimizer_package_23384069 import DemandForecaster
+from rest_framework.test import APIClient
+
+from .demand import load_forecaster, rebuild_demand_forecasts
+from .inventory_movements import NO_EXPIRY_BUCKET, available_stock, available_stock_drift
+from .management.commands.bench_expiry_scan import expiry_lambda, full_scan, incremental_scan
+from .models import (
+    Customer, DemandForecast, IdempotencyKey, Inventory, Notification, Order, OrderItem, OutboxEvent, Product,
+    ProductCategory, ProductStock, ProductStockBucket, PurchaseOrder, SalesOrder, Shipment, ShipmentOrder,
+    ExpiryScanWatermark, StockCounterSlot, StockReservation, Supplier, SupplierLeadTime, generate_batch_id,
+)
+from .orders import create_orders_bulk
+from .outbox import MemoryQueueClient, coalescing_stats, dispatch_pending
+from .receiving import receive_purchase_orders
+from .reservations import ReservationError, confirm, reserve
+from .stock_allocation import LOCK_CHUNK_SIZE, InsufficientStockError, allocate_fefo
+from .stock_counters import fold_product, set_counter_slots, stock_level
+
+logger = logging.getLogger(__name__)
+
+
+class FefoAllocationTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Milk", price=2, stock_quantity=0)
+        self.late = self._batch(10, date(2030, 3, 1))
+        self.early = self._batch(4, date(2030, 1, 1))
+        self.middle = self._batch(5, date(2030, 2, 1))
+        self.product.refresh_from_db()
+
+    def _batch(self, quantity, expiry_date):
+        return Inventory.objects.create(
+            product=self.product, quantity=quantity, status="ADD",
+            expiry_date=expiry_date,
+        )
+
+    def test_allocates_earliest_expiry_first(self):
+        allocations = allocate_fefo(self.product, 7)
+
+        self.assertEqual(allocations, [(self.early.id, 4), (self.middle.id, 3)])
+        self.early.refresh_from_db()
+        self.middle.refresh_from_db()
+        self.late.refresh_from_db()
+        self.assertEqual((self.early.quantity, self.middle.quantity, self.late.quantity), (0, 2, 10))
+
+    def test_decrements_product_stock_once(self):
+        before = self.product.stock_quantity
+        allocate_fefo(self.product, 12)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, before - 12)
+
+    def test_round_trips_do_not_grow_with_batches(self):
+        # savepoint, lock, bulk update of the batches, product counter update,
+        # one update per expiry bucket drawn from, available total update, release
+        with self.assertNumQueries(5 + 3 + 1):
+            allocate_fefo(self.product, 19)
+
+    def test_allocation_spanning_several_lock_chunks_takes_each_batch_once(self):
+        product = Product.objects.create(name="Cream", price=2, stock_quantity=0)
+        batches = [
+            Inventory.objects.create(product=product, quantity=1, status="ADD", expiry_date=date(2030, 1, 1))
+            for _ in range(2 * LOCK_CHUNK_SIZE + 5)
+        ]
+        allocations = allocate_fefo(product, len(batches))
+        self.assertEqual(sorted(batch_id for batch_id, _ in allocations), [batch.id for batch in batches])
+
+    def test_insufficient_stock_leaves_batches_untouched(self):
+        with self.assertRaises(InsufficientStockError):
+            allocate_fefo(self.product, 20)
+        self.early.refresh_from_db()
+        self.assertEqual(self.early.quantity, 4)
+
+
+class InventoryBatchIdTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Bread", price=3, stock_quantity=0)
+
+    def test_batch_id_written_with_single_insert(self):
+        # savepoint, insert, product stock update, release, plus update / insert / update
+        # of the first available-stock bucket and of the product's available total
+        with self.assertNumQueries(4 + 3 + 3):
+            batch = Inventory.objects.create(product=self.product, quantity=5, status="ADD")
+        self.assertTrue(batch.batch_id.startswith(f"{self.product.id}-"))
+
+    def test_batch_ids_are_unique_and_ordered_within_the_same_instant(self):
+        now = timezone.now()
+        ids = [generate_batch_id(self.product.id, now) for _ in range(1000)]
+        self.assertEqual(len(set(ids)), 1000)
+        self.assertEqual(ids, sorted(ids))
+
+
+class InventoryBulkIngestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="receiver", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f"Item {i}", price=1, stock_quantity=0) for i in range(3)
+        ]
+        for product in self.products:
+            product.refresh_from_db()
+
+    def test_bulk_ingest_aggregates_stock_per_product(self):
+        receipts = [
+            {"product_id": product.id, "quantity": 2, "expiry_date": "2030-01-01"}
+            for product in self.products
+            for _ in range(10)
+        ]
+        before = {product.id: product.stock_quantity for product in self.products}
+
+        # product lookup, savepoint, bulk insert, one stock update per product, release,
+        # then per projection table one update per product, one insert of the missing rows
+        # and their updates
+        with self.assertNumQueries(3 + len(self.products) + 1 + 2 * (2 * len(self.products) + 1)):
+            response = self.client.post("/api/inventory/bulk/", receipts, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 30)
+        self.assertEqual(len(set(response.data["batch_ids"])), 30)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock_quantity, before[product.id] + 20)
+
+    def test_bulk_ingest_rejects_unknown_products(self):
+        before = Inventory.objects.count()
+        response = self.client.post(
+            "/api/inventory/bulk/",
+            [{"product_id": self.products[0].id, "quantity": 1}, {"product_id": 999999, "quantity": 1}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Inventory.objects.count(), before)
+
+
+class StockMovementTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Eggs", price=4, stock_quantity=12)
+
+    def test_product_creation_does_not_double_count_opening_stock(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 12)
+        self.assertEqual(self.product.product_inv.get().quantity, 12)
+
+    def test_movement_only_touches_the_stock_counter(self):
+        updated_at = Product.objects.get(pk=self.product.pk).updated_at
+        Inventory.objects.create(product=self.product, quantity=3, status="ADJUST")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 9)
+        self.assertEqual(self.product.updated_at, updated_at)
+
+    def test_editing_a_row_applies_only_the_difference(self):
+        batch = Inventory.objects.create(product=self.product, quantity=5, status="ADD")
+        batch.quantity = 7
+        batch.save()
+        batch.notes = "recounted"
+        batch.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 19)
+
+    def test_moving_a_row_to_another_product_moves_its_stock(self):
+        other = Product.objects.create(name="Duck eggs", price=6, stock_quantity=0)
+        batch = Inventory.objects.create(product=self.product, quantity=7, status="ADD")
+        batch.product = other
+        batch.save()
+
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, other.stock_quantity), (12, 7))
+        self.assertEqual(ProductStock.objects.get(product=other).available, 7)
+        self.assertEqual(available_stock_drift(), {})
+
+
+class ProductStockTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Yogurt", price=1, stock_quantity=0)
+        self.january = Inventory.objects.create(
+            product=self.product, quantity=4, status="ADD", expiry_date=date(2030, 1, 20)
+        )
+        self.undated = Inventory.objects.create(product=self.product, quantity=6, status="RETURN")
+
+    def buckets(self):
+        return dict(self.product.stock_buckets.values_list("expiry_month", "available"))
+
+    def test_projection_follows_movements(self):
+        Inventory.objects.create(product=self.product, quantity=2, status="REMOVE")
+        self.assertEqual(self.product.available_stock.available, 10)
+        self.assertEqual(self.buckets(), {date(2030, 1, 1): 4, NO_EXPIRY_BUCKET: 6})
+
+        self.january.expiry_date = date(2030, 2, 3)
+        self.january.save()
+        allocate_fefo(self.product, 5)
+        self.undated.refresh_from_db()
+        self.undated.delete()
+
+        self.assertEqual(ProductStock.objects.get(product=self.product).available, 0)
+        self.assertEqual(self.buckets(), {date(2030, 1, 1): 0, date(2030, 2, 1): 0, NO_EXPIRY_BUCKET: 0})
+        self.assertEqual(available_stock_drift(), {})
+
+    def test_order_validation_reads_projection(self):
+        user = User.objects.create_user(username="seller", password="pass")
+        client = APIClient()
+        client.force_authenticate(user)
+        order = Order.objects.create(
+            customer=Customer.objects.create(name="Ann", email="ann@example.com", eir_code="D01", zone=1),
+            total_amount=0,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post("/api/order-items/", {"order_id": order.id, "product_id": self.product.id, "quantity": 11})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Only 10 units available", str(response.data))
+        self.assertFalse(any('"api_inventory"' in query["sql"] for query in queries.captured_queries))
+
+    def test_reconcile_reports_and_rebuilds_drift(self):
+        ProductStockBucket.objects.filter(product=self.product, expiry_month=NO_EXPIRY_BUCKET).update(available=1)
+        ProductStock.objects.filter(product=self.product).update(available=3)
+
+        out = StringIO()
+        call_command("reconcile_stock", "--dry-run", stdout=out)
+        self.assertIn(f"product {self.product.id} 9999-12: stored 1, ledger 6 (-5)", out.getvalue())
+        self.assertIn(f"product {self.product.id} total: stored 3, ledger 10 (-7)", out.getvalue())
+        self.assertEqual(self.product.available_stock.available, 3)
+
+        call_command("reconcile_stock", stdout=StringIO())
+        self.assertEqual(available_stock_drift(), {})
+        self.assertEqual(ProductStock.objects.get(product=self.product).available, 10)
+
+
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="clerk", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(name="Bo", email="bo@example.com", eir_code="D02", zone=2)
+        self.order = Order.objects.create(customer=self.customer, total_amount=0)
+        self.tea = Product.objects.create(name="Tea", price="2.50", stock_quantity=100)
+        self.jam = Product.objects.create(name="Jam", price="4.00", stock_quantity=100)
+
+    def test_lines_add_to_total_as_they_are_written(self):
+        for product, quantity in [(self.tea, 4), (self.jam, 1)]:
+            response = self.client.post(
+                "/api/order-items/", {"order_id": self.order.id, "product_id": product.id, "quantity": quantity}
+            )
+            self.assertEqual(response.status_code, 201)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 14)
+
+        item = self.order.items.get(product=self.tea)
+        item.quantity = 2
+        item.save()
+        self.order.items.filter(product=self.jam).delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 5)
+
+    def test_moving_a_line_to_another_order_moves_its_amount(self):
+        other = Order.objects.create(customer=self.customer, total_amount=0)
+        item = OrderItem.objects.create(order=self.order, product=self.tea, quantity=2, unit_price="2.50")
+        item.order = other
+        item.quantity = 3
+        item.save()
+
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.order.total_amount, other.total_amount), (0, Decimal("7.50")))
+
+    def test_editing_a_line_allocates_or_returns_the_difference(self):
+        response = self.client.post(
+            "/api/order-items/", {"order_id": self.order.id, "product_id": self.tea.id, "quantity": 3}
+        )
+        item_url = f"/api/order-items/{response.data['id']}/"
+
+        self.assertEqual(self.client.patch(item_url, {"quantity": 8}).status_code, 200)
+        self.assertEqual((stock_level(self.tea.id), available_stock(self.tea.id)), (92, 92))
+        self.assertEqual(self.client.patch(item_url, {"quantity": 101}).status_code, 400)
+
+        self.assertEqual(self.client.patch(item_url, {"quantity": 5}).status_code, 200)
+        self.assertEqual((stock_level(self.tea.id), available_stock(self.tea.id)), (95, 95))
+        self.assertEqual(Inventory.objects.get(product=self.tea, status="RETURN").quantity, 3)
+
+        self.assertEqual(self.client.patch(item_url, {"product_id": self.jam.id}).status_code, 200)
+        self.assertEqual((stock_level(self.tea.id), stock_level(self.jam.id)), (100, 95))
+        self.assertEqual(available_stock_drift([self.tea.id, self.jam.id]), {})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 20)
+
+    def test_bulk_order_writes_total_once(self):
+        lines = [{"product": self.tea, "quantity": 1}] * 20 + [{"product": self.jam, "quantity": 2}]
+        with CaptureQueriesContext(connection) as queries:
+            [order] = create_orders_bulk([{"customer": self.customer, "lines": lines}], user=self.user)
+
+        self.assertEqual(len(order.lines), 21)
+        self.assertEqual(Order.objects.get(pk=order.pk).total_amount, 58)
+        self.assertFalse(any(query["sql"].startswith('UPDATE "api_order"') for query in queries.captured_queries))
+
+
+class DemandForecastTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Cy", email="cy@example.com", eir_code="D03", zone=3)
+        self.tea = Product.objects.create(name="Tea", price=2, stock_quantity=500)
+
+    def _deliver(self, days_ago, quantity):
+        [order] = create_orders_bulk([{"customer": self.customer, "lines": [{"product": self.tea, "quantity": quantity}]}])
+        Order.objects.filter(pk=order.pk).update(order_date=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+        order.status = "DELIVERED"
+        order.save()
+        return order
+
+    def test_delivery_updates_forecast_once(self):
+        for days_ago in range(10, 0, -1):
+            order = self._deliver(days_ago, 7)
+        order.notes = "left at the door"
+        order.save()
+
+        forecast = DemandForecast.objects.get(product=self.tea)
+        self.assertEqual(forecast.observations, 9)
+        self.assertEqual(forecast.day_demand, 7)
+        self.assertAlmostEqual(load_forecaster(forecast).forecast(), 7)
+
+    def test_redelivering_an_order_does_not_count_it_twice(self):
+        order = self._deliver(0, 5)
+        for status in ("PROCESSING", "DELIVERED"):
+            order.status = status
+            order.save()
+        self.assertEqual(DemandForecast.objects.get(product=self.tea).day_demand, 5)
+
+    def test_lines_added_after_delivery_are_counted(self):
+        order = self._deliver(0, 5)
+        item = OrderItem.objects.create(order=order, product=self.tea, quantity=2, unit_price=2)
+        item.quantity = 3
+        item.save()
+        self.assertEqual(DemandForecast.objects.get(product=self.tea).day_demand, 8)
+
+    def test_orders_created_as_delivered_update_the_forecast(self):
+        create_orders_bulk([
+            {"customer": self.customer, "status": "DELIVERED", "lines": [{"product": self.tea, "quantity": 4}]},
+            {"customer": self.customer, "lines": [{"product": self.tea, "quantity": 9}]},
+        ])
+
+        forecast = DemandForecast.objects.get(product=self.tea)
+        self.assertEqual((forecast.observations, forecast.day_demand), (0, 4))
+
+    def test_rebuild_replays_history_into_the_same_state(self):
+        for days_ago in (20, 14, 14, 8, 2):
+            self._deliver(days_ago, 3)
+        incremental = DemandForecast.objects.values(*DemandForecaster.FIELDS).get()
+
+        self.assertEqual(rebuild_demand_forecasts(timezone.now() - timedelta(days=30)), 1)
+        self.assertEqual(DemandForecast.objects.values(*incremental).get(), incremental)
+        self.assertTrue(load_forecaster(DemandForecast.objects.get()).is_intermittent())
+
+
+class BulkOrderTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="importer", password="pass"))
+        self.customers = [
+            Customer.objects.create(name=f"Shop {i}", email=f"shop{i}@example.com", eir_code="D03", zone=3)
+            for i in range(2)
+        ]
+        self.rice = Product.objects.create(name="Rice", price="1.50", stock_quantity=0)
+        self.oil = Product.objects.create(name="Oil", price="6.00", stock_quantity=0)
+        for product in (self.rice, self.oil):
+            for month in (2, 1):
+                Inventory.objects.create(product=product, quantity=500, status="ADD", expiry_date=date(2030, month, 1))
+
+    def payload(self, count):
+        return [
+            {
+                "customer_id": self.customers[i % 2].id,
+                "items": [{"product_id": self.rice.id, "quantity": 3}, {"product_id": self.oil.id, "quantity": 1}],
+            }
+            for i in range(count)
+        ]
+
+    def test_creates_orders_lines_and_allocations_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post("/api/orders/bulk/", self.payload(50), format="json")
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.post("/api/orders/bulk/", self.payload(2), format="json").status_code, 201)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(response.data[0]["total_amount"], "10.50")
+        self.assertEqual(len(response.data[0]["items"]), 2)
+        self.assertEqual(OrderItem.objects.count(), 104)
+
+        january = Inventory.objects.get(product=self.rice, expiry_date=date(2030, 1, 1))
+        february = Inventory.objects.get(product=self.rice, expiry_date=date(2030, 2, 1))
+        self.assertEqual((january.quantity, february.quantity), (500 - 156, 500))
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.stock_quantity, 1000 - 156)
+
+    def test_single_order_and_shortage(self):
+        response = self.client.post("/api/orders/bulk/", self.payload(1)[0], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["items"][1]["unit_price"], "6.00")
+
+        response = self.client.post("/api/orders/bulk/", self.payload(400), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Rice (997 available, 1200 ordered)", str(response.data))
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="retrier", password="pass"))
+        customer = Customer.objects.create(name="Cy", email="cy@example.com", eir_code="D04", zone=4)
+        self.order = Order.objects.create(customer=customer, total_amount=0)
+        self.product = Product.objects.create(name="Salt", price=1, stock_quantity=10)
+
+    def post_item(self, quantity, key="retry-1"):
+        return self.client.post(
+            "/api/order-items/",
+            {"order_id": self.order.id, "product_id": self.product.id, "quantity": quantity},
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_stored_response_without_allocating_again(self):
+        first = self.post_item(3)
+        retry = self.post_item(3)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post_item(3)
+        self.assertEqual(self.post_item(4).status_code, 422)
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+    def test_failed_request_does_not_keep_the_key(self):
+        self.assertEqual(self.post_item(50).status_code, 400)
+        self.assertEqual(self.post_item(5).status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+    def test_expired_keys_are_purged_and_reusable(self):
+        self.post_item(1)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Purged 1", out.getvalue())
+        self.assertEqual(self.post_item(1).status_code, 201)
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+
+class PurchaseOrderReceivingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="dock", password="pass"))
+        supplier = Supplier.objects.create(name="Mill")
+        self.flour = Product.objects.create(name="Flour", price=2, stock_quantity=0)
+        self.sugar = Product.objects.create(name="Sugar", price=2, stock_quantity=0)
+        self.orders = [
+            PurchaseOrder.objects.create(supplier=supplier, product=product, quantity=10)
+            for product in (self.flour, self.flour, self.sugar)
+        ]
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock_quantity
+
+    def test_marking_received_adds_stock_once(self):
+        url = f"/api/purchase-orders/{self.orders[0].id}/"
+        self.assertEqual(self.client.patch(url, {"status": "RECEIVED"}, format="json").status_code, 200)
+        self.assertEqual(self.client.patch(url, {"notes": "checked"}, format="json").status_code, 200)
+        self.assertEqual(self.client.patch(url, {"status": "RECEIVED"}, format="json").status_code, 200)
+
+        self.assertEqual(self.stock(self.flour), 10)
+        self.assertEqual(self.orders[0].receipts.get().inventory.quantity, 10)
+
+    def test_reopening_a_received_order_keeps_its_stock(self):
+        url = f"/api/purchase-orders/{self.orders[0].id}/"
+        self.client.patch(url, {"status": "RECEIVED"}, format="json")
+        self.assertEqual(self.client.patch(url, {"status": "PENDING"}, format="json").status_code, 200)
+
+        response = self.client.patch(url, {"status": "RECEIVED"}, format="json")
+        self.assertEqual(response.data["status"], "RECEIVED")
+        self.assertEqual(self.stock(self.flour), 10)
+
+        response = self.client.patch(url, {"quantity": 8}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("10 unit(s) were already received", str(response.data["quantity"]))
+
+    def test_bulk_partial_receipts_with_references(self):
+        truck = [
+            {"purchase_order_id": self.orders[0].id, "quantity": 4, "reference": "DN-1/1"},
+            {"purchase_order_id": self.orders[1].id, "reference": "DN-1/2"},
+            {"purchase_order_id": self.orders[2].id, "quantity": 3, "reference": "DN-1/3"},
+        ]
+        response = self.client.post("/api/purchase-orders/receive/", truck, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row["status"] for row in response.data["received"]], ["PENDING", "RECEIVED", "PENDING"])
+
+        retry = self.client.post("/api/purchase-orders/receive/", truck, format="json")
+        self.assertEqual(retry.data, {"received": [], "skipped": 3})
+        self.assertEqual((self.stock(self.flour), self.stock(self.sugar)), (14, 3))
+
+        rest = self.client.post(
+            "/api/purchase-orders/receive/", {"purchase_order_id": self.orders[0].id}, format="json"
+        )
+        self.assertEqual(rest.data["received"][0]["quantity"], 6)
+        self.assertEqual(rest.data["received"][0]["status"], "RECEIVED")
+
+    def test_over_receipt_writes_nothing(self):
+        response = self.client.post(
+            "/api/purchase-orders/receive/",
+            [{"purchase_order_id": self.orders[2].id, "quantity": 2}, {"purchase_order_id": self.orders[0].id, "quantity": 11}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("10 unit(s) outstanding, cannot receive 11", str(response.data))
+        self.assertEqual((self.stock(self.flour), self.stock(self.sugar)), (0, 0))
+
+
+class SupplierLeadTimeTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Dairy")
+        self.milk = Product.objects.create(name="Milk", price=1, stock_quantity=0)
+
+    def _order(self, days_ago):
+        order = PurchaseOrder.objects.create(supplier=self.supplier, product=self.milk, quantity=10)
+        PurchaseOrder.objects.filter(pk=order.pk).update(order_date=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_first_delivery_of_each_order_feeds_the_statistics(self):
+        orders = [self._order(days_ago) for days_ago in (2, 4, 9)]
+        receive_purchase_orders([{"purchase_order_id": order.id, "quantity": 5} for order in orders])
+        # the rest of a back-ordered delivery is not a new lead time
+        receive_purchase_orders([{"purchase_order_id": orders[0].id}])
+
+        stats = SupplierLeadTime.objects.get(supplier=self.supplier, product=self.milk)
+        self.assertEqual(stats.count, 3)
+        self.assertAlmostEqual(stats.mean_days, 5, places=3)
+        self.assertAlmostEqual(stats.m2 / (stats.count - 1), 13, places=2)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="checkout", password="pass"))
+        customer = Customer.objects.create(name="Di", email="di@example.com", eir_code="D05", zone=5)
+        self.order = Order.objects.create(customer=customer, total_amount=0)
+        self.product = Product.objects.create(name="Coffee", price="3.00", stock_quantity=10)
+
+    def stock(self):
+        return ProductStock.objects.get(product=self.product)
+
+    def test_hold_is_a_counter_update_and_blocks_overselling(self):
+        with self.assertNumQueries(5):  # savepoint, counter update, insert, release, plus the product lookup
+            response = self.client.post("/api/reservations/", {"product_id": self.product.id, "quantity": 7})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((self.stock().available, self.stock().reserved), (10, 7))
+        self.assertEqual(self.product.product_inv.get().quantity, 10)
+
+        response = self.client.post("/api/reservations/", {"product_id": self.product.id, "quantity": 4})
+        self.assertIn("Only 3 units available", str(response.data))
+        response = self.client.post(
+            "/api/order-items/", {"order_id": self.order.id, "product_id": self.product.id, "quantity": 4}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_confirm_allocates_and_release_returns_the_hold(self):
+        held = reserve(self.product, 6)
+        dropped = reserve(self.product, 2)
+
+        response = self.client.post(f"/api/reservations/{held.id}/confirm/", {"order_id": self.order.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post(f"/api/reservations/{held.id}/confirm/", {}).status_code, 409)
+        self.assertEqual(self.client.delete(f"/api/reservations/{dropped.id}/").status_code, 204)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 18)
+        self.assertEqual(self.product.product_inv.get().quantity, 4)
+        self.assertEqual((self.stock().available, self.stock().reserved), (4, 0))
+
+    def test_order_lines_cannot_take_held_stock(self):
+        reserve(self.product, 7)
+        with self.assertRaises(InsufficientStockError):
+            allocate_fefo(self.product, 4)
+        allocate_fefo(self.product, 3)
+        self.assertEqual((self.stock().available, self.stock().reserved), (7, 7))
+
+    def test_confirm_after_the_stock_was_written_down_fails_the_hold(self):
+        held = reserve(self.product, 10)
+        batch = self.product.product_inv.get()
+        self.assertEqual(self.client.patch(f"/api/inventory/{batch.id}/", {"quantity": 5}).status_code, 200)
+
+        response = self.client.post(f"/api/reservations/{held.id}/confirm/", {"order_id": self.order.id})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(StockReservation.objects.get(pk=held.pk).status, "FAILED")
+        self.assertEqual((self.stock().available, self.stock().reserved), (5, 0))
+        self.assertFalse(self.order.items.exists())
+
+    def test_sweeper_releases_expired_holds_in_bulk(self):
+        for _ in range(3):
+            reserve(self.product, 2, ttl_seconds=60)
+        live = reserve(self.product, 1)
+        StockReservation.objects.exclude(pk=live.pk).update(expires_at=timezone.now())
+
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("released 3", out.getvalue())
+        self.assertEqual(self.stock().reserved, 1)
+        with self.assertRaises(ReservationError):
+            confirm(StockReservation.objects.filter(status="EXPIRED").first().pk, order=self.order)
+
+
+class StripedStockCounterTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Promo", price=1, stock_quantity=100)
+        set_counter_slots(self.product.id, 4)
+        self.product.refresh_from_db()
+
+    def test_movements_land_in_slots_and_are_summed_on_read(self):
+        for _ in range(10):
+            Inventory.objects.create(product=self.product, quantity=2, status="ADJUST")
+        allocate_fefo(self.product, 5)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 100)
+        self.assertEqual(stock_level(self.product.id), 75)
+        self.assertEqual(StockCounterSlot.objects.filter(product=self.product).count(), 4)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="promo", password="pass"))
+        self.assertEqual(client.get(f"/api/products/{self.product.id}/").data["stock_quantity"], 75)
+
+        call_command("fold_stock_counters", stdout=StringIO())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 75)
+        self.assertEqual(stock_level(self.product.id), 75)
+
+    def test_turning_striping_off_folds_and_stale_writers_fall_back(self):
+        Inventory.objects.create(product=self.product, quantity=3, status="ADJUST")
+        set_counter_slots(self.product.id, 0)
+        # self.product still believes it has 4 slots
+        Inventory.objects.create(product=self.product, quantity=4, status="ADJUST")
+
+        self.assertFalse(StockCounterSlot.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 93)
+
+    def test_order_lines_on_a_striped_product_leave_the_shared_rows_alone(self):
+        for days in (30, 60):
+            Inventory.objects.create(
+                product=self.product, quantity=10, status="ADD", expiry_date=date.today() + timedelta(days=days)
+            )
+        with CaptureQueriesContext(connection) as queries:
+            allocate_fefo(self.product, 105)
+            Inventory.objects.create(product=self.product, quantity=1, status="REMOVE")
+
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertFalse([sql for sql in updates if sql.startswith(('UPDATE "api_product" ', 'UPDATE "api_productstock" '))])
+        self.assertFalse([sql for sql in updates if "api_productstockbucket" in sql and '"slot" = 0' in sql])
+        self.assertEqual(available_stock(self.product.id), 15)
+        self.assertEqual(available_stock_drift([self.product.id]), {})
+
+        self.assertTrue(fold_product(self.product.id))
+        self.assertEqual(ProductStock.objects.get(product=self.product).available, 15)
+        self.assertEqual(
+            ProductStockBucket.objects.filter(product=self.product, slot__gt=0).exclude(available=0).count(), 0
+        )
+        self.assertEqual(available_stock_drift([self.product.id]), {})
+        self.assertEqual(stock_level(self.product.id), 14)
+
+    def test_order_lines_on_a_striped_product_respect_holds(self):
+        reserve(self.product, 95)
+        with self.assertRaises(InsufficientStockError):
+            allocate_fefo(self.product, 6)
+        allocate_fefo(self.product, 5)
+        self.assertEqual(available_stock(self.product.id), 0)
+        with self.assertRaises(InsufficientStockError):
+            reserve(self.product, 1)
+
+
+class ExpiryNotificationTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.product = Product.objects.create(name="Yoghurt", price=1, stock_quantity=0)
+
+    def _batch(self, quantity, days):
+        return Inventory.objects.create(
+            product=self.product, quantity=quantity, status="ADD", expiry_date=self.today + timedelta(days=days)
+        )
+
+    def _scan(self, scan=full_scan, today=None, **watermark):
+        today = today or self.today
+        with connection.cursor() as cursor:
+            return scan(cursor, today, today + timedelta(days=30), timezone.now(), **watermark)
+
+    def test_scan_notifies_each_stocked_batch_once(self):
+        expiring = self._batch(5, 10)
+        self._batch(0, 10)  #sold down to zero
+        self._batch(5, 60)  #outside the window
+        notified = self._batch(5, 20)
+        Notification.objects.create(batch_id=notified, product_name=self.product, type="STOCK_EXPIRY")
+
+        self.assertEqual(self._scan(), 1)
+        self.assertEqual(self._scan(), 0)
+        self.assertEqual(
+            list(Notification.objects.filter(type="STOCK_EXPIRY").values_list("batch_id", flat=True).order_by("id")),
+            [notified.id, expiring.id],
+        )
+
+    def _watermark(self, last_run, last_inventory_id=None):
+        return {
+            "window_end": self.today + timedelta(days=expiry_lambda.EXPIRY_WINDOW_DAYS),
+            "last_inventory_id": (
+                last_inventory_id or Inventory.objects.order_by("-id").values_list("id", flat=True).first()
+            ),
+            "last_run": last_run,
+        }
+
+    def test_incremental_scan_only_sees_batches_new_to_the_window(self):
+        self._batch(5, 10)
+        self._batch(5, 31)  #enters the window tomorrow
+        yesterday = timezone.now() - timedelta(days=1)
+        Inventory.objects.update(created_at=yesterday - timedelta(hours=1))
+        self.assertEqual(self._scan(), 1)
+        watermark = self._watermark(yesterday)
+        arrived = self._batch(5, 5)  #already inside the window, but only arrived today
+        Notification.objects.filter(batch_id__expiry_date=self.today + timedelta(days=10)).delete()
+
+        tomorrow = self.today + timedelta(days=1)
+        self.assertEqual(self._scan(incremental_scan, tomorrow, **watermark), 2)
+        self.assertTrue(Notification.objects.filter(batch_id=arrived).exists())
+        #the deleted notification's batch was neither new nor newly in the window
+        self.assertEqual(self._scan(full_scan, tomorrow), 1)
+
+    def test_incremental_scan_rescans_batches_that_committed_after_the_last_run(self):
+        late = self._batch(5, 10)
+        #the last run already saw a higher id, before this batch's transaction committed
+        watermark = self._watermark(timezone.now(), last_inventory_id=late.id + 5)
+        self.assertEqual(self._scan(incremental_scan, **watermark), 1)
+        self.assertTrue(Notification.objects.filter(batch_id=late).exists())
+
+        Notification.objects.all().delete()
+        Inventory.objects.update(created_at=timezone.now() - expiry_lambda.WATERMARK_OVERLAP - timedelta(minutes=1))
+        self.assertEqual(self._scan(incremental_scan, **watermark), 0)
+
+    def test_watermark_is_written_in_place(self):
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            expiry_lambda.write_watermark(cursor, self.today, 10, now - timedelta(days=1))
+            expiry_lambda.write_watermark(cursor, self.today + timedelta(days=1), 12, now)
+
+        watermark = ExpiryScanWatermark.objects.get()
+        self.assertEqual(watermark.name, expiry_lambda.WATERMARK_NAME)
+        self.assertEqual((watermark.window_end, watermark.last_inventory_id), (self.today + timedelta(days=1), 12))
+
+    @skipIf(connection.vendor == "sqlite", "needs FOR UPDATE and INSERT ... RETURNING in a CTE")
+    def test_lambda_scan_counts_per_product_and_moves_the_watermark(self):
+        other = Product.objects.create(name="Kefir", price=1, stock_quantity=0)
+        self._batch(5, 10)
+        self._batch(5, 20)
+        Inventory.objects.create(product=other, quantity=5, status="ADD", expiry_date=self.today + timedelta(days=3))
+        now = timezone.now()
+
+        with connection.cursor() as cursor:
+            inserted = expiry_lambda.create_expiry_notifications(cursor, self.today, now)
+            self.assertEqual(inserted, {self.product.id: 2, other.id: 1})
+            watermark = expiry_lambda.read_watermark(cursor)
+        self.assertEqual(watermark[0], self.today + timedelta(days=expiry_lambda.EXPIRY_WINDOW_DAYS))
+        self.assertEqual(watermark[1], Inventory.objects.order_by("-id").values_list("id", flat=True).first())
+
+        late = self._batch(5, 5)
+        ExpiryScanWatermark.objects.update(last_inventory_id=late.id + 5)
+        with connection.cursor() as cursor:
+            self.assertEqual(
+                expiry_lambda.create_expiry_notifications(cursor, self.today, now + timedelta(minutes=1)),
+                {self.product.id: 1},
+            )
+
+    def test_one_expiry_notification_per_batch(self):
+        batch = self._batch(5, 10)
+        Notification.objects.create(batch_id=batch, product_name=self.product, type="STOCK_EXPIRY")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(batch_id=batch, product_name=self.product, type="STOCK_EXPIRY")
+
+
+class StockAlertTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Milk", price=1, stock_quantity=0)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="alerts", password="pass"))
+
+    def test_one_open_stock_alert_per_product(self):
+        Notification.objects.create(product_name=self.product, type="STOCK_ISSUE")
+        Notification.objects.create(product_name=self.product, type="STOCK_ISSUE", status="CLOSED")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(product_name=self.product, type="STOCK_ISSUE")
+
+    def test_reopening_a_second_alert_is_rejected(self):
+        Notification.objects.create(product_name=self.product, type="STOCK_ISSUE")
+        closed = Notification.objects.create(product_name=self.product, type="STOCK_ISSUE", status="CLOSED")
+
+        response = self.client.patch(f"/api/notifications/{closed.id}/", {"status": "OPEN"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("status", response.data)
+
+        response = self.client.patch(f"/api/notifications/{closed.id}/", {"notes": "checked"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+
+@skipIf(connection.vendor == "sqlite", "needs a database with row-level locking")
+class ConcurrentStockMovementTests(TransactionTestCase):
+    workers = 8
+    movements_per_worker = 50
+    #very conservative floor so the check only trips on lock pile-ups
+    min_movements_per_second = 20
+
+    def test_parallel_movements_on_one_sku_lose_no_updates(self):
+        product = Product.objects.create(name="Hot SKU", price=1, stock_quantity=1000)
+
+        def worker(index):
+            try:
+                for i in range(self.movements_per_worker):
+                    status = "ADD" if (index + i) % 2 else "ADJUST"
+                    quantity = 3 if status == "ADD" else 2
+                    Inventory.objects.create(product_id=product.id, quantity=quantity, status=status)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(worker, range(self.workers)))
+        elapsed = time.perf_counter() - start
+
+        movements = self.workers * self.movements_per_worker
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 1000 + (movements // 2) * 3 - (movements // 2) * 2)
+
+        throughput = movements / elapsed
+        logger.info("%d stock movements on one SKU in %.2fs (%.0f/s)", movements, elapsed, throughput)
+        self.assertGreater(throughput, self.min_movements_per_second)
+
+    def test_parallel_movements_on_a_striped_sku_lose_no_updates(self):
+        product = Product.objects.create(name="Striped SKU", price=1, stock_quantity=1000)
+        set_counter_slots(product.id, 8)
+
+        def worker(index):
+            try:
+                hot = Product.objects.get(pk=product.id)
+                for _ in range(self.movements_per_worker):
+                    Inventory.objects.create(product=hot, quantity=1, status="ADJUST")
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(worker, range(self.workers)))
+
+        movements = self.workers * self.movements_per_worker
+        self.assertEqual(stock_level(product.id), 1000 - movements)
+        fold_product(product.id)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 1000 - movements)
+
+
+class FailingQueueClient:
+    def send_message_batch(self, QueueUrl, Entries):
+        return {"Successful": [], "Failed": [{"Id": entry["Id"], "Code": "Throttled"} for entry in Entries]}
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Cheese", price=5, stock_quantity=100)
+
+    def test_removal_event_is_written_with_the_movement(self):
+        Inventory.objects.create(product=self.product, quantity=1, status="REMOVE")
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.queue, "INVENTORY")
+        self.assertEqual(event.payload, {"product_id": self.product.id, "stock_delta": -1})
+
+    def test_rolled_back_movement_leaves_no_event(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Inventory.objects.create(product=self.product, quantity=1, status="REMOVE")
+                raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_dispatch_sends_in_batches_of_ten(self):
+        OutboxEvent.objects.bulk_create(
+            [OutboxEvent(queue="INVENTORY", payload={"product_id": i}) for i in range(25)]
+        )
+        client = MemoryQueueClient()
+
+        self.assertEqual(dispatch_pending(client), (25, 0))
+        self.assertEqual(client.batch_calls, 3)
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+        self.assertEqual(dispatch_pending(client), (0, 0))
+
+    def test_failed_sends_back_off(self):
+        event = OutboxEvent.objects.create(queue="SHIPMENT", payload={"order_id": 1})
+
+        self.assertEqual(dispatch_pending(FailingQueueClient()), (0, 1))
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, "Throttled")
+        self.assertGreater(event.available_at, timezone.now())
+        # not due again until the backoff has passed
+        self.assertEqual(dispatch_pending(MemoryQueueClient()), (0, 0))
+
+
+@override_settings(OUTBOX_COALESCE_WINDOW_SECONDS=0, LAMBDA_SQS_BATCH_SIZE=10)
+class OutboxCoalescingTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Butter", price=3, stock_quantity=500)
+        self.other = Product.objects.create(name="Jam", price=3, stock_quantity=500)
+
+    def _remove(self, product, quantity):
+        Inventory.objects.create(product=product, quantity=quantity, status="REMOVE")
+
+    def test_repeated_removals_collapse_into_one_message(self):
+        for quantity in (1, 2, 3):
+            self._remove(self.product, quantity)
+        self._remove(self.other, 4)
+
+        events = {event.payload["product_id"]: event for event in OutboxEvent.objects.all()}
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[self.product.id].payload["stock_delta"], -6)
+        self.assertEqual(events[self.product.id].coalesced_count, 3)
+
+    def test_new_window_opens_after_dispatch(self):
+        self._remove(self.product, 1)
+        dispatch_pending(MemoryQueueClient())
+        self._remove(self.product, 1)
+        self.assertEqual(OutboxEvent.objects.filter(dispatched_at__isnull=True).count(), 1)
+
+    def test_removal_during_a_send_is_not_folded_into_the_sent_message(self):
+        self._remove(self.product, 1)
+        product = self.product
+
+        class RacingQueueClient(MemoryQueueClient):
+            def send_message_batch(self, QueueUrl, Entries):
+                # another request removes stock while the claimed message is on the wire
+                Inventory.objects.create(product=product, quantity=2, status="REMOVE")
+                return super().send_message_batch(QueueUrl, Entries)
+
+        self.assertEqual(dispatch_pending(RacingQueueClient()), (1, 0))
+        pending = OutboxEvent.objects.get(dispatched_at__isnull=True)
+        self.assertEqual(pending.payload["stock_delta"], -2)
+        self.assertEqual(pending.coalesce_key, f"product:{self.product.id}")
+
+    def test_events_wait_for_the_window(self):
+        with override_settings(OUTBOX_COALESCE_WINDOW_SECONDS=60):
+            self._remove(self.product, 1)
+        self.assertEqual(dispatch_pending(MemoryQueueClient()), (0, 0))
+
+    def test_stats_report_reduction(self):
+        for _ in range(20):
+            self._remove(self.product, 1)
+        dispatch_pending(MemoryQueueClient())
+
+        stats = coalescing_stats()
+        self.assertEqual((stats["events"], stats["messages"], stats["messages_saved"]), (20, 1, 19))
+        self.assertEqual((stats["lambda_invocations"], stats["lambda_invocations_uncoalesced"]), (1, 2))
+
+
+class ListQueryBudgetTests(TestCase):
+    """Every list endpoint must stay within a fixed number of queries, whatever the row count"""
+    rows = 6
+
+    #queries per list request
+    budgets = {
+        "/api/categories/": 1,
+        "/api/products/": 1,
+        "/api/inventory/": 1,
+        "/api/suppliers/": 1,
+        "/api/purchase-orders/": 1,
+        "/api/shipping/": 1,
+        "/api/notifications/": 1,
+        "/api/customers/": 1,
+        "/api/orders/": 1,
+        "/api/order-items/": 1,
+        "/api/sales-orders/": 1,
+        "/api/shipment-orders/": 1,
+        "/api/reservations/": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="budget", password="pass")
+        shipment = Shipment.objects.create(
+            logistics_company="DPD", contact_person="Ann", email="ops@dpd.test", delivery_zone=[1]
+        )
+        for i in range(cls.rows):
+            category = ProductCategory.objects.create(name=f"Category {i}")
+            product = Product.objects.create(name=f"Product {i}", category=category, price=2, stock_quantity=50)
+            supplier = Supplier.objects.create(name=f"Supplier {i}")
+            PurchaseOrder.objects.create(supplier=supplier, product=product, quantity=5)
+            Notification.objects.create(
+                batch_id=product.product_inv.get(), product_name=product, type="STOCK_EXPIRY"
+            )
+            customer = Customer.objects.create(
+                name=f"Customer {i}", email=f"c{i}@shop.test", eir_code="D01F5P2", zone=1
+            )
+            order = Order.objects.create(customer=customer, total_amount=0)
+            OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=2)
+            SalesOrder.objects.create(order=order, payment_terms="NET30")
+            ShipmentOrder.objects.create(order=order, shipment_provider=shipment, shipping_address="D01F5P2")
+            reserve(product, 1, order=order)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_endpoints_stay_within_query_budget(self):
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pager", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        product = Product.objects.create(name="Tea", price=1, stock_quantity=0)
+        for _ in range(6):
+            Inventory.objects.create(product=product, quantity=1, status="ADD")
+
+    def test_following_next_walks_every_row_once_newest_first(self):
+        seen, url = [], "/api/inventory/?page_size=4"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+
+        expected = list(Inventory.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="manager", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name="Rice", price=2, stock_quantity=5)
+        Product.objects.create(name="Oats", price=1, stock_quantity=40)
+        Notification.objects.create(product_name=self.product, type="STOCK_ISSUE")
+        Notification.objects.create(product_name=self.product, type="STOCK_ISSUE", status="CLOSED")
+
+    def test_stats_are_aggregated_in_a_few_queries_and_cached(self):
+        with self.assertNumQueries(5):
+            response = self.client.get("/api/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_products"], 2)
+        self.assertEqual(response.data["low_stock_products"], 1)
+        self.assertEqual(response.data["total_inventory_value"], 50)
+        self.assertEqual(response.data["open_notifications_by_type"], {"STOCK_ISSUE": 1})
+
+        with self.assertNumQueries(0):
+            self.client.get("/api/dashboard/")
+
+    def test_writes_invalidate_the_cached_stats(self):
+        self.client.get("/api/dashboard/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Flour", price=1, stock_quantity=3)
+
+        response = self.client.get("/api/dashboard/")
+        self.assertEqual(response.data["total_products"], 3)
+        self.assertEqual(response.data["low_stock_products"], 2)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="picker", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ProductCategory.objects.create(name="Dairy")
+        self.product = Product.objects.create(name="Yogurt", category=category, price=1, stock_quantity=5)
+        supplier = Supplier.objects.create(name="Farm")
+        PurchaseOrder.objects.create(supplier=supplier, product=self.product, quantity=2)
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries[-1]["sql"]
+
+    def test_fields_trims_the_payload_and_skips_joins(self):
+        response, sql = self._get("/api/products/?fields=id,name")
+        self.assertEqual(response.data, [{"id": self.product.id, "name": "Yogurt"}])
+        self.assertNotIn("JOIN", sql)
+
+    def test_unexpanded_relations_collapse_to_ids(self):
+        response, sql = self._get("/api/purchase-orders/?expand=supplier")
+        row = response.data[0]
+        self.assertEqual(row["product"], self.product.id)
+        self.assertEqual(row["supplier"]["name"], "Farm")
+        self.assertIn('"api_supplier"', sql)
+        self.assertNotIn('"api_product"', sql)
+
+    def test_default_response_keeps_nested_objects(self):
+        response, _ = self._get("/api/purchase-orders/")
+        self.assertEqual(response.data[0]["product"]["category"]["name"], "Dairy")
@@ -17,9 +17,11 @@ router.register(r'customers', CustomerViewSet, basename='customer')
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'order-items', OrderItemViewSet, basename='order-item')
 router.register(r'sales-orders', SalesOrderViewSet, basename='sale-order')
+router.register(r'reservations', StockReservationViewSet, basename='reservation')
 
 
 # Define urlpatterns
 urlpatterns = [
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('', include(router.urls)),  
 ]
\ No newline at end of file
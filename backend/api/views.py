@@ -1,22 +1,52 @@
 from django.forms import ValidationError
 from django.shortcuts import render
 from django.http import HttpResponse
-from rest_framework import generics,viewsets
+from rest_framework import generics,viewsets,status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from .serializers import UserSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from .models import Supplier, Product, ProductCategory, Inventory, PurchaseOrder,Shipment,Notification\
-,Customer, Order, OrderItem, SalesOrder, ShipmentOrder
+,Customer, Order, OrderItem, SalesOrder, ShipmentOrder, StockReservation
 from .serializers import (
     SupplierSerializer, ProductSerializer, ProductCategorySerializer,
-    InventorySerializer, PurchaseOrderSerializer,ShipmentSerializer,NotificationSerializer,
-     CustomerSerializer, OrderSerializer, OrderItemSerializer,
-   SalesOrderSerializer, ShipmentOrderSerializer
+    InventorySerializer, InventoryReceiptSerializer, PurchaseOrderSerializer, PurchaseOrderReceiveSerializer,ShipmentSerializer,NotificationSerializer,
+     CustomerSerializer, OrderSerializer, OrderItemSerializer, BulkOrderSerializer,
+   SalesOrderSerializer, ShipmentOrderSerializer, StockReservationSerializer
 )
+from .dashboard import get_dashboard_stats
+from .idempotency import run_idempotent
+from . import reservations
+from .stock_counters import pending_slot_delta
+from .pagination import CreatedAtCursorPagination, OrderDateCursorPagination
+from .stock_allocation import InsufficientStockError
 import logging
 
 
 
+class RenderedRelationsMixin:
+    """Only join the relations the serializer will render for this request (see ?fields= and ?expand=)"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if self.request.method != "GET" or not hasattr(serializer_class, "select_related_for"):
+            return queryset
+
+        paths = serializer_class.select_related_for(self.request)
+        queryset = queryset.select_related(None)
+        return queryset.select_related(*paths) if paths else queryset
+
+
+class IdempotentCreateMixin:
+    """Replay the stored response when a create is retried with the same Idempotency-Key header"""
+
+    def create(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
+
+
 def home(requests):
     return HttpResponse("this is the homepage")
 
@@ -29,7 +59,15 @@ class CreateUserView(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
 
-class ProductCategoryViewSet(viewsets.ModelViewSet):
+class DashboardView(APIView):
+    """Aggregated counts for the home page dashboard"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_dashboard_stats())
+
+
+class ProductCategoryViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
     """A viewset for viewing and editing product category instances."""
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategorySerializer
@@ -39,9 +77,9 @@ class ProductCategoryViewSet(viewsets.ModelViewSet):
         """Automatically assign the creator of the category."""
         serializer.save(created_by=self.request.user)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
     """A viewset for viewing and editing products"""
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related("category").annotate(pending_stock=pending_slot_delta())
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
 
@@ -49,16 +87,33 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(IdempotentCreateMixin, RenderedRelationsMixin, viewsets.ModelViewSet):
     """A viewset for viewing and editing inventory data"""
-    queryset = Inventory.objects.all()
+    queryset = Inventory.objects.select_related("product__category")
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def perform_create(self, serializer):
         serializer.save(updated_by=self.request.user)
 
-class SupplierViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """Ingest a list of inventory receipts with a single insert"""
+        return run_idempotent(request, lambda: self._bulk(request))
+
+    def _bulk(self, request):
+        serializer = InventoryReceiptSerializer(
+            data=request.data, many=True, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        batches = serializer.save()
+        return Response(
+            {"created": len(batches), "batch_ids": [batch.batch_id for batch in batches]},
+            status=status.HTTP_201_CREATED,
+        )
+
+class SupplierViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
     """A viewset for viewing and editing supplier """
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
@@ -67,16 +122,45 @@ class SupplierViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class PurchaseOrderViewSet(viewsets.ModelViewSet):
+class PurchaseOrderViewSet(IdempotentCreateMixin, RenderedRelationsMixin, viewsets.ModelViewSet):
     """A viewset for viewing and editing purchase order instances."""
-    queryset = PurchaseOrder.objects.all()
+    queryset = PurchaseOrder.objects.select_related("supplier", "product__category")
     serializer_class = PurchaseOrderSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class ShipmentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["post"], url_path="receive")
+    def receive(self, request):
+        """Receive stock against one or many purchase orders in a single transaction"""
+        return run_idempotent(request, lambda: self._receive(request))
+
+    def _receive(self, request):
+        data = request.data if isinstance(request.data, list) else [request.data]
+        serializer = PurchaseOrderReceiveSerializer(data=data, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        received, skipped = serializer.save()
+        return Response(
+            {
+                "received": [
+                    {
+                        "id": receipt.id,
+                        "purchase_order_id": receipt.purchase_order_id,
+                        "quantity": receipt.quantity,
+                        "reference": receipt.reference,
+                        "batch_id": receipt.inventory.batch_id,
+                        "status": receipt.purchase_order.status,
+                        "received_quantity": receipt.purchase_order.received_quantity,
+                    }
+                    for receipt in received
+                ],
+                "skipped": len(skipped),
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+class ShipmentViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
     """A viewset for viewing, creating, updating, and deleting shipment instances."""
     queryset = Shipment.objects.all()
     serializer_class = ShipmentSerializer
@@ -86,19 +170,20 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         """Override to set the user who created the shipment."""
         serializer.save(created_by=self.request.user)
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
 
     """A viewset for viewing and editing Notification instances."""
-    queryset = Notification.objects.all()
+    queryset = Notification.objects.select_related("batch_id", "product_name")
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def perform_update(self, serializer):
         """Override to set additional logic during notification update."""
         serializer.save()
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
    """A viewset for managing customer data"""
    queryset = Customer.objects.all()
    serializer_class = CustomerSerializer
@@ -107,43 +192,90 @@ class CustomerViewSet(viewsets.ModelViewSet):
    def perform_create(self, serializer):
        serializer.save(created_by=self.request.user)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(IdempotentCreateMixin, RenderedRelationsMixin, viewsets.ModelViewSet):
    """A viewset for managing orders"""
-   queryset = Order.objects.all()
+   queryset = Order.objects.select_related("customer")
    serializer_class = OrderSerializer
    permission_classes = [IsAuthenticated]
+   pagination_class = OrderDateCursorPagination
 
    def perform_create(self, serializer):
        serializer.save(created_by=self.request.user)
 
-class OrderItemViewSet(viewsets.ModelViewSet):
+   @action(detail=False, methods=["post"], url_path="bulk")
+   def bulk(self, request):
+       """Create one order or a list of orders, with their lines, in a single transaction"""
+       return run_idempotent(request, lambda: self._bulk(request))
+
+   def _bulk(self, request):
+       many = isinstance(request.data, list)
+       serializer = BulkOrderSerializer(
+           data=request.data if many else [request.data], many=True, context=self.get_serializer_context()
+       )
+       serializer.is_valid(raise_exception=True)
+       serializer.save()
+       data = serializer.data
+       return Response(data if many else data[0], status=status.HTTP_201_CREATED)
+
+class OrderItemViewSet(IdempotentCreateMixin, RenderedRelationsMixin, viewsets.ModelViewSet):
    """A viewset for managing order items"""
-   queryset = OrderItem.objects.all()
+   queryset = OrderItem.objects.select_related("order__customer", "product__category")
    serializer_class = OrderItemSerializer
    permission_classes = [IsAuthenticated]
+   pagination_class = CreatedAtCursorPagination
 
    def get_queryset(self):
        """Optionally filter by order"""
-       queryset = OrderItem.objects.all()
+       queryset = super().get_queryset()
        order_id = self.request.query_params.get('order_id', None)
        if order_id is not None:
            queryset = queryset.filter(order_id=order_id)
        return queryset
 
-class SalesOrderViewSet(viewsets.ModelViewSet):
+class StockReservationViewSet(IdempotentCreateMixin, RenderedRelationsMixin, viewsets.ModelViewSet):
+   """Checkout holds: POST reserves, DELETE releases, POST .../confirm/ turns the hold into an order line"""
+   queryset = StockReservation.objects.select_related("product__category")
+   serializer_class = StockReservationSerializer
+   permission_classes = [IsAuthenticated]
+   pagination_class = CreatedAtCursorPagination
+   http_method_names = ["get", "post", "delete", "head", "options"]
+
+   def destroy(self, request, *args, **kwargs):
+       try:
+           reservations.release(self.get_object().pk)
+       except reservations.ReservationError as e:
+           return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+       return Response(status=status.HTTP_204_NO_CONTENT)
+
+   @action(detail=True, methods=["post"])
+   def confirm(self, request, pk=None):
+       """Allocate the held stock (FEFO) into an order, optionally given as order_id"""
+       order = None
+       if request.data.get("order_id"):
+           order = Order.objects.filter(pk=request.data["order_id"]).first()
+           if order is None:
+               return Response({"order_id": ["Invalid order_id"]}, status=status.HTTP_400_BAD_REQUEST)
+       try:
+           item = reservations.confirm(self.get_object().pk, order=order)
+       except (reservations.ReservationError, InsufficientStockError) as e:
+           return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+       return Response(OrderItemSerializer(item, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
+class SalesOrderViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
    """A viewset for managing sales orders"""
-   queryset = SalesOrder.objects.all()
+   queryset = SalesOrder.objects.select_related("order__customer")
    serializer_class = SalesOrderSerializer
    permission_classes = [IsAuthenticated]
 
    def perform_create(self, serializer):
        serializer.save(created_by=self.request.user)
 
-class ShipmentOrderViewSet(viewsets.ModelViewSet):
+class ShipmentOrderViewSet(RenderedRelationsMixin, viewsets.ModelViewSet):
    """A viewset for managing shipment orders"""
-   queryset = ShipmentOrder.objects.all()
+   queryset = ShipmentOrder.objects.select_related("order__customer", "shipment_provider")
    serializer_class = ShipmentOrderSerializer
    permission_classes = [IsAuthenticated]
+   pagination_class = CreatedAtCursorPagination
 
    def get_serializer_context(self):
        """Add order to context if creating new shipment order"""
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 import os
 
 load_dotenv()
@@ -162,10 +163,47 @@ CORS_ALLOWED_ORIGINS = [
     "http://ec2-34-242-244-88.eu-west-1.compute.amazonaws.com"
 ]
 
+#lets the frontend send Idempotency-Key on retried writes
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 ROOT_URLCONF = "crud.urls"
 
 AWS_INVENTORY_SQS_QUEUE_URL = os.environ.get('AWS_SQS_QUEUE_URL')
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = 'eu-west-1'
-AWS_SHIPMENT_SQS_QUEUE_URL= os.environ.get('AWS_SHIPMENT_SQS_QUEUE_URL')
\ No newline at end of file
+AWS_SHIPMENT_SQS_QUEUE_URL= os.environ.get('AWS_SHIPMENT_SQS_QUEUE_URL')
+
+#transactional outbox: "sqs" sends to AWS, "memory"/"sqlite" are local stand-ins for offline runs
+OUTBOX_SQS_BACKEND = os.environ.get('OUTBOX_SQS_BACKEND', 'sqs')
+OUTBOX_SQLITE_PATH = os.environ.get('OUTBOX_SQLITE_PATH', os.path.join(BASE_DIR, 'outbox_queue.sqlite3'))
+
+#repeated events for the same product are folded into one message within this window
+OUTBOX_COALESCE_WINDOW_SECONDS = int(os.environ.get('OUTBOX_COALESCE_WINDOW_SECONDS', 30))
+#SQS batch size configured on the Lambda trigger, used to estimate invocations saved
+LAMBDA_SQS_BATCH_SIZE = int(os.environ.get('LAMBDA_SQS_BATCH_SIZE', 10))
+
+#dashboard aggregates are cached briefly and invalidated on writes
+DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 30))
+
+#invalidation only reaches the processes sharing the cache: set REDIS_URL whenever more than one
+#gunicorn worker or container serves the API, otherwise the per-process cache assumes a single worker
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+#responses of writes sent with an Idempotency-Key header are replayed for this long
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+#checkout holds lapse after this long unless the order is confirmed
+STOCK_RESERVATION_TTL_SECONDS = int(os.environ.get('STOCK_RESERVATION_TTL_SECONDS', 900))
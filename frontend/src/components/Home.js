@@ -56,42 +56,16 @@ const Home = () => {
 
   const fetchStats = async () => {
     try {
-      // Fetch products count
-      const products = await api.get('/api/products/');
-      const totalProducts = products.data.length;
-
-      // Fetch categories count
-      const categories = await api.get('/api/categories/');
-      const totalCategories = categories.data.length;
-
-      // Fetch inventory with low stock
-      const inventory = await api.get('/api/inventory/');
-      const lowStock = inventory.data.filter(item => item.quantity <= 10).length;
-
-      // Calculate total inventory value
-      const totalInventoryValue = inventory.data.reduce((acc, item) => {
-        return acc + (item.quantity * item.product.price);
-      }, 0);
-
-      // Fetch pending shipments
-      const shipments = await api.get('/api/shipment-orders/');
-      const pendingShipments = shipments.data.filter(
-        shipment => shipment.status === 'PENDING'
-      ).length;
-
-      // Fetch active notifications/tasks
-      const notifications = await api.get('/api/notifications/');
-      const activeNotifications = notifications.data.filter(
-        notification => notification.status === 'OPEN'
-      ).length;
+      // all figures come pre-aggregated from the dashboard endpoint
+      const { data } = await api.get('/api/dashboard/');
 
       setStats({
-        totalProducts,
-        totalCategories,
-        lowStock,
-        pendingShipments,
-        activeNotifications,
-        totalInventoryValue
+        totalProducts: data.total_products,
+        totalCategories: data.total_categories,
+        lowStock: data.low_stock_products,
+        pendingShipments: data.pending_shipments,
+        activeNotifications: data.open_notifications,
+        totalInventoryValue: Number(data.total_inventory_value)
       });
     } catch (error) {
       console.error('Error fetching dashboard stats:', error);
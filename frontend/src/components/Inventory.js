@@ -29,12 +29,14 @@ const Inventory = () => {
   const [editExpiryModalOpen, setEditExpiryModalOpen] = useState(false);
   const [currentId, setId] = useState(null);
   const [currentExpiryDate, setCurrentExpiryDate] = useState('');
+  const [nextPage, setNextPage] = useState(null);
 
-  //fetch inventory data
+  //fetch first page of inventory data
   const getData = async () => {
     try {
       const res = await api.get('/api/inventory/');
-      setInventory(res.data);
+      setInventory(res.data.results);
+      setNextPage(res.data.next);
     } catch (error) {
       console.error('Failed to fetch Inventory data:', error);
       setSnackbarMessage('Error loading Inventory data');
@@ -45,6 +47,23 @@ const Inventory = () => {
     }
   };
 
+  //append the next page of inventory data
+  const loadMore = async () => {
+    try {
+      setLoading(true);
+      const res = await api.get(nextPage);
+      setInventory((rows) => [...rows, ...res.data.results]);
+      setNextPage(res.data.next);
+    } catch (error) {
+      console.error('Failed to fetch more Inventory data:', error);
+      setSnackbarMessage('Error loading Inventory data');
+      setSnackbarSeverity('error');
+      setSnackbarOpen(true);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   //load data on page load
   useEffect(() => {
     getData();
@@ -166,6 +185,13 @@ const Inventory = () => {
             </Box>
           )}
         />
+        {nextPage && (
+          <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+            <Button variant="outlined" onClick={loadMore} disabled={loading}>
+              Load more
+            </Button>
+          </Box>
+        )}
       </Box>
 
       {/* Expiry Date Edit Modal */}
@@ -27,13 +27,15 @@ const Notifications = () => {
   const [currentId, setId] = useState(null);
   const [currentStatus, setCurrentStatus] = useState('');
   const [tasks, settasks] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
 
-  //fetch notification data
+  //fetch first page of notification data
   const getData = async () => {
     try {
       const res = await api.get('/api/notifications/');
-      setNotification(res.data);
-      settasks(res.data)
+      setNotification(res.data.results);
+      settasks(res.data.results)
+      setNextPage(res.data.next);
     } catch (error) {
       console.error('Failed to fetch Notification data:', error);
       setSnackbarMessage('Error loading Notification data');
@@ -44,6 +46,24 @@ const Notifications = () => {
     }
   };
 
+  //append the next page of notification data
+  const loadMore = async () => {
+    try {
+      setLoading(true);
+      const res = await api.get(nextPage);
+      setNotification((rows) => [...rows, ...res.data.results]);
+      settasks((rows) => [...rows, ...res.data.results]);
+      setNextPage(res.data.next);
+    } catch (error) {
+      console.error('Failed to fetch more Notification data:', error);
+      setSnackbarMessage('Error loading Notification data');
+      setSnackbarSeverity('error');
+      setSnackbarOpen(true);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   //load data on page load
   useEffect(() => {
     getData();
@@ -174,7 +194,13 @@ const handleStatusUpdate = async () => {
             </Box>
           )}
         />
-    
+    {nextPage && (
+      <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+        <Button variant="outlined" onClick={loadMore} disabled={loading}>
+          Load more
+        </Button>
+      </Box>
+    )}
 
   </Box>
 
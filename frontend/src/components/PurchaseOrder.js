@@ -40,8 +40,8 @@ const PurchaseOrder = () => {
     const fetchData = async () => {
       try {
         const [productsResponse, suppliersResponse, purchaseOrdersResponse] = await Promise.all([
-          api.get('/api/products/'),
-          api.get('/api/suppliers/'),
+          api.get('/api/products/?fields=id,name'),
+          api.get('/api/suppliers/?fields=id,name'),
           api.get('/api/purchase-orders/')
         ]);
         setProducts(productsResponse.data);
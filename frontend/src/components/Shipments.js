@@ -42,6 +42,7 @@ const Shipments = () => {
   const [selectedShipment, setSelectedShipment] = useState(null); // Store selected shipment for editing
   const [shipmentOrders, setShipmentOrders] = useState([]);
 const [loadingShipments, setLoadingShipments] = useState(true);
+  const [shipmentOrdersNext, setShipmentOrdersNext] = useState(null);
 
   const { setValue, handleSubmit, control, reset } = useForm({ defaultValues: defaultValues });
 
@@ -252,11 +253,12 @@ const [loadingShipments, setLoadingShipments] = useState(true);
     }
   };
 
-  //fetch shipment orders data
+  //fetch first page of shipment orders data
   const fetchShipmentOrders = async () => {
     try {
       const response = await api.get('/api/shipment-orders/');
-      setShipmentOrders(response.data);
+      setShipmentOrders(response.data.results);
+      setShipmentOrdersNext(response.data.next);
     } catch (error) {
       console.error('Failed to fetch shipment orders:', error);
       setSnackbarMessage('Error loading shipment orders');
@@ -266,6 +268,23 @@ const [loadingShipments, setLoadingShipments] = useState(true);
       setLoadingShipments(false);
     }
   };
+
+  //append the next page of shipment orders
+  const loadMoreShipmentOrders = async () => {
+    try {
+      setLoadingShipments(true);
+      const response = await api.get(shipmentOrdersNext);
+      setShipmentOrders((rows) => [...rows, ...response.data.results]);
+      setShipmentOrdersNext(response.data.next);
+    } catch (error) {
+      console.error('Failed to fetch more shipment orders:', error);
+      setSnackbarMessage('Error loading shipment orders');
+      setSnackbarSeverity('error');
+      setSnackbarOpen(true);
+    } finally {
+      setLoadingShipments(false);
+    }
+  };
   
   useEffect(() => {
     fetchShipmentOrders();
@@ -383,6 +402,13 @@ const [loadingShipments, setLoadingShipments] = useState(true);
     state={{ isLoading: loadingShipments }}
     enableRowActions={false}
   />
+  {shipmentOrdersNext && (
+    <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+      <Button variant="outlined" onClick={loadMoreShipmentOrders} disabled={loadingShipments}>
+        Load more
+      </Button>
+    </Box>
+  )}
 </Box>
 
       {/* Edit Shipping Partner Modal */}
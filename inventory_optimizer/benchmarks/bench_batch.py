@@ -0,0 +1,51 @@
+"""Time the scalar and vectorized recommendation paths (tests/test_batch.py checks they agree).
+
+    pip install -e '.[batch]'
+    python benchmarks/bench_batch.py --skus 10000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from inventory_optimizer_package_23384069 import InventoryOptimizer
+
+
+def catalogue(skus, seed=0):
+    rng = np.random.default_rng(seed)
+    product_ids = np.arange(1, skus + 1)
+    # a third of the catalogue did not sell this week
+    sales = np.where(rng.random(skus) < 0.33, 0, rng.integers(1, 500, skus))
+    current_stock = rng.integers(0, 400, skus)
+    return product_ids, sales, current_stock
+
+
+def run(skus):
+    optimizer = InventoryOptimizer()
+    product_ids, sales, current_stock = catalogue(skus)
+    # the scalar path is fed Python ints and 1-tuples, as the Lambda does
+    rows = list(zip(product_ids.tolist(), sales.tolist(), current_stock.tolist()))
+
+    start = time.perf_counter()
+    for product_id, quantity, stock in rows:
+        optimizer.generate_recommendations(product_id, [(quantity,)], stock)
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    optimizer.generate_recommendations_batch(product_ids, sales, current_stock)
+    batch_seconds = time.perf_counter() - start
+
+    print(f"{skus:>9} SKUs  scalar {scalar_seconds * 1000:>9.1f} ms  batch {batch_seconds * 1000:>7.1f} ms  "
+          f"x{scalar_seconds / batch_seconds:,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalar vs vectorized InventoryOptimizer recommendations")
+    parser.add_argument('--skus', type=int, nargs='+', default=[10_000, 1_000_000])
+    args = parser.parse_args()
+    for skus in args.skus:
+        run(skus)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from .forecasting import DemandForecaster, RunningStats
 from .optimizer import InventoryOptimizer
 
-__all__ = ['InventoryOptimizer']
\ No newline at end of file
+__all__ = ['DemandForecaster', 'InventoryOptimizer', 'RunningStats']
\ No newline at end of file
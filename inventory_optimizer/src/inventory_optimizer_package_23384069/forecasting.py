@@ -0,0 +1,148 @@
+from copy import copy
+from math import sqrt
+
+# Croston is used once demand arrives on fewer than ~3 days in 4 (Syntetos-Boylan cut-off)
+INTERMITTENT_INTERVAL = 1.32
+# after this many idle days Holt's level has long since decayed, stop iterating
+MAX_IDLE_DAYS = 365
+
+
+class DemandForecaster:
+    """
+    Incremental daily demand forecast for one product
+    Keeps Holt exponential smoothing (level/trend) for regular demand, a Croston
+    estimator (demand size/interval) for intermittent demand and a smoothed variance
+    of the daily forecast error for safety stock. observe() is O(1) per delivered
+    sale and the whole state is the handful of numbers in FIELDS
+    """
+    FIELDS = (
+        'day', 'day_demand', 'level', 'trend', 'error_variance',
+        'demand_size', 'demand_interval', 'periods_since_demand', 'observations',
+    )
+
+    def __init__(self, alpha=0.3, beta=0.1, croston_alpha=0.1, **state):
+        self.alpha = alpha
+        self.beta = beta
+        self.croston_alpha = croston_alpha
+        self.day = None  # the open day, its demand is still being collected
+        self.day_demand = 0.0
+        self.level = None
+        self.trend = 0.0
+        self.error_variance = 0.0
+        self.demand_size = None
+        self.demand_interval = None
+        self.periods_since_demand = 0
+        self.observations = 0  # closed days seen
+        for field, value in state.items():
+            if field not in self.FIELDS:
+                raise TypeError(f"Unknown forecast state field: {field}")
+            setattr(self, field, value)
+
+    def to_dict(self):
+        """The state to persist, keyed by FIELDS"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def observe(self, day, quantity):
+        """Record a delivered sale; sales dated before the open day are folded into it"""
+        if self.day is None:
+            self.day = day
+        elif day > self.day:
+            self._advance(day)
+        self.day_demand += quantity
+
+    def _advance(self, day):
+        """Close the open day and every idle day before `day`, then open `day`"""
+        self._close_day(self.day_demand)
+        idle_days = (day - self.day).days - 1
+        for _ in range(min(idle_days, MAX_IDLE_DAYS)):
+            self._smooth(0.0)
+        # Croston only counts idle days, no need to step through them
+        self.periods_since_demand += idle_days
+        self.observations += idle_days
+        self.day = day
+        self.day_demand = 0.0
+
+    def _smooth(self, demand):
+        error = demand - (self.level + self.trend)
+        self.error_variance = self.alpha * error * error + (1 - self.alpha) * self.error_variance
+        previous_level = self.level
+        self.level = self.alpha * demand + (1 - self.alpha) * (self.level + self.trend)
+        self.trend = self.beta * (self.level - previous_level) + (1 - self.beta) * self.trend
+
+    def _close_day(self, demand):
+        if self.level is None:
+            self.level = demand
+        else:
+            self._smooth(demand)
+
+        if demand > 0:
+            interval = self.periods_since_demand + 1
+            if self.demand_size is None:
+                self.demand_size, self.demand_interval = demand, interval
+            else:
+                self.demand_size += self.croston_alpha * (demand - self.demand_size)
+                self.demand_interval += self.croston_alpha * (interval - self.demand_interval)
+            self.periods_since_demand = 0
+        else:
+            self.periods_since_demand += 1
+        self.observations += 1
+
+    def demand_std(self):
+        """Standard deviation of daily demand around the forecast"""
+        return sqrt(self.error_variance)
+
+    def is_intermittent(self):
+        return self.demand_interval is not None and self.demand_interval > INTERMITTENT_INTERVAL
+
+    def forecast(self, day=None):
+        """
+        Expected demand per day as of `day` (defaults to the open day)
+        The open day is still partial, so only closed days count once there are any
+        """
+        state = self
+        if day is not None and self.day is not None and day > self.day:
+            state = copy(self)
+            state._advance(day)
+        if state.observations == 0:
+            return float(state.day_demand)
+        if state.is_intermittent():
+            # Syntetos-Boylan correction of Croston's biased size/interval ratio
+            return (1 - state.croston_alpha / 2) * state.demand_size / state.demand_interval
+        return max(state.level + state.trend, 0.0)
+
+
+class RunningStats:
+    """
+    Welford running mean/variance, one O(1) add() per observation
+    The state is (count, mean, m2), so it can be stored in three columns
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Fold another RunningStats into this one (Chan et al. pairwise update), returns self"""
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+            self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """Sample variance, 0 until there are two observations"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return sqrt(self.variance)
@@ -1,3 +1,12 @@
+from math import sqrt
+from statistics import NormalDist
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed by generate_recommendations_batch
+    np = None
+
+
 class InventoryOptimizer:
     def __init__(self, min_stock_threshold=10):
         self.min_stock_threshold = min_stock_threshold
@@ -17,7 +26,55 @@ class InventoryOptimizer:
             product_id, 
             delivered_quantities
         )
-        
+        return self._recommend(product_id, daily_average, current_stock)
+
+    def generate_recommendations_from_forecast(self, product_id, forecaster, current_stock, day=None):
+        """
+        Recommendations from a stored DemandForecaster instead of the order history
+        day: the date to forecast for, defaults to the forecaster's open day
+        """
+        daily_average = forecaster.forecast(day) if forecaster is not None else 0
+        return self._recommend(product_id, daily_average, current_stock)
+
+    def generate_recommendations_with_lead_time(self, product_id, forecaster, current_stock, lead_time,
+                                                service_level=0.95, day=None):
+        """
+        Reorder point from demand variability and supplier lead time instead of fixed multipliers
+        lead_time: RunningStats of supplier lead times in days
+        reorder_point = daily demand * lead time + safety stock, where safety stock is
+        z(service_level) * sqrt(lead time * demand variance + daily demand^2 * lead time variance).
+        The order tops stock up to the reorder point plus a week of demand. As in
+        generate_recommendations, the reorder point is at least min_stock_threshold and
+        an order that is needed is at least twice that.
+        Without demand or lead time history it falls back to generate_recommendations_from_forecast
+        """
+        if forecaster is None or lead_time is None or lead_time.count == 0:
+            return self.generate_recommendations_from_forecast(product_id, forecaster, current_stock, day)
+
+        daily_average = forecaster.forecast(day)
+        z = NormalDist().inv_cdf(service_level)
+        safety_stock = z * sqrt(
+            lead_time.mean * forecaster.error_variance + daily_average ** 2 * lead_time.variance
+        )
+        # floored like the other paths, so products without demand still keep a minimum stock
+        reorder_point = max(daily_average * lead_time.mean + safety_stock, self.min_stock_threshold)
+        needs_reorder = current_stock <= reorder_point
+        recommended_order = max(reorder_point + daily_average * self.period - current_stock, 0)
+        if needs_reorder:
+            recommended_order = max(recommended_order, self.min_stock_threshold * 2)
+
+        return {
+            'product_id': product_id,
+            'current_stock': current_stock,
+            'daily_average_usage': daily_average,
+            'lead_time_days': lead_time.mean,
+            'safety_stock': safety_stock,
+            'reorder_point': reorder_point,
+            'recommended_order': recommended_order,
+            'needs_reorder': needs_reorder
+        }
+
+    def _recommend(self, product_id, daily_average, current_stock):
         # If daily_average is 0 but stock is below threshold, set minimum values
         if daily_average == 0 and current_stock <= self.min_stock_threshold:
             reorder_point = self.min_stock_threshold
@@ -33,4 +90,38 @@ class InventoryOptimizer:
             'reorder_point': reorder_point,
             'recommended_order': recommended_order,
             'needs_reorder': current_stock <= reorder_point
-        }
\ No newline at end of file
+        }
+
+    def generate_recommendations_batch(self, product_ids, sales, current_stock):
+        """
+        Vectorized generate_recommendations for a whole catalogue at once
+        product_ids, sales, current_stock: equal-length arrays (or sequences such as
+        cursor columns) of product ids, 7-day delivered quantities and current stock
+        Returns a dict of NumPy arrays with the same keys as generate_recommendations
+        """
+        if np is None:
+            raise ImportError(
+                "generate_recommendations_batch requires numpy: "
+                "pip install 'inventory-optimizer-package-23384069[batch]'"
+            )
+
+        product_ids = np.asarray(product_ids)
+        # NULL sums from the database arrive as None, which becomes nan
+        total_sales = np.nan_to_num(np.asarray(sales, dtype=np.float64))
+        current_stock = np.nan_to_num(np.asarray(current_stock, dtype=np.float64))
+        if not product_ids.shape == total_sales.shape == current_stock.shape:
+            raise ValueError("product_ids, sales and current_stock must have the same length")
+
+        daily_average = np.where(total_sales > 0, total_sales / self.period, 0.0)
+        # with no sales both maxima fall back to the threshold, as in the scalar path
+        reorder_point = np.maximum(daily_average * 3, self.min_stock_threshold)
+        recommended_order = np.maximum(daily_average * 7, self.min_stock_threshold * 2)
+
+        return {
+            'product_id': product_ids,
+            'current_stock': current_stock,
+            'daily_average_usage': daily_average,
+            'reorder_point': reorder_point,
+            'recommended_order': recommended_order,
+            'needs_reorder': current_stock <= reorder_point
+        }
@@ -0,0 +1,51 @@
+import unittest
+
+from inventory_optimizer_package_23384069 import InventoryOptimizer
+from inventory_optimizer_package_23384069.optimizer import np
+
+KEYS = ('current_stock', 'daily_average_usage', 'reorder_point', 'recommended_order', 'needs_reorder')
+
+
+@unittest.skipIf(np is None, "needs the batch extra (numpy)")
+class BatchRecommendationTests(unittest.TestCase):
+    def setUp(self):
+        self.optimizer = InventoryOptimizer(min_stock_threshold=10)
+
+    def assertMatchesScalar(self, rows):
+        """Every row of the batch result equals generate_recommendations for that row"""
+        product_ids, sales, current_stock = zip(*rows)
+        batch = self.optimizer.generate_recommendations_batch(product_ids, sales, current_stock)
+
+        for i, (product_id, quantity, stock) in enumerate(rows):
+            scalar = self.optimizer.generate_recommendations(product_id, [(quantity or 0,)], stock or 0)
+            with self.subTest(row=rows[i]):
+                self.assertEqual(batch['product_id'][i], product_id)
+                for key in KEYS:
+                    self.assertAlmostEqual(float(batch[key][i]), float(scalar[key]), msg=key)
+
+    def test_edge_rows(self):
+        self.assertMatchesScalar([
+            (1, 0, 0),      # no demand, no stock
+            (2, 0, 10),     # no demand, stock at the threshold
+            (3, 0, 11),     # no demand, stock above the threshold
+            (4, 7, 0),      # demand, no stock
+            (5, 70, 30),    # stock exactly at the reorder point
+            (6, 70, 31),    # one unit above it
+            (7, 1, 5),      # demand below the threshold
+            (8, None, None),  # NULL sums from the database
+        ])
+
+    def test_random_catalogue(self):
+        rng = np.random.default_rng(0)
+        skus = 1000
+        sales = np.where(rng.random(skus) < 0.33, 0, rng.integers(1, 500, skus))
+        stock = rng.integers(0, 400, skus)
+        self.assertMatchesScalar(list(zip(range(1, skus + 1), sales.tolist(), stock.tolist())))
+
+    def test_lengths_must_match(self):
+        with self.assertRaises(ValueError):
+            self.optimizer.generate_recommendations_batch([1, 2], [0], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+import unittest
+
+from inventory_optimizer_package_23384069 import DemandForecaster, RunningStats
+from inventory_optimizer_package_23384069.optimizer import np
+
+
+@unittest.skipIf(np is None, "needs the batch extra (numpy)")
+class RunningStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(1).gamma(4.0, 2.5, 200)
+
+    def assertMatchesNumpy(self, stats, values):
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, np.mean(values))
+        self.assertAlmostEqual(stats.variance, np.var(values, ddof=1))
+        self.assertAlmostEqual(stats.std, np.std(values, ddof=1))
+
+    def _stats(self, values):
+        stats = RunningStats()
+        for value in values:
+            stats.add(float(value))
+        return stats
+
+    def test_add(self):
+        self.assertMatchesNumpy(self._stats(self.values), self.values)
+
+    def test_updates_resume_from_the_stored_state(self):
+        first = self._stats(self.values[:80])
+        resumed = RunningStats(first.count, first.mean, first.m2)
+        for value in self.values[80:]:
+            resumed.add(float(value))
+        self.assertMatchesNumpy(resumed, self.values)
+
+    def test_merge(self):
+        merged = self._stats(self.values[:37]).merge(self._stats(self.values[37:]))
+        self.assertMatchesNumpy(merged, self.values)
+
+    def test_merge_with_an_empty_side(self):
+        self.assertMatchesNumpy(RunningStats().merge(self._stats(self.values)), self.values)
+        self.assertMatchesNumpy(self._stats(self.values).merge(RunningStats()), self.values)
+
+    def test_variance_is_zero_below_two_observations(self):
+        stats = self._stats([5.0])
+        self.assertEqual((stats.variance, stats.std), (0.0, 0.0))
+        self.assertEqual(RunningStats().variance, 0.0)
+
+
+@unittest.skipIf(np is None, "needs the batch extra (numpy)")
+class DemandVarianceTests(unittest.TestCase):
+    def test_error_variance_is_the_smoothed_squared_forecast_error(self):
+        alpha = 0.3
+        demand = np.random.default_rng(2).poisson(20, 60).astype(float) + 1
+        forecaster = DemandForecaster(alpha=alpha)
+        start = date(2030, 1, 1)
+
+        # the one-step forecast standing when each day is closed
+        predictions = []
+        for i, quantity in enumerate(demand):
+            if forecaster.level is not None:
+                predictions.append(forecaster.level + forecaster.trend)
+            forecaster.observe(start + timedelta(days=i), float(quantity))
+
+        # day 0 seeds the level and the last day is still open
+        errors = demand[1:-1] - np.array(predictions)
+        weights = alpha * (1 - alpha) ** np.arange(len(errors) - 1, -1, -1)
+        self.assertAlmostEqual(forecaster.error_variance, np.sum(weights * errors ** 2))
+        self.assertAlmostEqual(forecaster.demand_std(), np.sqrt(np.sum(weights * errors ** 2)))
+
+    def test_constant_demand_has_no_variance(self):
+        forecaster = DemandForecaster()
+        for i in range(30):
+            forecaster.observe(date(2030, 1, 1) + timedelta(days=i), 12)
+        self.assertAlmostEqual(forecaster.error_variance, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
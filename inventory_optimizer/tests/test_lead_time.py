@@ -0,0 +1,70 @@
+import unittest
+
+from inventory_optimizer_package_23384069 import DemandForecaster, InventoryOptimizer, RunningStats
+from inventory_optimizer_package_23384069.optimizer import np
+
+# NormalDist().inv_cdf(0.95) and inv_cdf(0.99)
+Z_95 = 1.6448536269514722
+Z_99 = 2.3263478740408408
+
+
+@unittest.skipIf(np is None, "needs the batch extra (numpy)")
+class LeadTimeRecommendationTests(unittest.TestCase):
+    def setUp(self):
+        self.optimizer = InventoryOptimizer(min_stock_threshold=10)
+        # a closed forecast of 12 units a day with an error variance of 9
+        self.forecaster = DemandForecaster(level=12.0, trend=0.0, error_variance=9.0, observations=30)
+        self.lead_times = np.array([4.0, 6.0, 5.0, 9.0, 5.5])
+        self.stats = RunningStats()
+        for days in self.lead_times:
+            self.stats.add(float(days))
+
+    def expected(self, z, current_stock):
+        mean, variance = np.mean(self.lead_times), np.var(self.lead_times, ddof=1)
+        safety_stock = z * np.sqrt(mean * 9.0 + 12.0 ** 2 * variance)
+        reorder_point = 12.0 * mean + safety_stock
+        return safety_stock, reorder_point, max(reorder_point + 12.0 * 7 - current_stock, 0)
+
+    def test_safety_stock_and_reorder_point(self):
+        for service_level, z in ((0.95, Z_95), (0.99, Z_99)):
+            with self.subTest(service_level=service_level):
+                result = self.optimizer.generate_recommendations_with_lead_time(
+                    1, self.forecaster, 50, self.stats, service_level=service_level
+                )
+                safety_stock, reorder_point, order = self.expected(z, 50)
+                self.assertAlmostEqual(result['safety_stock'], safety_stock)
+                self.assertAlmostEqual(result['reorder_point'], reorder_point)
+                self.assertAlmostEqual(result['recommended_order'], order)
+                self.assertAlmostEqual(result['lead_time_days'], np.mean(self.lead_times))
+                self.assertTrue(result['needs_reorder'])
+
+    def test_well_stocked_product_orders_nothing(self):
+        result = self.optimizer.generate_recommendations_with_lead_time(1, self.forecaster, 10_000, self.stats)
+        self.assertEqual(result['recommended_order'], 0)
+        self.assertFalse(result['needs_reorder'])
+
+    def test_fixed_lead_time_only_covers_demand_variance(self):
+        fixed = RunningStats()
+        for _ in range(4):
+            fixed.add(5.0)
+        result = self.optimizer.generate_recommendations_with_lead_time(1, self.forecaster, 0, fixed)
+        self.assertAlmostEqual(result['safety_stock'], Z_95 * np.sqrt(5.0 * 9.0))
+
+    def test_no_demand_still_keeps_the_minimum_stock(self):
+        idle = DemandForecaster(level=0.0, trend=0.0, error_variance=0.0, observations=30)
+        result = self.optimizer.generate_recommendations_with_lead_time(1, idle, 0, self.stats)
+        self.assertEqual((result['reorder_point'], result['recommended_order']), (10, 20))
+        self.assertTrue(result['needs_reorder'])
+
+        result = self.optimizer.generate_recommendations_with_lead_time(1, idle, 11, self.stats)
+        self.assertEqual(result['recommended_order'], 0)
+        self.assertFalse(result['needs_reorder'])
+
+    def test_without_lead_time_history_it_falls_back_to_the_forecast(self):
+        result = self.optimizer.generate_recommendations_with_lead_time(1, self.forecaster, 20, RunningStats())
+        self.assertEqual(result, self.optimizer.generate_recommendations_from_forecast(1, self.forecaster, 20))
+        self.assertNotIn('safety_stock', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+# Alerts raised by the Lambdas are buffered in api_alertdigestitem and sent as
+# one digest per topic and window instead of one email per invocation.
+DIGEST_WINDOW_SECONDS = int(os.environ.get('ALERT_DIGEST_WINDOW_SECONDS', 3600))
+MAX_BATCH_ENTRIES = 10  # SNS PublishBatch limit
+MAX_DIGEST_LINES = 200  # keeps a digest well under the 256 KB message limit
+
+SUBJECTS = {
+    'STOCK_ISSUE': "Stock Level Alert",
+    'STOCK_EXPIRY': "Stock Expiry Alert",
+}
+HEADLINES = {
+    'STOCK_ISSUE': "{products} product(s) require restocking based on recent sales analysis.",
+    'STOCK_EXPIRY': "{count} item(s) across {products} product(s) in our warehouse are expiring in 30 days.",
+}
+
+
+def buffer_alerts(cursor, topic_arn, kind, alerts, now=None):
+    """Add (product_id, count, detail) alerts to the topic's pending digest"""
+    if not alerts:
+        return
+    now = now or datetime.now()
+    execute_values(cursor, """
+        INSERT INTO api_alertdigestitem (topic_arn, kind, product_id, count, detail, updated_at)
+        VALUES %s
+        ON CONFLICT (topic_arn, kind, product_id)
+        DO UPDATE SET count = api_alertdigestitem.count + EXCLUDED.count,
+                      detail = EXCLUDED.detail,
+                      updated_at = EXCLUDED.updated_at
+    """, [(topic_arn, kind, product_id, count, detail, now) for product_id, count, detail in alerts])
+    # a topic seen for the first time may publish straight away
+    cursor.execute("""
+        INSERT INTO api_alertdigestwindow (topic_arn, last_published_at)
+        VALUES (%s, %s)
+        ON CONFLICT (topic_arn) DO NOTHING
+    """, (topic_arn, datetime(1970, 1, 1)))
+
+
+def build_digest_entries(rows):
+    """Group (topic_arn, kind, product_name, count, detail) rows into PublishBatch entries per topic"""
+    grouped = {}
+    for topic_arn, kind, product_name, count, detail in sorted(rows, key=lambda row: (row[0], row[1], row[2])):
+        grouped.setdefault(topic_arn, {}).setdefault(kind, []).append((product_name, count, detail))
+
+    entries = {}
+    for topic_arn, kinds in grouped.items():
+        for kind, products in kinds.items():
+            lines = [
+                HEADLINES.get(kind, "{count} alert(s) for {products} product(s).").format(
+                    count=sum(count for _, count, _ in products), products=len(products)
+                ),
+                "",
+            ]
+            for product_name, count, detail in products[:MAX_DIGEST_LINES]:
+                lines.append(f"- {product_name} ({count}): {detail}")
+            if len(products) > MAX_DIGEST_LINES:
+                lines.append(f"... and {len(products) - MAX_DIGEST_LINES} more product(s).")
+            entries.setdefault(topic_arn, []).append({
+                'Id': kind.lower(),
+                'Subject': SUBJECTS.get(kind, "Inventory Alert"),
+                'Message': "\n".join(lines),
+            })
+    return entries
+
+
+def publish_digests(sns_client, entries):
+    """Send each topic's digest: one publish, or one publish_batch when it covers several alert kinds"""
+    for topic_arn, topic_entries in entries.items():
+        if len(topic_entries) == 1:
+            entry = topic_entries[0]
+            sns_client.publish(TopicArn=topic_arn, Message=entry['Message'], Subject=entry['Subject'])
+            continue
+        for start in range(0, len(topic_entries), MAX_BATCH_ENTRIES):
+            response = sns_client.publish_batch(
+                TopicArn=topic_arn, PublishBatchRequestEntries=topic_entries[start:start + MAX_BATCH_ENTRIES]
+            )
+            if response.get('Failed'):
+                raise RuntimeError(f"SNS rejected digest entries for {topic_arn}: {response['Failed']}")
+
+
+def flush_due_digests(conn, sns_client, window_seconds=DIGEST_WINDOW_SECONDS, now=None):
+    """Publish the digest of every topic whose window has passed, returns the number of topics sent.
+
+    The buffered rows are deleted in the same transaction as the publish, so a
+    failed publish leaves them for the next run. SKIP LOCKED lets concurrent
+    invocations leave a topic to whichever one is already flushing it.
+    """
+    now = now or datetime.now()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT topic_arn FROM api_alertdigestwindow
+                WHERE last_published_at <= %s
+                AND EXISTS (SELECT 1 FROM api_alertdigestitem d WHERE d.topic_arn = api_alertdigestwindow.topic_arn)
+                FOR UPDATE SKIP LOCKED
+            """, (now - timedelta(seconds=window_seconds),))
+            due = [topic_arn for topic_arn, in cursor.fetchall()]
+            if not due:
+                conn.commit()
+                return 0
+
+            cursor.execute("""
+                DELETE FROM api_alertdigestitem d
+                USING api_product p
+                WHERE p.id = d.product_id AND d.topic_arn = ANY(%s)
+                RETURNING d.topic_arn, d.kind, p.name, d.count, d.detail
+            """, (due,))
+            entries = build_digest_entries(cursor.fetchall())
+            publish_digests(sns_client, entries)
+
+            cursor.execute("""
+                UPDATE api_alertdigestwindow SET last_published_at = %s WHERE topic_arn = ANY(%s)
+            """, (now, due))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logging.info(f"Published alert digests to {len(entries)} topic(s)")
+    return len(entries)
@@ -0,0 +1,89 @@
+import logging
+import os
+from functools import lru_cache
+
+import boto3
+import psycopg2
+from psycopg2 import extensions
+
+# Module level state survives between invocations of a warm Lambda container,
+# so the connection and clients below are only built on a cold start.
+_connection = None
+
+
+def _connect():
+    logging.info("Connecting to the database...")
+    return psycopg2.connect(
+        dbname=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD'],
+        host=os.environ['DB_HOST'],
+        port=os.environ.get('DB_PORT', "5432"),
+        connect_timeout=int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    )
+
+
+def _is_healthy(conn):
+    """Ping a reused connection; the SELECT opens the transaction the handler goes on to use"""
+    if conn.closed:
+        return False
+    try:
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except psycopg2.Error as e:
+        logging.warning(f"Discarding unhealthy database connection: {e}")
+        return False
+
+
+def get_connection():
+    """Return the container's database connection, reconnecting if it has gone away"""
+    global _connection
+    if _connection is not None and _is_healthy(_connection):
+        logging.debug("Reusing warm database connection")
+        return _connection
+    discard_connection()
+    _connection = _connect()
+    logging.info("Database connection successful")
+    return _connection
+
+
+def discard_connection():
+    """Close and forget the cached connection so the next call reconnects"""
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except psycopg2.Error:
+            pass
+    _connection = None
+
+
+def release_connection(conn, failed=False):
+    """End the invocation's transaction without closing the connection.
+
+    Connection level errors drop it so the next invocation starts fresh.
+    """
+    if conn is None:
+        return
+    if failed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            discard_connection()
+    if conn.closed:
+        discard_connection()
+
+
+@lru_cache(maxsize=None)
+def get_client(service_name):
+    """boto3 client built once per container"""
+    return boto3.client(service_name)
+
+
+def reset():
+    """Drop all cached state, as a cold start would"""
+    discard_connection()
+    get_client.cache_clear()
@@ -0,0 +1,75 @@
+class LocalDB:
+    """In-memory stand-in for the psycopg2 connection the Lambdas use, for tests.
+
+    It understands the statements the handlers and alert_digest send, keyed on
+    the table they touch, and counts commits and rollbacks.
+    """
+
+    def __init__(self, products=None, stock=None):
+        self.products = dict(products or {})  # product id -> name
+        self.stock = dict(stock or {})  # product id -> available units
+        self.digest_items = {}  # (topic_arn, kind, product_id) -> (count, detail)
+        self.digest_windows = {}  # topic_arn -> last_published_at
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def buffer(self, topic_arn, kind, product_id, count, detail, last_published_at):
+        """Seed a pending digest item, as alert_digest.buffer_alerts would"""
+        previous, _ = self.digest_items.get((topic_arn, kind, product_id), (0, None))
+        self.digest_items[(topic_arn, kind, product_id)] = (previous + count, detail)
+        self.digest_windows.setdefault(topic_arn, last_published_at)
+
+    def cursor(self):
+        return LocalCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class LocalCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=()):
+        statement = " ".join(sql.split())
+        db = self.db
+        if statement.startswith("SELECT topic_arn FROM api_alertdigestwindow"):
+            threshold, = params
+            pending = {topic_arn for topic_arn, _, _ in db.digest_items}
+            self.rows = [
+                (topic_arn,) for topic_arn, last_published_at in db.digest_windows.items()
+                if last_published_at <= threshold and topic_arn in pending
+            ]
+        elif statement.startswith("DELETE FROM api_alertdigestitem"):
+            due, = params
+            self.rows = []
+            for key in [key for key in db.digest_items if key[0] in due]:
+                topic_arn, kind, product_id = key
+                count, detail = db.digest_items.pop(key)
+                self.rows.append((topic_arn, kind, db.products[product_id], count, detail))
+        elif statement.startswith("UPDATE api_alertdigestwindow"):
+            now, due = params
+            for topic_arn in due:
+                db.digest_windows[topic_arn] = now
+        elif "FROM api_productstock" in statement:
+            product_ids, = params
+            self.rows = [(product_id, db.stock[product_id]) for product_id in product_ids if product_id in db.stock]
+        elif "FROM api_demandforecast" in statement or "FROM api_supplierleadtime" in statement:
+            self.rows = []
+        else:
+            raise NotImplementedError(f"LocalDB does not understand: {statement[:60]}")
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
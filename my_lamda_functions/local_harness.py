@@ -0,0 +1,81 @@
+"""Invoke the DB Lambdas locally and compare cold and warm invocation latency.
+
+Needs the DB_* environment variables of the target database. SNS publishes go
+to a local stand-in, and are counted, unless --publish is given (SNS_TOPIC_ARN
+must then be set too).
+
+    python local_harness.py stock_level --products 1 2 3 --invocations 20
+    python local_harness.py expiry --invocations 20
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from functools import lru_cache
+
+import lambda_common
+from local_sns import LocalSNS
+
+
+def stock_level_event(product_ids):
+    return {'Records': [
+        {'messageId': f"local-{i}", 'body': json.dumps({'product_id': product_id})}
+        for i, product_id in enumerate(product_ids)
+    ]}
+
+
+def time_invocations(handler, event, invocations, cold):
+    timings = []
+    for _ in range(invocations):
+        if cold:
+            lambda_common.reset()
+        start = time.perf_counter()
+        handler(event, None)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarise(label, timings):
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(round(len(ordered) * 0.95)) - 1)]
+    print(f"{label:<5} n={len(ordered)} mean={statistics.mean(ordered):.1f}ms "
+          f"p50={statistics.median(ordered):.1f}ms p95={p95:.1f}ms max={ordered[-1]:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('handler', choices=['stock_level', 'expiry'])
+    parser.add_argument('--products', type=int, nargs='+', default=[1], help='product ids for the stock_level event')
+    parser.add_argument('--invocations', type=int, default=20)
+    parser.add_argument('--publish', action='store_true', help='send real SNS publishes')
+    args = parser.parse_args()
+
+    if args.handler == 'stock_level':
+        from sns_check_stock_level_lambda_function import lambda_handler
+        event = stock_level_event(args.products)
+    else:
+        from sns_check_stock_expiry_lambda_function import lambda_handler
+        event = {}
+    # the handlers log at DEBUG on import, keep the timing output readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    sns = None
+    if not args.publish:
+        os.environ.setdefault('SNS_TOPIC_ARN', 'local')
+        sns = LocalSNS()
+        lambda_common.get_client = lru_cache(maxsize=None)(lambda service_name: sns)
+
+    print(f"{args.handler}: {args.invocations} invocations each")
+    summarise('cold', time_invocations(lambda_handler, event, args.invocations, cold=True))
+    lambda_common.reset()
+    lambda_handler(event, None)  # the first warm call still pays for the connection
+    summarise('warm', time_invocations(lambda_handler, event, args.invocations, cold=False))
+    lambda_common.reset()
+    if sns is not None:
+        print(f"{sns.publish_calls} SNS publish call(s) for {2 * args.invocations + 1} invocations")
+
+
+if __name__ == '__main__':
+    main()
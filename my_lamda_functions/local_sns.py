@@ -0,0 +1,32 @@
+import uuid
+
+
+class LocalSNS:
+    """In-memory stand-in for the boto3 SNS client that records and counts publishes"""
+
+    def __init__(self):
+        self.messages = []
+        self.publish_calls = 0
+
+    def publish(self, TopicArn, Message, Subject=None, **kwargs):
+        self.publish_calls += 1
+        message_id = str(uuid.uuid4())
+        self.messages.append({'TopicArn': TopicArn, 'Subject': Subject, 'Message': Message, 'MessageId': message_id})
+        return {'MessageId': message_id}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.publish_calls += 1
+        successful = []
+        for entry in PublishBatchRequestEntries:
+            message_id = str(uuid.uuid4())
+            self.messages.append({
+                'TopicArn': TopicArn,
+                'Subject': entry.get('Subject'),
+                'Message': entry['Message'],
+                'MessageId': message_id,
+            })
+            successful.append({'Id': entry['Id'], 'MessageId': message_id})
+        return {'Successful': successful, 'Failed': []}
+
+    def messages_for(self, topic_arn):
+        return [message for message in self.messages if message['TopicArn'] == topic_arn]
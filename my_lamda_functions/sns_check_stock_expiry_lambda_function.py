@@ -1,92 +1,138 @@
-import psycopg2
-import boto3
 import logging
-from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
 import os
+import alert_digest
+import lambda_common
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(levelname)s %(message)s")
 
+EXPIRY_WINDOW_DAYS = 30
+WATERMARK_NAME = 'stock_expiry'
+# Batches created this long before the last run are scanned again: a batch
+# whose transaction committed after that run read MAX(id) can have a lower id
+# than the watermark. Must outlast the longest transaction that inserts batches.
+WATERMARK_OVERLAP = timedelta(minutes=15)
+
+# One statement for the whole scan: batches that still hold stock and have no
+# notification yet get one. NOT EXISTS skips known batches without burning ids,
+# ON CONFLICT covers two runs racing on the same batch.
+CREATE_EXPIRY_NOTIFICATIONS_SQL = """
+    INSERT INTO api_notification
+    (batch_id_id, type, product_name_id, status, created_at, updated_at, notes)
+    SELECT i.id, 'STOCK_EXPIRY', i.product_id, 'OPEN', %(now)s, %(now)s, 'Create plan to clear out stock.'
+    FROM api_inventory i
+    WHERE i.expiry_date BETWEEN %(today)s AND %(threshold)s
+    AND i.quantity > 0
+    AND i.status IN ('ADD', 'RETURN')
+    {scope}
+    AND NOT EXISTS (SELECT 1 FROM api_notification n WHERE n.batch_id_id = i.id)
+    ON CONFLICT (batch_id_id) WHERE type = 'STOCK_EXPIRY' DO NOTHING
+"""
+
+# Incremental runs only look at batches whose expiry entered the window since
+# the last run, or that were created after it (or shortly before it, see
+# WATERMARK_OVERLAP).
+INCREMENTAL_SCOPE = """
+    AND (i.expiry_date > %(window_end)s OR i.id > %(last_inventory_id)s OR i.created_at >= %(created_since)s)
+"""
+
+
+def read_watermark(cursor):
+    """(window_end, last_inventory_id, updated_at) of the last run, locked until commit, or None"""
+    cursor.execute("""
+        SELECT window_end, last_inventory_id, updated_at
+        FROM api_expiryscanwatermark
+        WHERE name = %s
+        FOR UPDATE
+    """, (WATERMARK_NAME,))
+    return cursor.fetchone()
+
+
+def write_watermark(cursor, window_end, last_inventory_id, now):
+    cursor.execute("""
+        INSERT INTO api_expiryscanwatermark (name, window_end, last_inventory_id, updated_at)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET window_end = EXCLUDED.window_end,
+            last_inventory_id = EXCLUDED.last_inventory_id,
+            updated_at = EXCLUDED.updated_at
+    """, (WATERMARK_NAME, window_end, last_inventory_id, now))
+
+
+def create_expiry_notifications(cursor, today, now=None, backfill=False):
+    """Open a notification for every stocked batch that entered the expiry window.
+
+    Returns the number of new notifications per product id.
+
+    Without a watermark, or with backfill, the whole window is scanned.
+    """
+    now = now or datetime.now()
+    threshold = today + timedelta(days=EXPIRY_WINDOW_DAYS)
+    watermark = read_watermark(cursor)
+    # batches inserted after this read are picked up by the next run
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM api_inventory")
+    last_inventory_id = cursor.fetchone()[0]
+
+    params = {'now': now, 'today': today, 'threshold': threshold}
+    if backfill or watermark is None:
+        logging.info(f"Scanning all batches expiring between {today} and {threshold}.")
+        sql = CREATE_EXPIRY_NOTIFICATIONS_SQL.format(scope="")
+    else:
+        params['window_end'], params['last_inventory_id'], last_run = watermark
+        params['created_since'] = last_run - WATERMARK_OVERLAP
+        logging.info(
+            f"Scanning batches expiring after {watermark[0]} up to {threshold}, "
+            f"newer than batch {watermark[1]} or created since {params['created_since']}."
+        )
+        sql = CREATE_EXPIRY_NOTIFICATIONS_SQL.format(scope=INCREMENTAL_SCOPE)
+    cursor.execute(f"""
+        WITH inserted AS ({sql} RETURNING product_name_id)
+        SELECT product_name_id, COUNT(*) FROM inserted GROUP BY product_name_id
+    """, params)
+    inserted = dict(cursor.fetchall())
+
+    write_watermark(cursor, threshold, last_inventory_id, now)
+    return inserted
+
+
 def lambda_handler(event, context):
     conn = None
+    cursor = None
+    failed = False
     try:
-        # Connect to the database
-        logging.info("Connecting to the database...")
-        conn = psycopg2.connect(
-            database=os.environ['DB_NAME'],
-            user=os.environ['DB_USER'],
-            password=os.environ['DB_PASSWORD'],
-            host=os.environ['DB_HOST'],
-            port="5432"
-        )
+        # Reuse the warm connection when there is one
+        conn = lambda_common.get_connection()
         cursor = conn.cursor()
-        logging.info("Database connection successful.")
-
-        # Check inventory table for expiry dates within 30 days
-        today = datetime.now().date()
-        expiry_threshold = today + timedelta(days=30)
-
-        logging.info(f"Querying inventory for items expiring between {today} and {expiry_threshold}.")
-        query = """
-            SELECT i.id as inv_id, i.batch_id, i.expiry_date, p.id as product_id 
-            FROM api_inventory i
-            INNER JOIN api_product p ON i.product_id = p.id
-            WHERE i.expiry_date BETWEEN %s AND %s
-        """
-        cursor.execute(query, (today, expiry_threshold))
-        inventory_records = cursor.fetchall()
-        logging.info(f"Retrieved {len(inventory_records)} records from inventory.")
-
-        # Count of records to be inserted
-        new_notifications_count = 0
-
-        # Check if record exists in notifications table
-        for inv_id, batch_id, expiry_date, product_id in inventory_records:
-            logging.debug(f"Checking if batch_id {inv_id} already exists in notifications.")
-            cursor.execute("SELECT batch_id_id FROM api_notification WHERE batch_id_id = %s", (inv_id,))
-            if not cursor.fetchone():
-                logging.info(f"Inserting new notification for batch_id {inv_id}.")
-                cursor.execute("""
-                    INSERT INTO api_notification 
-                    (batch_id_id, type, product_name_id, status, created_at, updated_at, notes)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    inv_id,
-                    "STOCK_EXPIRY",
-                    product_id,
-                    "OPEN",
-                    datetime.now(),
-                    datetime.now(),
-                    "Create plan to clear out stock."
-                ))
-                new_notifications_count += 1
+
+        now = datetime.now()
+        # {"backfill": true} rescans the whole window, e.g. after expiry dates were edited
+        inserted = create_expiry_notifications(
+            cursor, now.date(), now, backfill=bool((event or {}).get('backfill'))
+        )
+        alert_digest.buffer_alerts(
+            cursor, os.environ['SNS_TOPIC_ARN'], 'STOCK_EXPIRY',
+            [
+                (product_id, count, f"batch(es) expiring within {EXPIRY_WINDOW_DAYS} days. Create plan to clear out stock.")
+                for product_id, count in inserted.items()
+            ],
+            now
+        )
 
         # Commit the transaction
         conn.commit()
-        logging.info(f"Inserted {new_notifications_count} new notifications into the database.")
-
-        # Send email notification if new records were added
-        if new_notifications_count > 0:
-            sns_client = boto3.client('sns')
-            topic_arn = os.environ['SNS_TOPIC_ARN']
-            message = f"{new_notifications_count} item(s) in our warehouse are expiring in 30 days."
-            subject = "Stock Expiry Alert"
-
-            logging.info(f"Sending SNS notification to topic: {topic_arn}")
-            try:
-                sns_client.publish(
-                    TopicArn=topic_arn,
-                    Message=message,
-                    Subject=subject
-                )
-                logging.info("SNS notification sent successfully.")
-            except ClientError as e:
-                logging.error(f"Failed to send SNS notification: {e}")
+        logging.info(f"Inserted {sum(inserted.values())} new notifications into the database.")
+
+        # Publishes every digest whose window has passed, not just this Lambda's
+        try:
+            alert_digest.flush_due_digests(conn, lambda_common.get_client('sns'))
+        except Exception as e:
+            logging.error(f"Failed to publish alert digest: {e}", exc_info=True)
+
     except Exception as e:
         logging.error(f"Error: {str(e)}", exc_info=True)
+        failed = True
     finally:
-        if conn:
+        if cursor:
             cursor.close()
-            conn.close()
-            logging.info("Database connection closed.")
+        lambda_common.release_connection(conn, failed)
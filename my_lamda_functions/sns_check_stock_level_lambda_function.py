@@ -1,113 +1,170 @@
 import json
-import psycopg2
-import boto3
+from psycopg2.extras import execute_values
 import logging
-from botocore.exceptions import ClientError
-from inventory_optimizer_package_23384069 import InventoryOptimizer
+from inventory_optimizer_package_23384069 import DemandForecaster, InventoryOptimizer, RunningStats
 import os
 from datetime import datetime
+import alert_digest
+import lambda_common
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(levelname)s %(message)s")
+
+# chance of not running out while a replenishment order is on its way
+SERVICE_LEVEL = float(os.environ.get('SERVICE_LEVEL', 0.95))
+
+
+def parse_records(records):
+    """Map each distinct product id of an SQS batch to the message ids that asked for it.
+
+    Returns (messages_by_product, failures) where failures are the message ids
+    that could not be parsed.
+    """
+    messages_by_product = {}
+    failures = []
+    for record in records:
+        try:
+            product_id = int(json.loads(record['body'])['product_id'])
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(f"Skipping malformed message {record.get('messageId')}: {e}")
+            failures.append(record['messageId'])
+            continue
+        messages_by_product.setdefault(product_id, []).append(record['messageId'])
+    return messages_by_product, failures
+
+
+def fetch_stock_and_forecasts(cursor, product_ids):
+    """Current stock (pending counter slots included) and stored demand forecast state of every product, one query each.
+
+    The forecast state is kept up to date by the backend as orders are
+    delivered, so no order history is scanned here.
+    """
+    cursor.execute("""
+        SELECT ps.product_id, ps.available + COALESCE(SUM(slot.available), 0)
+        FROM api_productstock ps
+        LEFT JOIN api_stockcounterslot slot ON slot.product_id = ps.product_id
+        WHERE ps.product_id = ANY(%s)
+        GROUP BY ps.product_id, ps.available
+    """, (product_ids,))
+    stock = dict(cursor.fetchall())
+
+    cursor.execute(f"""
+        SELECT product_id, {', '.join(DemandForecaster.FIELDS)}
+        FROM api_demandforecast
+        WHERE product_id = ANY(%s)
+    """, (product_ids,))
+    forecasts = {
+        row[0]: DemandForecaster(**dict(zip(DemandForecaster.FIELDS, row[1:])))
+        for row in cursor.fetchall()
+    }
+    return stock, forecasts
+
+
+def upsert_stock_alerts(cursor, notifications):
+    """Open a stock alert per product, or refresh the notes of the one already open.
+
+    Returns the product ids whose alert was newly opened.
+    """
+    rows = execute_values(cursor, """
+        INSERT INTO api_notification
+        (product_name_id, type, status, created_at, updated_at, notes)
+        VALUES %s
+        ON CONFLICT (product_name_id, type) WHERE status = 'OPEN' AND type = 'STOCK_ISSUE'
+        DO UPDATE SET notes = EXCLUDED.notes, updated_at = EXCLUDED.updated_at
+        RETURNING product_name_id, (xmax = 0) AS inserted
+    """, notifications, fetch=True)
+    return [product_id for product_id, inserted in rows if inserted]
+
+
+def fetch_lead_times(cursor, product_ids):
+    """Lead time statistics of the supplier each product was last received from"""
+    cursor.execute("""
+        SELECT DISTINCT ON (product_id) product_id, count, mean_days, m2
+        FROM api_supplierleadtime
+        WHERE product_id = ANY(%s)
+        ORDER BY product_id, updated_at DESC
+    """, (product_ids,))
+    return {product_id: RunningStats(count, mean, m2) for product_id, count, mean, m2 in cursor.fetchall()}
+
+
 def lambda_handler(event, context):
+    """Check the stock level of every product in an SQS batch.
+
+    Product ids are deduplicated across the batch, stock, forecast state and
+    supplier lead times are read with one query each and all notifications go in with one INSERT. Failed
+    messages are reported through batchItemFailures (the event source mapping
+    must enable ReportBatchItemFailures), SQS deletes the rest.
+    """
     conn = None
-    new_notifications_count = 0
-    
+    failed = False
+    messages_by_product, failures = parse_records(event.get('Records', []))
+
+    if not messages_by_product:
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
+
     try:
-      
-        conn = psycopg2.connect(
-            dbname=os.environ['DB_NAME'],
-            user=os.environ['DB_USER'],
-            password=os.environ['DB_PASSWORD'],
-            host=os.environ['DB_HOST'],
-            port="5432"
-        )
-        cursor = conn.cursor()
-        logging.info("Database connection successful")
-        
-        for record in event['Records']:
-            receipt_handle = record['receiptHandle']
-            message = json.loads(record['body'])
-            product_id = message['product_id']
-            
-            # Simplified current stock query
-            cursor.execute("""
-                SELECT SUM(quantity) 
-                FROM api_inventory 
-                WHERE product_id = %s
-                GROUP BY product_id
-            """, (product_id,))
-            current_stock_result = cursor.fetchone()
-            current_stock = current_stock_result[0] if current_stock_result else 0
-            
-            # Get sales data from order items
-            cursor.execute("""
-                SELECT oi.quantity 
-                FROM api_orderitem oi
-                JOIN api_order o ON oi.order_id = o.id
-                WHERE oi.product_id = %s 
-                AND o.status = 'DELIVERED'
-                AND o.order_date >= NOW() - INTERVAL '7 days'
-            """, (product_id,))
-            delivered_quantities = cursor.fetchall()
-            
-            optimizer = InventoryOptimizer()
-            recommendations = optimizer.generate_recommendations(
+        conn = lambda_common.get_connection()
+
+        product_ids = sorted(messages_by_product)
+        with conn.cursor() as cursor:
+            stock, forecasts = fetch_stock_and_forecasts(cursor, product_ids)
+            lead_times = fetch_lead_times(cursor, product_ids)
+
+        optimizer = InventoryOptimizer()
+        now = datetime.now()
+        notifications = []
+        for product_id in product_ids:
+            current_stock = stock.get(product_id, 0)
+            recommendations = optimizer.generate_recommendations_with_lead_time(
                 product_id=product_id,
-                delivered_quantities=delivered_quantities,
-                current_stock=current_stock
+                forecaster=forecasts.get(product_id),
+                current_stock=current_stock,
+                lead_time=lead_times.get(product_id),
+                service_level=SERVICE_LEVEL,
+                day=now.date()
             )
-            
+
             if recommendations['needs_reorder']:
                 logging.info(f"Creating notification for product {product_id}")
-                cursor.execute("""
-                    INSERT INTO api_notification 
-                    (product_name_id, type, status, created_at, updated_at, notes)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
+                notifications.append((
                     product_id,
                     'STOCK_ISSUE',
                     'OPEN',
-                    datetime.now(),
-                    datetime.now(),
-                    f"Stock Alert: Current stock ({current_stock}) is below reorder point ({recommendations['reorder_point']}). "
-                    f"Recommended order: {recommendations['recommended_order']} units based on 7-day sales average of {recommendations['daily_average_usage']} units/day"
+                    now,
+                    now,
+                    f"Stock Alert: Current stock ({current_stock}) is below reorder point ({recommendations['reorder_point']:.0f}). "
+                    f"Recommended order: {recommendations['recommended_order']:.0f} units based on forecast demand of {recommendations['daily_average_usage']:.2f} units/day"
+                    + (
+                        f" over a {recommendations['lead_time_days']:.1f}-day supplier lead time, "
+                        f"including {recommendations['safety_stock']:.0f} units of safety stock"
+                        if 'safety_stock' in recommendations else ""
+                    )
                 ))
-                new_notifications_count += 1
-            
-            # Delete processed message
-            sqs = boto3.client('sqs')
-            sqs.delete_message(
-                QueueUrl=os.environ['AWS_SQS_QUEUE_URL'],
-                ReceiptHandle=receipt_handle
-            )
-            
-            conn.commit()
-        
-        # Send SNS notification if new alerts were created
-        if new_notifications_count > 0:
-            sns_client = boto3.client('sns')
-            topic_arn = os.environ['SNS_TOPIC_ARN']
-            message = f"{new_notifications_count} product(s) require restocking based on recent sales analysis."
-            subject = "Stock Level Alert"
-            
-            logging.info(f"Sending SNS notification to topic: {topic_arn}")
-            try:
-                sns_client.publish(
-                    TopicArn=topic_arn,
-                    Message=message,
-                    Subject=subject
+
+        if notifications:
+            with conn.cursor() as cursor:
+                opened = set(upsert_stock_alerts(cursor, notifications))
+                # newly opened alerts go into the next digest, refreshed ones were already announced
+                alert_digest.buffer_alerts(
+                    cursor, os.environ['SNS_TOPIC_ARN'], 'STOCK_ISSUE',
+                    [(product_id, 1, notes) for product_id, *_, notes in notifications if product_id in opened],
+                    now
                 )
-                logging.info("SNS notification sent successfully")
-            except ClientError as e:
-                logging.error(f"Failed to send SNS notification: {e}")
-                
+        conn.commit()
+
+        # one digest per window instead of one email per batch
+        try:
+            alert_digest.flush_due_digests(conn, lambda_common.get_client('sns'))
+        except Exception as e:
+            logging.error(f"Failed to publish alert digest: {e}", exc_info=True)
+
     except Exception as e:
         logging.error(f"Error: {str(e)}", exc_info=True)
-        if conn:
-            conn.rollback()
-        
+        failed = True
+        # nothing was written, let SQS redeliver the whole batch
+        failures += [message_id for message_ids in messages_by_product.values() for message_id in message_ids]
+
     finally:
-        if conn:
-            cursor.close()
-            conn.close()
-            logging.info("Database connection closed")
\ No newline at end of file
+        # the connection stays open for the next warm invocation
+        lambda_common.release_connection(conn, failed)
+
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
@@ -0,0 +1,102 @@
+import unittest
+from datetime import datetime, timedelta
+
+from alert_digest import build_digest_entries, flush_due_digests, publish_digests
+from local_db import LocalDB
+from local_sns import LocalSNS
+
+STOCK_TOPIC = "arn:aws:sns:eu-west-1:000000000000:stock"
+OPS_TOPIC = "arn:aws:sns:eu-west-1:000000000000:ops"
+
+
+class AlertDigestTests(unittest.TestCase):
+    def test_one_publish_per_topic_and_window(self):
+        # what fifty invocations would have buffered between two digests
+        rows = [(STOCK_TOPIC, "STOCK_ISSUE", f"Product {i}", 1, "below reorder point") for i in range(50)]
+        sns = LocalSNS()
+
+        publish_digests(sns, build_digest_entries(rows))
+
+        self.assertEqual(sns.publish_calls, 1)
+        message = sns.messages_for(STOCK_TOPIC)[0]
+        self.assertEqual(message["Subject"], "Stock Level Alert")
+        self.assertTrue(message["Message"].startswith("50 product(s) require restocking"))
+        self.assertIn("- Product 7 (1): below reorder point", message["Message"])
+
+    def test_several_alert_kinds_share_one_publish_batch(self):
+        rows = [
+            (OPS_TOPIC, "STOCK_ISSUE", "Milk", 2, "below reorder point"),
+            (OPS_TOPIC, "STOCK_EXPIRY", "Milk", 3, "batch(es) expiring within 30 days"),
+            (OPS_TOPIC, "STOCK_EXPIRY", "Bread", 1, "batch(es) expiring within 30 days"),
+            (STOCK_TOPIC, "STOCK_EXPIRY", "Bread", 1, "batch(es) expiring within 30 days"),
+        ]
+        sns = LocalSNS()
+
+        publish_digests(sns, build_digest_entries(rows))
+
+        self.assertEqual(sns.publish_calls, 2)
+        self.assertEqual(
+            sorted(message["Subject"] for message in sns.messages_for(OPS_TOPIC)),
+            ["Stock Expiry Alert", "Stock Level Alert"],
+        )
+        expiry = next(m for m in sns.messages_for(OPS_TOPIC) if m["Subject"] == "Stock Expiry Alert")
+        self.assertTrue(expiry["Message"].startswith("4 item(s) across 2 product(s)"))
+
+    def test_long_digests_are_truncated(self):
+        rows = [(STOCK_TOPIC, "STOCK_ISSUE", f"Product {i:04}", 1, "low") for i in range(250)]
+        message = build_digest_entries(rows)[STOCK_TOPIC][0]["Message"]
+        self.assertIn("... and 50 more product(s).", message)
+
+
+class FlushDueDigestsTests(unittest.TestCase):
+    NOW = datetime(2026, 10, 18, 12, 0)
+
+    def setUp(self):
+        self.db = LocalDB(products={1: "Milk", 2: "Bread"})
+        self.sns = LocalSNS()
+
+    def flush(self, now=NOW):
+        return flush_due_digests(self.db, self.sns, window_seconds=3600, now=now)
+
+    def test_alerts_inside_the_window_are_held_back(self):
+        self.db.buffer(STOCK_TOPIC, "STOCK_ISSUE", 1, 1, "below reorder point", self.NOW - timedelta(minutes=59))
+
+        self.assertEqual(self.flush(), 0)
+
+        self.assertEqual(self.sns.publish_calls, 0)
+        self.assertIn((STOCK_TOPIC, "STOCK_ISSUE", 1), self.db.digest_items)
+        self.assertEqual(self.db.digest_windows[STOCK_TOPIC], self.NOW - timedelta(minutes=59))
+
+    def test_due_digest_is_flushed_once_then_cleared(self):
+        self.db.buffer(STOCK_TOPIC, "STOCK_ISSUE", 1, 1, "below reorder point", datetime(1970, 1, 1))
+        self.db.buffer(STOCK_TOPIC, "STOCK_ISSUE", 2, 1, "below reorder point", datetime(1970, 1, 1))
+        self.db.buffer(OPS_TOPIC, "STOCK_EXPIRY", 2, 3, "batch(es) expiring", self.NOW - timedelta(minutes=5))
+
+        self.assertEqual(self.flush(), 1)
+
+        self.assertEqual(self.sns.publish_calls, 1)
+        self.assertTrue(self.sns.messages_for(STOCK_TOPIC)[0]["Message"].startswith("2 product(s)"))
+        self.assertEqual(list(self.db.digest_items), [(OPS_TOPIC, "STOCK_EXPIRY", 2)])
+        self.assertEqual(self.db.digest_windows[STOCK_TOPIC], self.NOW)
+
+        # nothing left to send, and a new alert waits for the next window
+        self.assertEqual(self.flush(self.NOW + timedelta(minutes=1)), 0)
+        self.db.buffer(STOCK_TOPIC, "STOCK_ISSUE", 1, 1, "below reorder point", self.NOW)
+        self.assertEqual(self.flush(self.NOW + timedelta(minutes=30)), 0)
+        self.assertEqual(self.sns.publish_calls, 1)
+
+    def test_failed_publish_rolls_back(self):
+        self.db.buffer(STOCK_TOPIC, "STOCK_ISSUE", 1, 1, "below reorder point", datetime(1970, 1, 1))
+
+        def reject(**kwargs):
+            raise RuntimeError("SNS unavailable")
+
+        self.sns.publish = reject
+        with self.assertRaises(RuntimeError):
+            self.flush()
+        self.assertEqual(self.db.rollbacks, 1)
+        self.assertEqual(self.db.commits, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+import lambda_common
+from local_db import LocalDB
+from local_sns import LocalSNS
+from sns_check_stock_level_lambda_function import lambda_handler, parse_records
+
+
+def sqs_record(message_id, body):
+    return {'messageId': message_id, 'body': body}
+
+
+BATCH = [
+    sqs_record("m1", json.dumps({'product_id': 1})),
+    sqs_record("m2", "not json"),
+    sqs_record("m3", json.dumps({'product_id': "2"})),
+    sqs_record("m4", json.dumps({'product_id': 1})),
+]
+
+
+class ParseRecordsTests(unittest.TestCase):
+    def test_malformed_record_is_reported_and_the_rest_grouped_by_product(self):
+        messages_by_product, failures = parse_records(BATCH + [sqs_record("m5", json.dumps({'sku': 3}))])
+
+        self.assertEqual(messages_by_product, {1: ["m1", "m4"], 2: ["m3"]})
+        self.assertEqual(failures, ["m2", "m5"])
+
+
+@mock.patch.dict(os.environ, {'SNS_TOPIC_ARN': "local"})
+class StockLevelHandlerTests(unittest.TestCase):
+    def setUp(self):
+        self.db = LocalDB(products={1: "Milk", 2: "Bread"}, stock={1: 500, 2: 500})
+        self.sns = LocalSNS()
+        for name, replacement in (
+            ('get_connection', lambda: self.db),
+            ('release_connection', mock.Mock()),
+            ('get_client', lambda service_name: self.sns),
+        ):
+            patcher = mock.patch.object(lambda_common, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_only_the_malformed_message_is_reported(self):
+        response = lambda_handler({'Records': BATCH}, None)
+
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': "m2"}]})
+        self.assertEqual(self.db.commits, 2)  # the stock check and the (empty) digest flush
+
+    def test_database_error_reports_every_message_once(self):
+        self.db.cursor = mock.Mock(side_effect=RuntimeError("connection lost"))
+
+        with self.assertLogs(level='ERROR'):
+            response = lambda_handler({'Records': BATCH}, None)
+
+        self.assertEqual(
+            sorted(failure['itemIdentifier'] for failure in response['batchItemFailures']),
+            ["m1", "m2", "m3", "m4"],
+        )
+        lambda_common.release_connection.assert_called_once_with(self.db, True)
+
+    def test_batch_of_only_malformed_records_skips_the_database(self):
+        connect = mock.Mock()
+        with mock.patch.object(lambda_common, 'get_connection', connect):
+            response = lambda_handler({'Records': [sqs_record("m2", "not json")]}, None)
+
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': "m2"}]})
+        connect.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()